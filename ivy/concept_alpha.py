@@ -23,29 +23,33 @@ def alpha(concept_domain, state, cache=None, projection=None):
 
     time2 = time.time()
 
-    solver = slvr.new_solver()
-
-    slvr.solver_add(solver,state)
-
-#    iu.dbg('state')
-
     if cache is None:
         cache = dict()
     result = []
-    for tag, formula in facts:
-        if tag in cache:
-            value = cache[tag]
-#            print "cached: {} = {}".format(tag,value)
-        else:
-            # assert len(cache) == 0, tag
-            solver.push()
-            slvr.solver_add(solver,Not(formula))
-            value = not slvr.is_sat(solver)
-            solver.pop()
-            cache[tag] = value
-#            print "computed: {} = {}".format(tag,value)
-
-        result.append((tag, value))
+
+    # The state is a formula of the concept domain's logic, with its own
+    # axioms, rather than clauses including the background theory, so
+    # this never runs in a solver session.
+    with slvr.query_solver() as solver:
+
+        slvr.solver_add(solver,state)
+
+#        iu.dbg('state')
+
+        for tag, formula in facts:
+            if tag in cache:
+                value = cache[tag]
+#                print "cached: {} = {}".format(tag,value)
+            else:
+                # assert len(cache) == 0, tag
+                solver.push()
+                slvr.solver_add(solver,Not(formula))
+                value = not slvr.is_sat(solver)
+                solver.pop()
+                cache[tag] = value
+#                print "computed: {} = {}".format(tag,value)
+
+            result.append((tag, value))
 
     time3 = time.time()
 
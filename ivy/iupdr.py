@@ -35,7 +35,7 @@ class UserSelectCore(ShowModal):
     def __init__(self, theory, constrains, title='', prompt=''):
         self.theory = theory
         self.constrains = list(constrains)
-        self.s = z3.Solver()
+        self.s = ivy_solver.new_solver()
         self.s.add(clauses_to_z3(self.theory))
         self.alits = [
             z3.Const('__core_aux{}'.format(n), z3.BoolSort())
@@ -174,7 +174,7 @@ def interactive_updr():
             goal_clauses = simplify_clauses(goal.formula)
             assert len(goal_clauses.defs) == 0
 
-            s = z3.Solver()
+            s = ivy_solver.new_solver()
             s.add(clauses_to_z3(theory))
             s.add(clauses_to_z3(goal_clauses))
             is_sat = s.check()
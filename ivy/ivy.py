@@ -15,17 +15,18 @@ if __name__ == "__main__":
 import pickle
 import string
 from ivy_compiler import IvyError, ivy_new, ivy_load_file
-from tk_ui import ui_main_loop
-from ivy_ui import get_default_ui_compile_kwargs
 from ivy_utils import Parameter, set_parameters
 import ivy_logic
-import proof as pf
 import ivy_utils as iu
 import ivy_module
 #import tactics_api as ta
 
 # mode = Parameter("mode",None)
 
+# The UI modules load Tkinter and graphviz, which is slow, so the batch
+# tools (ivy_check, ivy_to_cpp, ivy_show) that use this module must
+# not import them. They are imported only when the UI is run.
+
 def usage():
     print "usage: \n  {} <file>.[a2g,ivy,dfy]\n {} <file>.a2g <file.[ivy,dfy]> ".format(sys.argv[0],sys.argv[0])
     sys.exit(1)
@@ -59,6 +60,7 @@ def read_params():
 #         usage()
 #     fn = sys.argv[1]
 #     try:
+#         import proof as pf
 #         session = pf.AnalysisSession(fn)
 #         ta.set_context(session)
 # # tt.CheckCover.apply.im_func.func_code.co_argcount
@@ -80,6 +82,14 @@ def source_file(fn,f,**kwargs):
         print str(e)
         sys.exit(1)
 
+def ui_compile_kwargs():
+    """ Options to the compiler asked for by the chosen UI. The default
+    UI asks for none. """
+    if iu.default_ui.get() is None:
+        return {}
+    from ivy_ui import get_default_ui_compile_kwargs
+    return get_default_ui_compile_kwargs()
+
 def ivy_init():
     read_params()
 
@@ -104,7 +114,7 @@ def ivy_init():
         fn,f = files.pop(0)
         if not fn.endswith('.ivy') and not fn.endswith('.dfy'):
             usage()
-        source_file(fn,f,**get_default_ui_compile_kwargs())
+        source_file(fn,f,**ui_compile_kwargs())
 
         if ag:
             ag.update_module()
@@ -114,6 +124,7 @@ def ivy_init():
     return ag
 
 def main():
+    from tk_ui import ui_main_loop
     with ivy_module.Module():
         ui_main_loop(ivy_init())
 
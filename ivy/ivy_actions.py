@@ -24,6 +24,7 @@ checked_assert = iu.Parameter("assert","",check=lambda s: len(s.split(':'))==2,
                               process=p_c_a)
 
 class Schema(AST):
+    __slots__ = ('defn','fresh','instances')
     def __init__(self,defn,fresh):
         self.defn,self.fresh = defn,fresh
         self.args = [defn,fresh]
@@ -71,6 +72,7 @@ class ActionContext(object):
 context = ActionContext()
 
 class SymbolList(AST):
+    __slots__ = ('symbols',)
     def __init__(self,*symbols):
         assert all(isinstance(a,str) or isinstance(a,Symbol) for a in symbols)
         self.symbols = symbols
@@ -85,6 +87,7 @@ class UpdatePattern(AST):
     term, unless it begins with a capital, in which case it matches a variable.
     TODO: we probably also need side conditions in some form.
     """
+    __slots__ = ('placeholders','pattern','precond','transrel')
     def __init__(self,placeholders,pattern,precond,transrel):
 #        assert isinstance(placeholders,ConstantDecl)
         self.args = [placeholders,pattern,precond,transrel]
@@ -105,6 +108,7 @@ class UpdatePattern(AST):
         return None
 
 class UpdatePatternList(AST):
+    __slots__ = ()
     def __init__(self,*args):
         assert all(isinstance(a,UpdatePattern) for a in args)
         self.args = args
@@ -116,6 +120,7 @@ class PatternBasedUpdate(AST):
     The first action that matches produces the corresponding pre-condition and transition constraint.
     If no match raises StopIteration.
     """
+    __slots__ = ('defines','dependencies','patterns')
     def __init__(self,defines,dependencies,patterns):
         assert isinstance(defines,SymbolList)
         assert isinstance(dependencies,SymbolList)
@@ -149,6 +154,7 @@ class DerivedUpdate(object):
         return (updated,true_clauses(),false_clauses())
 
 class Action(AST):
+    __slots__ = ('label','formal_params','formal_returns')
     def __init__(self,*args):
         self.args = list(args)
     def __str__(self):
@@ -227,6 +233,7 @@ class Action(AST):
 
 
 class AssumeAction(Action):
+    __slots__ = ()
     def __init__(self,*args):
         assert len(args) == 1
         self.args = args
@@ -240,6 +247,7 @@ class AssumeAction(Action):
         return ([],clauses,false_clauses())
 
 class AssertAction(Action):
+    __slots__ = ()
     def __init__(self,*args):
         assert len(args) == 1
         self.args = args
@@ -268,6 +276,7 @@ class AssertAction(Action):
 # Ensures is same as Assert except it never gets converted to Assume
 
 class EnsuresAction(AssertAction):
+    __slots__ = ()
     def assert_to_assume(self):
         return Action.assert_to_assume(self)
     
@@ -310,6 +319,7 @@ def type_ast(domain,ast):
     return ast
 
 class AssignAction(Action):
+    __slots__ = ()
     def __init__(self,*args):
         assert len(args) == 2
         self.args = args
@@ -410,6 +420,7 @@ def sign(polarity,atom):
     return atom if polarity else Not(atom)
 
 class SetAction(Action):
+    __slots__ = ()
     def __init__(self,*args):
         assert len(args) == 1
         self.args = args
@@ -431,6 +442,7 @@ class SetAction(Action):
         return ([n], new_clauses, false_clauses())
 
 class HavocAction(Action):
+    __slots__ = ()
     def __init__(self,*args):
         assert len(args) == 1
         self.args = args
@@ -470,6 +482,7 @@ def make_field_update(self,l,f,r,domain,pvars):
     return aa.action_update(domain,pvars)
 
 class AssignFieldAction(Action):
+    __slots__ = ()
     def __init__(self,*args):
         assert len(args) == 3
         self.args = args
@@ -483,6 +496,7 @@ class AssignFieldAction(Action):
         return make_field_update(self,l,f,lambda v: Equals(v,r),domain,pvars)
 
 class NullFieldAction(Action):
+    __slots__ = ()
     def __init__(self,*args):
         assert len(args) == 2
         self.args = args
@@ -496,6 +510,7 @@ class NullFieldAction(Action):
         return make_field_update(self,l,f,lambda v: Or(),domain,pvars)
 
 class CopyFieldAction(Action):
+    __slots__ = ()
     def __init__(self,*args):
         assert len(args) == 4
         self.args = args
@@ -525,6 +540,7 @@ def instantiate_macro(inst,defns):
     return None
 
 class InstantiateAction(Action):
+    __slots__ = ()
     def __init__(self,*args):
         assert len(args) == 1
         self.args = args
@@ -553,6 +569,7 @@ class InstantiateAction(Action):
 
 
 class Sequence(Action):
+    __slots__ = ()
     def name(self):
         return 'sequence'
     def __str__(self):
@@ -580,6 +597,7 @@ def set_determinize(t):
 choice_action_ctr = 0
 
 class ChoiceAction(Action):
+    __slots__ = ('unique_id',)
     def __init__(self,*args):
         Action.__init__(self,*args)
         global choice_action_ctr
@@ -610,6 +628,7 @@ class ChoiceAction(Action):
 class EnvAction(ChoiceAction):
     """ This represents an action of the environment. It is
     similar to ChoiceAction above, but appears differently in the UI """
+    __slots__ = ()
 
     # This is the same as in ChoiceAction, but the paramters
     # of the child actions are hidden.
@@ -640,6 +659,7 @@ def bracket_action(action):
     return ('{' + str(action) + '}') if not isinstance(action,Sequence) else str(action)
 
 class IfAction(Action):
+    __slots__ = ()
     def name(self):
         return 'if'
     def __str__(self):
@@ -698,6 +718,7 @@ class IfAction(Action):
             return self.args[0]
 
 class WhileAction(Action):
+    __slots__ = ()
     def name(self):
         return 'while'
     def __str__(self):
@@ -740,6 +761,7 @@ local_action_ctr = 0
 
 class LocalAction(Action):
     """ Hide some symbols in an action """
+    __slots__ = ('unique_id',)
     def __init__(self,*args):
         Action.__init__(self,*args)
         global local_action_ctr
@@ -764,6 +786,7 @@ class LocalAction(Action):
 
 class LetAction(Action):
     """ Bind some symbols in an action """
+    __slots__ = ()
     def name(self):
         return 'local'
     def __str__(self):
@@ -778,6 +801,7 @@ class LetAction(Action):
 
 class NativeAction(Action):
     """ Quote native code in an action """
+    __slots__ = ()
     def name(self):
         return 'native'
     def __str__(self):
@@ -788,11 +812,13 @@ class NativeAction(Action):
 call_action_ctr = 0
 
 class BindOldsAction(Action):
+    __slots__ = ()
     def int_update(self,domain,pvars):
         return bind_olds_action(self.args[0].int_update(domain,pvars))
 
 class CallAction(Action):
     """ Inlines a named state or action """
+    __slots__ = ('unique_id',)
     def __init__(self,*args):
         Action.__init__(self,*args)
         global call_action_ctr
@@ -898,6 +924,7 @@ class CallAction(Action):
 
 class RME(AST):
     """ A requires-modifies-ensures clause """
+    __slots__ = ()
     def __init__(self,*args):
         self.args = args
     def __str__(self):
@@ -100,9 +100,12 @@ class ProgressiveDomain(object):
             self.inhabited_cubes[my_id] = False
         return res
 
-    def post_init(self,theory,background_theory,new_sym,to_keep):
+    def post_init(self,theory,background_theory,new_sym,to_keep,solver=None):
         self.new_sym = new_sym
-        self.solver = new_solver()        
+        if solver is None:
+            solver = new_solver()
+            add_clauses(solver, and_clauses(theory,background_theory))
+        self.solver = solver
         self.cube_memo = dict()
         self.inhabited_cubes = dict()
         self.z3_cubes = []
@@ -110,8 +113,7 @@ class ProgressiveDomain(object):
         if log:
             print "concrete state: %s" % theory
             print "background: %s" % background_theory
-        add_clauses(self.solver, and_clauses(theory,background_theory))
-        self.unsat = self.solver.check() == z3.unsat
+        self.unsat = check_within_limits(self.solver) == z3.unsat
         if self.unsat:
             print "core: %s" % unsat_core(and_clauses(theory,background_theory),true_clauses())
         
@@ -143,9 +145,11 @@ class ProgressiveDomain(object):
         del self.memo
         
     def post(self,theory,background_theory,new_sym,to_keep):
-        self.post_init(theory,background_theory,new_sym,to_keep)
-        res = self.post_step(self.concept_spaces)
-        self.post_quit()
+        # the cube checks run in a scope of the current solver session, if any
+        with query_solver(and_clauses(theory,background_theory)) as solver:
+            self.post_init(theory,background_theory,new_sym,to_keep,solver)
+            res = self.post_step(self.concept_spaces)
+            self.post_quit()
         return res
 
 def var_corr(terms1,terms2):
@@ -204,7 +208,7 @@ def is_sat(solver,f):
     ctx = z3.main_ctx()
     z3.Z3_solver_assert(ctx.ref(), solver.solver, f.as_ast())
     #solver.add(f)
-    res = solver.check() != z3.unsat
+    res = check_within_limits(solver) != z3.unsat
     solver.pop()
     return res
 
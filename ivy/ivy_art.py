@@ -3,11 +3,9 @@
 #
 import ivy_actions
 from ivy_interp import *
-from ivy_graph import standard_graph
 import ivy_utils as iu
 import ivy_module as im
 from cy_elements import CyElements
-from dot_layout import dot_layout
 from string import *
 import copy
 import functools
@@ -310,6 +308,7 @@ class AnalysisGraph(object):
             clauses = state.clauses
         bg = self.domain.background_theory(state.in_scope)
 #        print "bg: {}".format(bg)
+        from ivy_graph import standard_graph # needs graphviz, so load on demand
         sg = standard_graph(state)
         # TODO: following shouldn't be needed.
         sg.current.set_state(and_clauses(clauses,bg))
@@ -439,6 +438,7 @@ class AnalysisGraph(object):
                     yield equation
 
     def as_cy_elements(self):
+        from dot_layout import dot_layout # needs graphviz, so load on demand
         return dot_layout(render_rg(self),edge_labels=True)
 
 def label_from_action(action):
@@ -13,16 +13,33 @@ import re
 class AST(object):
     """
     Base class for abstract syntax.
+
+    Nodes are slotted and have no instance dictionary. Every subclass
+    must declare __slots__, listing any attribute it sets beyond args
+    and lineno (a subclass that omits __slots__ silently gets a
+    dictionary back). An unset slot raises AttributeError, so
+    hasattr(ast,'lineno') still works.
     """
+    __slots__ = ('args','lineno')
     def __init__(self,*args):
         self.args = args
     def clone(self,args):
        res = type(self)(*args)
-       if hasattr(self,'lineno'):
-           res.lineno = self.lineno
+       copy_lineno(self,res)
        return res
 
+_get_lineno = AST.lineno.__get__
+_set_lineno = AST.lineno.__set__
+
+def copy_lineno(src,dst):
+    """ copy the line number of src, if any, to dst """
+    try:
+        _set_lineno(dst,_get_lineno(src))
+    except AttributeError:
+        pass
+
 class Symbol(AST):
+    __slots__ = ('rep','sort')
     def __init__(self,rep,sort):
         assert isinstance(rep,str)
         self.rep = rep
@@ -42,6 +59,7 @@ class Formula(AST):
     """
     Base class for formulas.
     """
+    __slots__ = ()
     def __init__(self,*args):
         self.args = list(args) # make args mutable
     
@@ -49,6 +67,7 @@ class And(Formula):
     """
     Conjunction of formulas.
     """
+    __slots__ = ()
     def __repr__(self):
         if not self.args:
             return "true"
@@ -58,6 +77,7 @@ class Or(Formula):
     """
     Disjunction of a formulas.
     """
+    __slots__ = ()
     def __repr__(self):
         if not self.args:
             return "false"
@@ -67,6 +87,7 @@ class Not(Formula):
     """
     Negation of a formula.
     """
+    __slots__ = ()
     def __init__(self,*args):
         assert len(args) == 1
         self.args = args
@@ -79,6 +100,7 @@ class Let(Formula):
     """
     Formula of the form let p(X,...,Z) <-> fmla[X,...,Z], ... in fmla
     """
+    __slots__ = ()
     def __init__(self,*args):
         assert len(args) >= 1
         self.args = args
@@ -97,6 +119,7 @@ class Definition(Formula):
     """
     Formula of the form p(X,...,Z) <-> fmla[X,...,Z]
     """
+    __slots__ = ()
     def __init__(self,*args):
         assert len(args) == 2
         self.args = args
@@ -113,6 +136,7 @@ class Implies(Formula):
     """
     Implication of formulas
     """
+    __slots__ = ()
     def __init__(self,*args):
         assert len(args) == 2
         self.args = args
@@ -123,6 +147,7 @@ class Iff(Formula):
     """
     Implication of formulas
     """
+    __slots__ = ()
     def __init__(self,*args):
         assert len(args) == 2
         self.args = args
@@ -133,6 +158,7 @@ class Ite(AST):
     """
     If-the-else expression. 
     """
+    __slots__ = ()
     def __init__(self,*args):
         assert len(args) == 3
         self.args = args
@@ -140,28 +166,29 @@ class Ite(AST):
         return '(' + repr(self.args[1]) + ' if ' + repr(self.args[0]) + ' else ' + repr(self.args[2]) + ')'
 
 class Quantifier(Formula):
+    __slots__ = ('bounds',)
     def __init__(self, bounds, body):
         self.bounds = bounds
         self.args = [body]
     def clone(self,args):
         res = type(self)(self.bounds,*args)
-        if hasattr(self,'lineno'):
-            res.lineno = self.lineno
+        copy_lineno(self,res)
         return res
 
 class Forall(Quantifier):
-    pass
+    __slots__ = ()
 
 class Exists(Quantifier):
-    pass
+    __slots__ = ()
 
 class This(AST):
-    pass
+    __slots__ = ()
 
 class Atom(Formula):
     """
     A n-ary relation symbol applied to n terms
     """
+    __slots__ = ('rep','sort')
     def __init__(self, relsym, *terms):
         assert not(isinstance(relsym,Atom)), relsym
         self.rep = relsym
@@ -183,14 +210,12 @@ class Atom(Formula):
     def suffix(self,s):
         res = self.clone(self.args)
         res.rep = res.rep + s
-        if hasattr(self,'lineno'):
-            res.lineno = self.lineno
+        copy_lineno(self,res)
         return res
     def rename(self,s):
         res = self.clone(self.args)
         res.rep = s
-        if hasattr(self,'lineno'):
-            res.lineno = self.lineno
+        copy_lineno(self,res)
         return res
         
     # following for backward compat
@@ -209,6 +234,7 @@ class Atom(Formula):
 
 
 class Term(AST):
+    __slots__ = ()
     def __eq__(self, other):
         return _eq_lit(self, other)
 
@@ -217,12 +243,14 @@ class Term(AST):
 
 
 class Old(Term):
+    __slots__ = ()
     def __init__(self, term):
         self.args = [term]
     def __repr__(self):
         return 'old ' + repr(self.args[0])
 
 class App(Term):
+    __slots__ = ('rep','sort')
     def __init__(self, funsym, *terms):
         self.rep = funsym
         self.args = flatten(terms)
@@ -256,6 +284,7 @@ class App(Term):
 Constant = App  # compat
 
 class Variable(Term):
+    __slots__ = ('rep','sort')
     def __init__(self, rep, sort):
         assert isinstance(rep,str)
 #        assert isinstance(sort,Sort)
@@ -284,6 +313,7 @@ class Literal(AST):
     Either a positive or negative atomic formula. Literals are not
     formulas! Use Not(Atom(...)) to get a formula.
     """
+    __slots__ = ('polarity','atom')
     def __init__(self, polarity, atom):
 #        assert isinstance(atom,Atom) or isinstance(atom,And) and len(atom.args) == 0
         self.polarity = polarity
@@ -326,6 +356,7 @@ class Predicate(object):
         return Literal(1, Atom(self.name, terms))
 
 class Some(AST):
+    __slots__ = ()
     def __repr__(self):
         return 'some ' +  ','.join(str(a) for a in self.params()) + '. ' + str(self.fmla()) + self.extra()
     def params(self):
@@ -336,6 +367,7 @@ class Some(AST):
         return ''
     
 class SomeMinMax(Some):
+    __slots__ = ()
     def params(self):
         return list(self.args[0:-2])
     def fmla(self):
@@ -344,14 +376,17 @@ class SomeMinMax(Some):
         return self.args[-1]
 
 class SomeMin(SomeMinMax):
+    __slots__ = ()
     def extra(self):
         return ' minimizing ' + str(self.index())
 
 class SomeMax(SomeMinMax):
+    __slots__ = ()
     def extra(self):
         return ' maximizing ' + str(self.index())
     
 class SomeExpr(AST):
+    __slots__ = ()
     def __init__(self,*args):
         assert len(args) >= 2
         self.args = args
@@ -372,9 +407,10 @@ class SomeExpr(AST):
         return self.args[3] if len(self.args) == 4 else None
 
 class Sort(AST):
-    pass
+    __slots__ = ()
 
 class EnumeratedSort(Sort):
+    __slots__ = ()
     @property
     def extension(self):
         return [a.rep for a in self.args]
@@ -391,6 +427,7 @@ class EnumeratedSort(Sort):
 
 
 class ConstantSort(Sort):
+    __slots__ = ()
     def __str__(self):
         return 'uninterpreted'
     def defines(self):
@@ -402,6 +439,7 @@ class ConstantSort(Sort):
         return []
         
 class StructSort(Sort):
+    __slots__ = ()
     def __str__(self):
         return 'struct {' + ','.join(map(str,self.args)) + '}'
     def defines(self):
@@ -410,6 +448,7 @@ class StructSort(Sort):
 UninterpretedSort = ConstantSort
 
 class FunctionSort(Sort):
+    __slots__ = ('dom','rng')
     def __init__(self,dom,rng):
         self.dom,self.rng = dom,rng
     def __repr__(self):
@@ -418,6 +457,7 @@ class FunctionSort(Sort):
         return []
 
 class RelationSort(Sort):
+    __slots__ = ('dom',)
     def __init__(self,dom):
         self.dom = dom
     def __repr__(self):
@@ -426,6 +466,7 @@ class RelationSort(Sort):
         return []
     
 class Tuple(AST):
+    __slots__ = ()
     def __repr__(self):
         return '(' + ','.join(repr(s) for s in self.args) + ')' 
 
@@ -436,6 +477,7 @@ def lineno(c):
         return None
 
 class Decl(AST):
+    __slots__ = ()
     def __init__(self,*args):
         self.args = args
     def __repr__(self):
@@ -448,6 +490,7 @@ class Decl(AST):
 
 
 class ModuleDecl(Decl):
+    __slots__ = ()
     def name(self):
         return 'module'
     def defines(self):
@@ -456,6 +499,7 @@ class ModuleDecl(Decl):
         return 'module ' + ','.join(repr(d.args[0]) + ' = {\n' + repr(d.args[1]) + '\n}' for d in self.args)
 
 class MacroDecl(Decl):
+    __slots__ = ()
     def name(self):
         return 'macro'
     def defines(self):
@@ -464,6 +508,7 @@ class MacroDecl(Decl):
         return 'macro ' + ','.join(repr(d.args[0]) + ' = {\n' + repr(d.args[1]) + '\n}' for d in self.args)
 
 class ObjectDecl(Decl):
+    __slots__ = ()
     def name(self):
         return 'object'
     def defines(self):
@@ -471,6 +516,7 @@ class ObjectDecl(Decl):
 #        return []
 
 class LabeledFormula(AST):
+    __slots__ = ()
     @property
     def label(self):
         return self.args[0]
@@ -481,104 +527,124 @@ class LabeledFormula(AST):
         return '[' + str(self.label) + '] ' + str(self.formula) if self.label else str(self.formula)
 
 class AxiomDecl(Decl):
+    __slots__ = ()
     def name(self):
         return 'axiom'
 
 class PropertyDecl(AxiomDecl):
+    __slots__ = ()
     def name(self):
         return 'property'
 
 class ConjectureDecl(Decl):
+    __slots__ = ()
     def name(self):
         return 'conjecture'
 
 class SchemaDecl(Decl):
+    __slots__ = ()
     def name(self):
         return 'schema'
     def defines(self):
         return [(c.defines(),lineno(c)) for c in self.args]
 
 class Instantiation(AST):
+    __slots__ = ()
     def __init__(self,*args):
         self.args = args
     def __repr__(self):
         return ' : '.join(repr(x) for x in self.args) if self.args[0] else repr(self.args[1])
 
 class InstantiateDecl(Decl):
+    __slots__ = ()
     def name(self):
         return 'instantiate'
 
 class RelationDecl(Decl):
+    __slots__ = ()
     def name(self):
         return 'relation'
     def defines(self):
         return [(c.relname,lineno(c)) for c in self.args if c.relname not in iu.polymorphic_symbols]
 
 class ConstantDecl(Decl):
+    __slots__ = ()
     def name(self):
         return 'individual'
     def defines(self):
         return [(c.rep,lineno(c)) for c in self.args if c.rep not in iu.polymorphic_symbols]
 
 class DestructorDecl(ConstantDecl):
+    __slots__ = ()
     def name(self):
         return 'destructor'
 
 class DerivedDecl(Decl):
+    __slots__ = ()
     def name(self):
         return 'derived'
     def defines(self):
         return [(c.formula.defines(),lineno(c.formula)) for c in self.args]
 
 class DefinitionDecl(Decl):
+    __slots__ = ()
     def name(self):
         return 'definition'
     def defines(self):
         return []
 
 class ProgressDecl(Decl):
+    __slots__ = ()
     def name(self):
         return 'progress'
     def defines(self):
         return [(c.defines(),lineno(c)) for c in self.args]
 
 class RelyDecl(Decl):
+    __slots__ = ()
     def name(self):
         return 'rely'
     def defines(self):
         return []
 
 class MixOrdDecl(Decl):
+    __slots__ = ()
     def name(self):
         return 'mixord'
     def defines(self):
         return []
 
 class ConceptDecl(Decl):
+    __slots__ = ()
     def name(self):
         return 'concept'
     def defines(self):
         return [(c.defines(),lineno(c)) for c in self.args]
 
 class ActionDecl(Decl):
+    __slots__ = ()
     def name(self):
         return 'action'
     def defines(self):
         return [(c.defines(),lineno(c)) for c in self.args]
 
 class StateDecl(Decl):
+    __slots__ = ()
     def name(self):
         return 'state'
 
 class InitDecl(Decl):
+    __slots__ = ()
     def name(self):
         return 'init'
 
 class UpdateDecl(Decl):
+    __slots__ = ()
     def name(self):
         return 'update'
 
 class TypeDecl(Decl):
+    __slots__ = ()
     def name(self):
         return 'type'
     def defines(self):
@@ -588,51 +654,60 @@ class TypeDecl(Decl):
         return res
 
 class AssertDecl(Decl):
+    __slots__ = ()
     def name(self):
         return 'assert'
     def defines(self):
         return []
 
 class InterpretDecl(Decl):
+    __slots__ = ()
     def name(self):
         return 'interpret'
     def defines(self):
         return []
 
 class MixinDecl(Decl):    
+    __slots__ = ()
     def name(self):
         return 'mixin'
     def defines(self):
         return []
     
 class MixinDef(AST):
+    __slots__ = ()
     def mixer(self):
         return self.args[0].relname
     def mixee(self):
         return self.args[1].relname
     
 class MixinBeforeDef(MixinDef):
+    __slots__ = ()
     def __str__(self):
         return self.mixer() + " before " + self.mixee()
     pass
     
 class MixinImplementDef(MixinBeforeDef):
+    __slots__ = ()
     def __str__(self):
         return self.mixer() + " implement " + self.mixee()
     pass
 
 class MixinAfterDef(MixinDef):
+    __slots__ = ()
     def __str__(self):
         return self.mixer() + " after " + self.mixee()
     pass
 
 class IsolateDecl(Decl):    
+    __slots__ = ()
     def name(self):
         return 'isolate'
     def defines(self):
         return [(c.name(),lineno(c)) for c in self.args]
     
 class IsolateDef(AST):
+    __slots__ = ('with_args',)
     def name(self):
         return self.args[0].relname
     def verified(self):
@@ -656,18 +731,20 @@ class IsolateDef(AST):
         return res
         
 class TrustedIsolateDef(IsolateDef):
-    pass
+    __slots__ = ()
 
 class ExtractDef(IsolateDef):
-    pass
+    __slots__ = ()
 
 class ExportDecl(Decl):    
+    __slots__ = ()
     def name(self):
         return 'export'
     def defines(self):
         return []
     
 class ExportDef(AST):
+    __slots__ = ()
     def exported(self):
         return self.args[0].relname
     def scope(self):
@@ -676,12 +753,14 @@ class ExportDef(AST):
         return self.exported() + (' from {}'.format(self.scope()) if self.scope() else '')
 
 class ImportDecl(Decl):    
+    __slots__ = ()
     def name(self):
         return 'import_'
     def defines(self):
         return []
     
 class ImportDef(AST):
+    __slots__ = ()
     def imported(self):
         return self.args[0].relname
     def scope(self):
@@ -690,18 +769,21 @@ class ImportDef(AST):
         return self.imported() + (' from {}'.format(self.scope()) if self.scope() else '')
 
 class PrivateDecl(Decl):    
+    __slots__ = ()
     def name(self):
         return 'private'
     def defines(self):
         return []
     
 class PrivateDef(AST):
+    __slots__ = ()
     def privatized(self):
         return self.args[0].relname
     def __repr__(self):
         return 'private {}'.format(self.args[0])
 
 class AliasDecl(Decl):
+    __slots__ = ()
     def name(self):
         return 'alias'
     def defines(self):
@@ -709,12 +791,14 @@ class AliasDecl(Decl):
     
 
 class DelegateDecl(Decl):    
+    __slots__ = ()
     def name(self):
         return 'delegate'
     def defines(self):
         return []
     
 class DelegateDef(AST):
+    __slots__ = ()
     def delegated(self):
         return self.args[0].relname
     def delegee(self):
@@ -729,6 +813,7 @@ class DelegateDef(AST):
 
 
 class NativeCode(AST):
+    __slots__ = ('code',)
     def __init__(self,string):
         self.args = []
         self.code = string
@@ -744,11 +829,13 @@ class NativeCode(AST):
 
 class NativeType(AST):
     """ Quote native type """
+    __slots__ = ()
     def __str__(self):
         return ivy_ast.native_to_string(self.args)
 
 class NativeExpr(AST):
     """ Quote native expr """
+    __slots__ = ('sort',)
     def __str__(self):
         return native_to_string(self.args)
     def clone(self,args):
@@ -767,6 +854,7 @@ def native_to_string(args):
     
 
 class NativeDef(AST):
+    __slots__ = ()
     def name(self):
         return 'native'
     def __str__(self):
@@ -775,6 +863,7 @@ class NativeDef(AST):
         return res
 
 class NativeDecl(Decl):
+    __slots__ = ()
     def name(self):
         return 'native'
     def defines(self):
@@ -782,6 +871,7 @@ class NativeDecl(Decl):
         
 
 class TypeDef(Definition):
+    __slots__ = ()
     def __init__(self,name,sort):
         self.args = [name,sort]
     def __repr__(self):
@@ -798,9 +888,10 @@ class TypeDef(Definition):
         return self.args[1]
 
 class GhostTypeDef(TypeDef):
-    pass
+    __slots__ = ()
 
 class ActionDef(Definition):
+    __slots__ = ('formal_params','formal_returns')
     def __init__(self,atom,action,formals=[],returns=[]):
         # we rename the formals to avoid name capture
         self.formal_params = [s.prefix('fml:') for s in formals]
@@ -837,6 +928,7 @@ def rewrite_param(p,rewrite):
     return res
 
 class StateDef(Definition):
+    __slots__ = ()
     def __init__(self,name,state):
         self.args = [Atom(name,[]),state]
     def __repr__(self):
@@ -1089,6 +1181,7 @@ def is_false(ast):
     return isinstance(ast,Or) and len(ast.args) == 0
 
 class Range(AST):
+    __slots__ = ('lo','hi')
     def __init__(self,lo,hi):
         self.args = []
         self.lo, self.hi = lo,hi
@@ -6,7 +6,6 @@ import ivy_interp as itp
 import ivy_actions as act
 import ivy_utils as utl
 import ivy_logic_utils as lut
-import tk_ui as ui
 import ivy_logic as lg
 import ivy_utils as iu
 import ivy_module as im
@@ -16,16 +15,26 @@ import ivy_interp
 import ivy_compiler
 import ivy_isolate
 import ivy_ast
+import ivy_solver
 
 import sys
+import os
+import time
+import hashlib
+import StringIO
 
 diagnose = iu.BooleanParameter("diagnose",False)
 coverage = iu.BooleanParameter("coverage",True)
 checked_action = iu.Parameter("action","")
 opt_trusted = iu.BooleanParameter("trusted",False)
+opt_stats = iu.BooleanParameter("stats",False)
+opt_stats_file = iu.Parameter("stats_file","")
+opt_stats_top = iu.Parameter("stats_top",10,check=lambda s: s.isdigit(),process=int)
+opt_watch = iu.BooleanParameter("watch",False)
 
 def display_cex(msg,ag):
     if diagnose.get():
+        import tk_ui as ui
         ui.ui_main_loop(ag)
         exit(1)
     raise iu.IvyError(None,msg)
@@ -34,6 +43,7 @@ def check_properties():
     if itp.false_properties():
         if diagnose.get():
             print "Some properties failed."
+            import tk_ui as ui
             gui = ui.new_ui()
             gui.tk.update_idletasks() # so that dialog is on top of main window
             gui.try_property()
@@ -50,6 +60,7 @@ def check_conjectures(kind,msg,ag,state):
         if diagnose.get():
             print "{} failed.".format(kind)
             iu.dbg('ag.states[0].clauses')
+            import tk_ui as ui
             gui = ui.new_ui()
             agui = gui.add(ag)
             gui.tk.update_idletasks() # so that dialog is on top of main window
@@ -84,9 +95,14 @@ def get_checked_actions():
         raise iu.IvyError(None,'{} is not an exported action'.format(cact))
     return [cact] if cact else sorted(im.module.public_actions)
 
-def check_module():
+def check_module(previous=None,results=None):
     # If user specifies an isolate, check it. Else, if any isolates
     # are specificied in the file, check all, else check globally.
+    #
+    # With "results", a dict, the outcome of each isolate is recorded
+    # there rather than raised, and an isolate is not checked again
+    # if it is unchanged since its result in "previous" (see
+    # watch_module).
 
     missing = []
 
@@ -115,48 +131,249 @@ def check_module():
             ivy_isolate.create_isolate(isolate) # ,ext='ext'
             if opt_trusted.get():
                 continue
-            with im.module.theory_context():
-                check_properties()
+            if results is not None:
+                check_isolate_incremental(isolate,previous,results)
+                continue
+            with ivy_solver.obligation(isolate=isolate):
+                check_isolate()
+
+def check_isolate_incremental(isolate,previous,results):
+    digest = isolate_digest()
+    old = previous.get(isolate)
+    if old is not None and old[0] == digest:
+        print "unchanged, reusing result: {}".format(old[1])
+        results[isolate] = old
+        return
+    try:
+        with ivy_solver.obligation(isolate=isolate):
+            check_isolate()
+        outcome = 'OK'
+    except iu.IvyError as e:
+        print str(e)
+        outcome = 'FAIL'
+    results[isolate] = (digest,outcome)
+
+def isolate_digest():
+    """ A digest of the isolate created in the current module: its
+    actions and assertions, initializers, axioms, properties,
+    conjectures, definitions and signature. create_isolate keeps only
+    what the isolate verifies or has present (see
+    ivy_isolate.get_isolate_info), so checking an isolate depends only
+    on this. Line numbers are included, since they appear in the
+    output. """
+    mod = im.module
+    h = hashlib.sha1()
+    def add(*things):
+        for thing in things:
+            h.update(str(thing) + '\0')
+    for name in sorted(mod.actions):
+        action = mod.actions[name]
+        add(name,action.lineno,action,getattr(action,'formal_params',None),
+            getattr(action,'formal_returns',None))
+        add(*[a.lineno for a in action.iter_subactions() if isinstance(a,act.AssertAction)])
+    add(*sorted(mod.public_actions))
+    for name,action in mod.initializers:
+        add(name,action)
+    for lf in mod.labeled_axioms + mod.labeled_props + mod.labeled_inits + mod.labeled_conjs + mod.definitions:
+        add(lf.lineno,lf)
+    add(*mod.get_axioms())
+    add(mod.init_cond,*(mod.progress + mod.rely + mod.mixord))
+    for sort in sorted(mod.sort_destructors):
+        add(sort,*mod.sort_destructors[sort])
+    sig = mod.sig
+    add(*sorted('{}:{}'.format(name,sort) for name,sort in sig.sorts.iteritems()))
+    add(*sorted('{}:{}'.format(name,sym.sort) for name,sym in sig.symbols.iteritems()))
+    add(*sorted('{}:{}'.format(name,x) for name,x in sig.interp.iteritems()))
+    return h.hexdigest()
+
+def check_isolate():
+    """ Check the proof obligations of the isolate created in the current module. """
+    with im.module.theory_context():
+        check_properties()
+        # with incremental=true, the queries of the isolate that include
+        # its background theory share one solver
+        with ivy_solver.SolverSession():
+            with ivy_solver.obligation(check='initial state'):
                 ag = ivy_art.AnalysisGraph(initializer=ivy_alpha.alpha)
-                if im.module.initializers:
+            if im.module.initializers:
+                with ivy_solver.obligation(check='initializer'):
                     cex = ag.check_bounded_safety(ag.states[0])
-                    if cex is not None:
-                        display_cex("safety failed in initializer",cex)
-                with ivy_interp.EvalContext(check=False):
+                if cex is not None:
+                    display_cex("safety failed in initializer",cex)
+            with ivy_interp.EvalContext(check=False):
+                with ivy_solver.obligation(check='initiation'):
                     check_conjectures('Initiation','These conjectures are false initially.',ag,ag.states[0])
-#                    show_assertions()
-                    for actname in get_checked_actions():
-                        old_checked_assert = act.checked_assert.get()
-                        print "trying {}...".format(actname)
-                        assertions = find_assertions(actname)
-                        if act.checked_assert.get():
-                            assertions = [a for a in assertions if a.lineno == act.checked_assert.get()]
-                        tried = set()
-                        for asn in assertions:
-                            if asn.lineno not in tried:
-                                tried.add(asn.lineno)
-                                act.checked_assert.value = asn.lineno
-                                print '{}: {}'.format(asn.lineno,asn)
-                                ag.execute_action(actname,prestate=ag.states[0])
-                                cex = ag.check_bounded_safety(ag.states[-1],bound=1)
-                                if cex is not None:
-                                    display_cex("safety failed",cex)
-                        print "checking consecution..."
-                        ag.execute_action(actname,prestate=ag.states[0],abstractor=ivy_alpha.alpha)
-                        check_conjectures('Consecution','These conjectures are not inductive.',ag,ag.states[-1])
-                        act.checked_assert.value = old_checked_assert
+#                show_assertions()
+                for actname in get_checked_actions():
+                    with ivy_solver.obligation(action=actname):
+                        check_action(ag,actname)
+
+def check_action(ag,actname):
+    old_checked_assert = act.checked_assert.get()
+    print "trying {}...".format(actname)
+    assertions = find_assertions(actname)
+    if act.checked_assert.get():
+        assertions = [a for a in assertions if a.lineno == act.checked_assert.get()]
+    tried = set()
+    for asn in assertions:
+        if asn.lineno not in tried:
+            tried.add(asn.lineno)
+            act.checked_assert.value = asn.lineno
+            print '{}: {}'.format(asn.lineno,asn)
+            with ivy_solver.obligation(assertion=asn.lineno):
+                ag.execute_action(actname,prestate=ag.states[0])
+                cex = ag.check_bounded_safety(ag.states[-1],bound=1)
+            if cex is not None:
+                display_cex("safety failed",cex)
+    print "checking consecution..."
+    with ivy_solver.obligation(check='consecution'):
+        ag.execute_action(actname,prestate=ag.states[0],abstractor=ivy_alpha.alpha)
+        check_conjectures('Consecution','These conjectures are not inductive.',ag,ag.states[-1])
+    act.checked_assert.value = old_checked_assert
+
+
+def report_stats():
+    """ Report the solver statistics collected with "stats=true" or "stats_file=<file>" """
+    if opt_stats.get():
+        ivy_solver.print_query_stats(opt_stats_top.get())
+    if opt_stats_file.get():
+        ivy_solver.write_query_stats(opt_stats_file.get())
+
+def watched_files(fname,text):
+    """ The files that the check of file fname, with contents text,
+    read, mapped to their content hashes. These are fname and the files
+    of the modules it imported (see ivy_compiler.module_imports). A
+    module is looked for in several places (see
+    ivy_compiler.module_file_names). The places before the one where it
+    was found map to None, since creating a file there changes the
+    module. """
+    res = {fname:ivy_compiler.content_hash(text)}
+    for name,found,digest in ivy_compiler.module_imports:
+        for fn in ivy_compiler.module_file_names(name):
+            if fn == found:
+                res[fn] = digest
+                break
+            res[fn] = None
+    return res
+
+def file_hash(fn):
+    """ The content hash of file fn, or None if it cannot be read """
+    try:
+        with open(fn) as f:
+            return ivy_compiler.content_hash(f.read())
+    except IOError:
+        return None
+
+def files_changed(files):
+    return any(file_hash(fn) != digest for fn,digest in files.iteritems())
+
+slot_names = {} # the slots of each AST class, base classes first
+
+def parse_digest(decls):
+    """ A digest of the parse decls: the type and every field, including
+    the line number, of every node. Compiling the module and creating
+    its isolates depend only on this, given the parameters. """
+    out = []
+    put = out.append
+    def walk(x):
+        if isinstance(x,ivy_ast.AST):
+            cls = type(x)
+            names = slot_names.get(cls)
+            if names is None:
+                names = slot_names[cls] = [n for c in reversed(cls.__mro__) for n in c.__dict__.get('__slots__',())]
+            put(cls.__name__)
+            for name in names:
+                if hasattr(x,name):
+                    put(name)
+                    walk(getattr(x,name))
+        elif isinstance(x,(list,tuple)):
+            put('[{}'.format(len(x)))
+            for y in x:
+                walk(y)
+        elif isinstance(x,(set,frozenset)):
+            put('{{{}'.format(len(x)))
+            for y in sorted(x):
+                walk(y)
+        elif isinstance(x,dict):
+            put('{{{}:'.format(len(x)))
+            for k in sorted(x):
+                walk(k)
+                walk(x[k])
+        elif hasattr(x,'__dict__'): # an ivy_parser.Ivy or Instance
+            put(type(x).__name__)
+            walk(x.__dict__)
+        else:
+            put(repr(x))
+    walk(decls)
+    return hashlib.sha1('\0'.join(out)).hexdigest()
 
+watch_interval = 1.0 # seconds between checks for changed files
 
+def watch_module(fname):
+    """ Check the module in file fname, then check it again whenever a
+    file it read changes, until interrupted. If the parse is unchanged,
+    the previous results are kept without compiling the module.
+    Otherwise, isolates that are unchanged keep their previous result.
+    Each pass starts from the initial action counters and, with
+    "stats", empty solver statistics, so it reports what a fresh run
+    would. """
+    results = {}
+    parsed = None # the parse_digest of the results
+    while True:
+        if opt_stats.get() or opt_stats_file.get():
+            ivy_solver.start_query_stats()
+        ivy_compiler.set_action_counters((0,0,0))
+        ivy_compiler.module_imports = []
+        with open(fname) as f:
+            text = f.read()
+        with im.Module():
+            try:
+                with iu.SourceFile(fname):
+                    decls = ivy_compiler.read_module(StringIO.StringIO(text))
+                digest = parse_digest(decls)
+                if digest == parsed:
+                    print "unchanged, reusing results"
+                    new_results = results
+                else:
+                    new_results = {}
+                    with iu.SourceFile(fname):
+                        ivy_compiler.ivy_compile(decls,create_isolate=False)
+                        im.module.name = fname[:fname.rindex('.')]
+                    check_module(results,new_results)
+                failed = sorted(str(k) for k,v in new_results.iteritems() if v[1] != 'OK')
+                print "FAIL: {}".format(', '.join(failed)) if failed else "OK"
+                results,parsed = new_results,digest
+            except iu.IvyError as e:
+                if not hasattr(e,'filename'):
+                    e.filename = fname
+                print str(e)
+            finally:
+                report_stats()
+        files = watched_files(fname,text)
+        print "watching for changes..."
+        while not files_changed(files):
+            time.sleep(watch_interval)
 
 def main():
     ivy.read_params()
     iu.set_parameters({'mode':'induction'})
     if len(sys.argv) != 2 or not sys.argv[1].endswith('ivy'):
         usage()
+    if opt_stats.get() or opt_stats_file.get():
+        ivy_solver.start_query_stats()
+    if opt_watch.get():
+        try:
+            watch_module(sys.argv[1])
+        except KeyboardInterrupt:
+            pass
+        return
     with im.Module():
         with utl.ErrorPrinter():
             ivy.source_file(sys.argv[1],ivy.open_read(sys.argv[1]),create_isolate=False)
-            check_module()
+            try:
+                check_module()
+            finally:
+                report_stats()
     print "OK"
 
 
@@ -23,6 +23,12 @@ import ivy_theory as ith
 import ivy_isolate as iso
 import ivy_printer
 from collections import defaultdict
+import cPickle
+import hashlib
+import multiprocessing
+import os
+import re
+import sys
 
 class IvyDeclInterp(object):
     def __call__(self,ivy):
@@ -710,18 +716,241 @@ def ivy_compile(decls,mod=None,create_isolate=True,**kwargs):
             im.module.theory_context().__enter__()
 
 
-def clear_rules(modname):
-    import sys
-    if modname in sys.modules:
-        d = sys.modules[modname].__dict__
-    else:
-        d = sys.modules['ivy.' + modname].__dict__
-    for s in list(d):
-        if s.startswith('p_'):
-            del d[s]
+# Cache of parsed modules. With "module_cache=<dir>", the result of
+# parsing a top-level file is stored in <dir>, keyed on the text of
+# the file, its name and the cache version (see module_cache_version).
+# An entry records the files imported while parsing, as resolved
+# names and content hashes, and is used only if the imports still
+# resolve to the same files with the same contents.
+
+module_cache = iu.Parameter("module_cache","")
+
+module_cache_format = 1
+
+# the modules whose code determines the result of parsing
+module_cache_sources = ['ivy_parser','ivy_logic_parser','ivy_lexer','ivy_ast','ivy_actions','ivy_utils']
+
+parse_imports = None # imports recorded while parsing, or None
+
+# The imports of the last top-level file parsed, as (name,file,content
+# hash) triples, in the order they were read. File and hash are None
+# for a module that was not found.
+module_imports = []
+
+def content_hash(text):
+    return hashlib.sha1(text).hexdigest()
+
+def module_cache_version():
+    """ Fingerprint of the cache format, the Python version and the
+    source of the parser modules. Changing any of these invalidates
+    the cache. """
+    if not hasattr(module_cache_version,'value'):
+        h = hashlib.sha1('{} {}'.format(module_cache_format,sys.version))
+        for name in module_cache_sources:
+            mod = sys.modules.get(name) or sys.modules['ivy.' + name]
+            fn = mod.__file__
+            if fn.endswith('.pyc') or fn.endswith('.pyo'):
+                fn = fn[:-1]
+            with open(fn) as f:
+                h.update(f.read())
+        module_cache_version.value = h.hexdigest()
+    return module_cache_version.value
+
+def action_counters():
+    return (ia.choice_action_ctr,ia.local_action_ctr,ia.call_action_ctr)
+
+def set_action_counters(ctrs):
+    ia.choice_action_ctr,ia.local_action_ctr,ia.call_action_ctr = ctrs
+
+def module_cache_file(text):
+    key = content_hash('\0'.join([module_cache_version(),str(iu.filename),text]))
+    return os.path.join(module_cache.get(),key + '.cache')
+
+def cached_imports_valid(imports):
+    for name,fname,digest in imports:
+        found = find_module_file(name)
+        if found is None or found[0] != fname:
+            return False
+        with found[1] as f:
+            if content_hash(f.read()) != digest:
+                return False
+    return True
+
+def load_cached_module(text):
+    """ Return the cached parse of text and its imports, or None. The entry is used only
+    if the action counters are as they were when it was stored, since the
+    parsed actions contain unique ids drawn from them. """
+    try:
+        with open(module_cache_file(text),'rb') as f:
+            entry = cPickle.load(f)
+    except Exception:
+        return None
+    # Check the format before unpacking, so that an entry written by
+    # another version of ivy is just a miss.
+    if not (isinstance(entry,tuple) and len(entry) == 4 and entry[0] == module_cache_version()):
+        return None
+    version,imports,ctrs,decls = entry
+    if ctrs[0] != action_counters():
+        return None
+    if not cached_imports_valid(imports):
+        return None
+    set_action_counters(ctrs[1])
+    return decls,imports
+
+def store_cached_module(text,imports,ctrs,decls):
+    dname = module_cache.get()
+    fname = module_cache_file(text)
+    try:
+        if not os.path.isdir(dname):
+            os.makedirs(dname)
+        tmpname = '{}.{}.tmp'.format(fname,os.getpid())
+        with open(tmpname,'wb') as f:
+            cPickle.dump((module_cache_version(),imports,ctrs,decls),f,cPickle.HIGHEST_PROTOCOL)
+        os.rename(tmpname,fname) # atomic, so concurrent runs don't see partial entries
+    except (IOError,OSError) as e:
+        iu.warn(None,'cannot write module cache {}: {}'.format(fname,e))
+
+def parse_with_cache(version_parser,s,nested):
+    global parse_imports,module_imports
+    parse = version_parser.parse
+    if nested:
+        return parse(s,nested)
+    text = iu.get_string_version() + '\n' + s
+    if module_cache.get():
+        cached = load_cached_module(text)
+        if cached is not None:
+            decls,module_imports = cached
+            return decls
+    start = action_counters()
+    parse_imports = []
+    try:
+        with IncludedParses(version_parser,s):
+            decls = parse(s,nested)
+    finally:
+        # on an error, these are the imports read so far
+        module_imports,parse_imports = parse_imports,None
+    if module_cache.get():
+        store_cached_module(text,module_imports,(start,action_counters()),decls)
+    return decls
+
+# Parallel parsing of included files. With "parse_jobs=<n>", the files
+# included by a top-level file are first parsed on their own, in a pool
+# of n processes (the parser keeps its state in globals, so threads
+# won't do). When the parse of the top-level file reaches an include,
+# the worker's result is used if the file had no errors and the
+# lookups that failed in the worker fail in the including context too
+# (see ivy_parser.lookups). Otherwise the file is parsed in context, as
+# usual. Either way, the result is that of a sequential parse.
+
+parse_jobs = iu.Parameter("parse_jobs",0,check=lambda s: s.isdigit(),process=int)
+
+include_directive = re.compile(r'^\s*include\s+(\w+)',re.MULTILINE)
+
+included_parses = None # the active IncludedParses, or None
+
+class IncludedParses(object):
+    """ Context manager that parses the files included by text s in a
+    pool of worker processes, for use by import_module. """
+
+    def __init__(self,version_parser,s):
+        self.version_parser = version_parser
+        self.names = []
+        for name in include_directive.findall(s):
+            if name not in self.names:
+                self.names.append(name)
+        self.pool = None
+
+    def __enter__(self):
+        global included_parses
+        jobs = min(parse_jobs.get(),len(self.names))
+        if jobs > 1:
+            self.pool = multiprocessing.Pool(jobs)
+            self.results = dict((name,self.pool.apply_async(parse_included,(name,)))
+                                for name in self.names)
+            included_parses = self
+        return self
+
+    def __exit__(self,exc_type,exc_val,exc_tb):
+        global included_parses
+        if self.pool is not None:
+            included_parses = None
+            self.pool.terminate()
+            self.pool.join()
+        return False
+
+    def get(self,name,fname):
+        """ Return the worker's parse of module "name", read from file
+        fname, if it can be used in the current context, else None. """
+        if name not in self.results:
+            return None
+        res = self.results.pop(name).get()
+        if res is None:
+            return None
+        wfname,digest,decls,stack,failed,imports,ctrs = cPickle.loads(res)
+        if wfname != fname or not self.version_parser.lookups_fail(failed):
+            return None
+        # The parser leaves an included file on its stack, so its
+        # modules are visible to the rest of the parse.
+        self.version_parser.stack.extend(stack)
+        start = action_counters()
+        shift_action_ids(stack,start)
+        set_action_counters(tuple(x+y for x,y in zip(start,ctrs)))
+        if parse_imports is not None:
+            parse_imports.append((name,fname,digest))
+            parse_imports.extend(imports)
+        return decls
+
+def parse_included(name):
+    """ Parse module "name" on its own, in a worker process. Return the
+    result pickled, or None if the file has errors. """
+    import ivy_parser
+    global parse_imports
+    found = find_module_file(name)
+    if found is None:
+        return None
+    fname,f = found
+    with f:
+        text = f.read()
+    header,_,rest = text.partition('\n')
+    if string.strip(header) != '#lang ivy' + iu.get_string_version():
+        return None
+    version_parser = ivy_parser.parser_module(iu.get_numeric_version())
+    version_parser.importer = import_module
+    version_parser.lookups = []
+    parse_imports = []
+    set_action_counters((0,0,0))
+    try:
+        with iu.SourceFile(fname):
+            decls = version_parser.parse('\n' + rest)
+    except Exception:
+        return None
+    return cPickle.dumps((fname,content_hash(text),decls,version_parser.stack,version_parser.lookups,
+                          parse_imports,action_counters()),cPickle.HIGHEST_PROTOCOL)
+
+def shift_action_ids(decls,ctrs):
+    """ Add ctrs to the unique ids of the actions in decls, which were
+    numbered from zero (see action_counters) """
+    classes = (ia.ChoiceAction,ia.LocalAction,ia.CallAction)
+    seen = set()
+    todo = [decls]
+    while todo:
+        x = todo.pop()
+        if id(x) in seen:
+            continue
+        seen.add(id(x))
+        for cls,ctr in zip(classes,ctrs):
+            if isinstance(x,cls):
+                x.unique_id += ctr
+        if isinstance(x,(list,tuple)):
+            todo.extend(x)
+        elif hasattr(x,'_decls'): # an ivy_parser.Ivy
+            todo.extend(x._decls)
+        elif hasattr(x,'module'): # an ivy_parser.Instance
+            todo.append(x.module)
+        elif hasattr(x,'args'):
+            todo.extend(x.args)
 
 def read_module(f,nested=False):
-    import ivy_logic_parser
     import ivy_parser
     header = f.readline()
     s = '\n' + f.read() # newline at beginning to preserve line numbers
@@ -730,16 +959,11 @@ def read_module(f,nested=False):
         version = header[len('#lang ivy'):]
         old_version = iu.get_string_version()
         iu.set_string_version(version)
-        if version != old_version:
-            if nested:
-                raise IvyError(None,'#lang ivy{} expected'.format(old_version)) 
-#            print "version: {}, old_version: {}".format(version,old_version)
-            clear_rules('ivy_logic_parser')
-            clear_rules('ivy_parser')
-            reload(ivy_logic_parser)
-            reload(ivy_parser)
-        ivy_parser.importer = import_module
-        decls = parse(s,nested)
+        if version != old_version and nested:
+            raise IvyError(None,'#lang ivy{} expected'.format(old_version)) 
+        version_parser = ivy_parser.parser_module(iu.get_numeric_version())
+        version_parser.importer = import_module
+        decls = parse_with_cache(version_parser,s,nested)
     elif header == '//lang dafny1':
         decls = dc.parse_to_ivy(s)
     else:
@@ -750,16 +974,36 @@ def read_module(f,nested=False):
         raise err
     return decls
 
-def import_module(name):
+def module_file_names(name):
+    """ The files where module "name" is looked for, in order: the
+    current directory, then the module path """
     fname = name + '.ivy'
-    try: 
-        f = open(fname,'r')
-    except Exception:
-        fname = os.path.join(os.path.dirname(os.path.abspath(__file__)),'include',fname)
+    return [fname,os.path.join(os.path.dirname(os.path.abspath(__file__)),'include',fname)]
+
+def find_module_file(name):
+    """ Return the file name and an open file for module "name", or None """
+    for fname in module_file_names(name):
         try:
-            f = open(fname,'r')
+            return fname,open(fname,'r')
         except Exception:
-            raise IvyError(None,"module {} not found in current directory or module path".format(name))
+            pass
+    return None
+
+def import_module(name):
+    found = find_module_file(name)
+    if found is None:
+        if parse_imports is not None:
+            parse_imports.append((name,None,None))
+        raise IvyError(None,"module {} not found in current directory or module path".format(name))
+    fname,f = found
+    if included_parses is not None:
+        mod = included_parses.get(name,fname)
+        if mod is not None:
+            f.close()
+            return mod
+    if parse_imports is not None:
+        parse_imports.append((name,fname,content_hash(f.read())))
+        f.seek(0)
     with iu.SourceFile(fname):
         mod = read_module(f,nested=True)
     return mod
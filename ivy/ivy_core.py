@@ -9,10 +9,47 @@ import ivy_utils as iu
 def get_id(x):
     return Z3_get_ast_id(x.ctx_ref(), x.as_ast())
 
+# Algorithm used to minimize unsat cores:
+#
+# deletion    -- drop one literal at a time (one check per literal)
+# quickxplain -- divide and conquer (Junker, "QuickXplain", AAAI 2004),
+#                which needs O(k log(n/k)) checks for a core of size k
+#                out of n literals
+
+core_minimizer = iu.EnumeratedParameter("core_minimizer",["deletion","quickxplain"],"deletion")
+
+def quickxplain(s,core):
+    """ Return a minimal unsatisfiable subset of the list core, which
+    must be unsatisfiable in s. Literals earlier in core are
+    preferred, that is, the result is the lexicographically least
+    minimal subset when literals are ranked by their order in core.
+    """
+    def qx(base,has_delta,cs):
+        if has_delta and s.check(base) == unsat:
+            return []
+        if len(cs) == 1:
+            return cs
+        k = len(cs) // 2
+        c1,c2 = cs[:k],cs[k:]
+        d2 = qx(base + c1,len(c1) > 0,c2)
+        d1 = qx(base + d2,len(d2) > 0,c1)
+        return d1 + d2
+    if not core or s.check([]) == unsat:
+        return []
+    return qx([],False,core)
+
 def biased_core(s,alits,unlikely):
     """ Try to produce a minimal unsatisfiable subset of alits, using as few
     of the alits in unlikely as possible. 
     """
+    if core_minimizer.get() == 'quickxplain':
+        # QuickXplain prefers earlier literals, so put the unlikely
+        # ones last. Don't narrow to s.unsat_core() first: z3's core
+        # is arbitrary and may already contain the unlikely literals.
+        unlikely_ids = set(get_id(c) for c in unlikely)
+        ordered = ([c for c in alits if get_id(c) not in unlikely_ids]
+                   + [c for c in alits if get_id(c) in unlikely_ids])
+        return quickxplain(s,ordered)
     core = alits
     for lit in unlikely:
         test = [c for c in core if get_id(c) != get_id(lit)]
@@ -40,9 +77,13 @@ def minimize_core_aux2(s, core):
 	    core = [c for c in core if get_id(c) not in ids]
     return mus
 
-def minimize_core(s):
-    core = list(s.unsat_core())
+def minimize_core(s,core=None):
+    """ Minimize the unsat core of the last check of s, or the given
+    core if any """
+    core = list(s.unsat_core() if core is None else core)
 #    print "minimize_core: core = {}".format(core)
+    if core_minimizer.get() == 'quickxplain':
+        return quickxplain(s, core)
     core = minimize_core_aux2(s, core)
 #    print "minimize_core: core = {}".format(core)
     return core
@@ -74,6 +74,18 @@ from itertools import chain
 allow_unsorted = False
 repr = str
 
+# With "hash_cons=true", terms are hash-consed (see
+# utils/recstruct_object.py), so structurally equal terms built after
+# the parameter is set share one object.
+
+def process_hash_consing(s):
+    on = s == "true"
+    lg.set_hash_consing(on)
+    return on
+
+hash_consing = iu.Parameter("hash_cons",False,check=lambda s: s in ("true","false"),
+                            process=process_hash_consing)
+
 class UnsortedContext(object):
     """ Allow unsorted symbols. Useful for parsing.
     """
@@ -35,34 +35,138 @@ def coerce_clause_to_formula(c):
         return clause_to_formula(c)
     return drop_universals(c)
 
+def merge_chunks(chunks):
+    """ Merge adjacent chunks so that their sizes strictly decrease from
+    left to right. Each chunk is a pair (items,index), where index is a
+    dict or None. A rope of n items has at most log(n) chunks, and each
+    item is copied at most log(n) times over a sequence of appends. """
+    res = []
+    for chunk in chunks:
+        if not chunk[0]:
+            continue
+        res.append(chunk)
+        while len(res) > 1 and len(res[-2][0]) <= len(res[-1][0]):
+            (items2,idx2),(items1,idx1) = res.pop(),res.pop()
+            if idx1 is not None:
+                idx1 = dict(idx1)
+                idx1.update(idx2)
+            res.append((items1+items2,idx1))
+    return tuple(res)
+
+def definition_chunk(defs):
+    defs = tuple(defs)
+    return (defs,dict((d.defines(),d) for d in defs))
+
+class DefinitionIndex(object):
+    """ A read-only map from symbols to definitions, made of the
+    per-chunk dicts of a Clauses. Later chunks take precedence. """
+    def __init__(self,chunks):
+        self.maps = [idx for defs,idx in reversed(chunks)]
+    def __getitem__(self,sym):
+        for m in self.maps:
+            if sym in m:
+                return m[sym]
+        raise KeyError(sym)
+    def __contains__(self,sym):
+        return any(sym in m for m in self.maps)
+    def get(self,sym,default=None):
+        for m in self.maps:
+            if sym in m:
+                return m[sym]
+        return default
+    def keys(self):
+        return list(set(k for m in self.maps for k in m))
+    def __iter__(self):
+        return iter(self.keys())
+    def __len__(self):
+        return len(self.keys())
+    def iteritems(self):
+        return ((k,self[k]) for k in self.keys())
+
 class Clauses(object):
+    """ A conjunction of formulas, with definitions of skolem symbols.
+
+    Clauses are persistent. The formulas and definitions are stored
+    as ropes of immutable chunks (see merge_chunks) that are shared
+    between a Clauses and the conjunctions built from it, so and_clauses
+    does not copy its arguments. The lists fmlas and defs, and the
+    index defidx, are built on first use and must not be modified in
+    place. Assign to fmlas or defs to replace them.
+    """
     def __init__(self,fmlas=[],defs=[]):
         assert isinstance(fmlas,list)
-        self.defs = defs
-        self.defidx = dict((d.defines(),d) for d in defs)
         self.fmlas = list(collect_and_list([coerce_clause_to_formula(c) for c in fmlas]))
+        self.defs = defs
+
+    @staticmethod
+    def conjoin(args):
+        """ Return the conjunction of a list of Clauses, sharing their chunks """
+        res = Clauses.__new__(Clauses)
+        res._set_fmla_chunks(merge_chunks(c for a in args for c in a._fmla_chunks))
+        res._set_def_chunks(merge_chunks(c for a in args for c in a._def_chunks))
+        res._false = any(a._false for a in args)
+        return res
+
+    def _set_fmla_chunks(self,chunks):
+        self._fmla_chunks = chunks
+        self._fmlas = None
+        self._cnf = None
+
+    def _set_def_chunks(self,chunks):
+        self._def_chunks = chunks
+        self._defs = None
+        self._defidx = None
+        self._cnf = None
+
+    @property
+    def fmlas(self):
+        if self._fmlas is None:
+            self._fmlas = [f for fs,_ in self._fmla_chunks for f in fs]
+        return self._fmlas
+    @fmlas.setter
+    def fmlas(self,fmlas):
+        self._set_fmla_chunks(merge_chunks([(tuple(fmlas),None)]))
+        self._false = any(is_false(f) for f in fmlas)
+
+    @property
+    def defs(self):
+        if self._defs is None:
+            self._defs = [d for ds,_ in self._def_chunks for d in ds]
+        return self._defs
+    @defs.setter
+    def defs(self,defs):
+        self._set_def_chunks(merge_chunks([definition_chunk(defs)]))
+
+    @property
+    def defidx(self):
+        if self._defidx is None:
+            self._defidx = DefinitionIndex(self._def_chunks)
+        return self._defidx
 
     @property
     def clauses(self):
-        res = tseitin_encode(self.to_open_formula())
+        """ the Tseitin encoding of the clauses, computed once (see
+        tseitin_table) """
+        if self._cnf is None:
+            self._cnf = tseitin_encode(self.to_open_formula())
 #        print "defs: {} fmlas: {} ".format(self.defs,self.fmlas)
-#        print "cnf: {}".format(res)
-        return res
+#        print "cnf: {}".format(self._cnf)
+        return list(self._cnf)
     def triv_clauses(self):
         res = formula_to_clauses_aux(self.to_open_formula())
 #        print "defs: {} fmlas: {} ".format(self.defs,self.fmlas)
 #        print "cnf: {}".format(res)
         return res
     def is_false(self):
-        return any(is_false(f) for f in self.fmlas)
+        return self._false
     def is_true(self):
-        return all(is_true(f) for f in self.fmlas)
+        return all(is_true(f) for fs,_ in self._fmla_chunks for f in fs)
     def conjuncts(self):
         assert self.defs == []
         return [close_epr(c) for c in self.fmlas]
     # TODO: this should not be needed
     def copy(self):
-        return Clauses(list(self.fmlas),list(self.defs))
+        return Clauses.conjoin([self])
 #    def define(self,dfn):
 #        assert dfn.defines() not in self.defidx
 #        self.defs.append(dfn)
@@ -114,8 +218,16 @@ def close_epr(fmla):
     else:
         return ForAll(variables,fmla)
 
+def formula_cnf(fmla):
+    """ The Tseitin encoding of a formula, memoized in tseitin_table """
+    cnf = tseitin_table.cnfs.get(fmla)
+    if cnf is None:
+        cnf = formula_to_clauses(fmla).clauses
+        tseitin_table.add_cnf(fmla,cnf)
+    return list(cnf)
+
 for op in lg_ops:
-    op.clauses = property(lambda self: formula_to_clauses(self).clauses)
+    op.clauses = property(formula_cnf)
     op.symbols = lambda self: symbols_ast(self)
     op.is_universal_first_order = lambda self: is_prenex_universal(self) and not any(sym.is_skolem() for sym in self.symbols())
     op.to_formula = lambda self: self
@@ -152,27 +264,126 @@ to_atom = to_formula
 
 # substitutions
 
+# the immutable term classes of logic.py
+term_types = frozenset([lg.Var, lg.Const, lg.Apply, lg.Eq, lg.Ite, lg.Not, lg.And,
+                        lg.Or, lg.Implies, lg.Iff, lg.ForAll, lg.Exists])
+
+class Substituter(object):
+    """
+    Simultaneous substitution, callable on asts. Here, variables is a
+    dict from string names of variables to terms (only free
+    occurrences are substituted), constants is a dict from constants
+    to terms, and symbols is a dict from symbols (constants or
+    functions) to symbols. All three are applied in one pass.
+
+    The ast is traversed with an explicit stack, so deep formulas
+    don't hit the recursion limit. Results for the immutable logic
+    terms are memoized per node and bound-variable context, so shared
+    subterms are processed once, also across calls on the same
+    Substituter (for example, the formulas of a Clauses). An unchanged
+    term is returned as is. Mutable asts with arguments (such as
+    Literal) are rebuilt at each occurrence, so results never share
+    them.
+    """
+
+    def __init__(self,variables=None,constants=None,symbols=None):
+        self.constants = constants or {}
+        self.symbols = symbols or {}
+        self.contexts = [variables or {}] # variable substitutions, by context
+        self.shadowed = {} # (context,bound names) -> context
+        self.memo = {} # (node id,context) -> (node,result), for immutable nodes
+        self.fresh = defaultdict(list) # (node id,context) -> results not yet used, for mutable nodes
+
+    def __call__(self,ast):
+        memo = self.memo
+        stack = [(ast,0,None)]
+        while stack:
+            node,ctx,args = stack.pop()
+            if args is not None:
+                # arguments done
+                self.store(node,ctx,self.rebuild(node,args,self.context(node,ctx)))
+                continue
+            if type(node) in term_types:
+                entry = memo.get((id(node),ctx))
+                if entry is not None and entry[0] is node:
+                    continue
+            args = list(node.args)
+            if not args:
+                self.store(node,ctx,self.leaf(node,ctx))
+            else:
+                stack.append((node,ctx,args))
+                cctx = self.context(node,ctx)
+                stack.extend((arg,cctx,None) for arg in args)
+        return self.result(ast,0)
+
+    def store(self,node,ctx,res):
+        if type(node) in term_types:
+            self.memo[(id(node),ctx)] = (node,res)
+        else:
+            self.fresh[(id(node),ctx)].append(res)
+
+    def result(self,node,ctx):
+        """ The result for node in context ctx. For a mutable node,
+        each result is used once. """
+        if type(node) in term_types:
+            return self.memo[(id(node),ctx)][1]
+        key = (id(node),ctx)
+        results = self.fresh[key]
+        res = results.pop()
+        if not results:
+            del self.fresh[key]
+        return res
+
+    def context(self,node,ctx):
+        """ The context of the arguments of node """
+        if not is_quantifier(node) or not self.contexts[ctx]:
+            return ctx
+        bounds = frozenset(v.rep for v in quantifier_vars(node))
+        res = self.shadowed.get((ctx,bounds))
+        if res is None:
+            subs = self.contexts[ctx]
+            if any(x in subs for x in bounds):
+                self.contexts.append(dict((x,y) for x,y in subs.iteritems() if x not in bounds))
+                res = len(self.contexts) - 1
+            else:
+                res = ctx
+            self.shadowed[(ctx,bounds)] = res
+        return res
+
+    def leaf(self,node,ctx):
+        if isinstance(node,Variable):
+            return self.contexts[ctx].get(node.rep,node)
+        if is_constant(node):
+            if node in self.constants:
+                return self.constants[node]
+            sym = self.symbols.get(node)
+            if sym is not None:
+                return sym()
+        return node
+
+    def rebuild(self,node,args,ctx):
+        new_args = [self.result(arg,ctx) for arg in args]
+        if self.symbols and isinstance(node,lg.Apply):
+            sym = self.symbols.get(node.func)
+            if sym is not None:
+                return sym(*new_args)
+        if type(node) in term_types and all(x is y for x,y in zip(new_args,args)):
+            return node
+        return node.clone(new_args)
+
 def substitute_ast(ast,subs):
     """
     Substitute terms for variables in an ast. Here, subs is
     a dict from string names of variables to terms.
     """
-    if isinstance(ast, Variable):
-        return subs.get(ast.rep,ast)
-    if is_quantifier(ast):
-        bounds = set(quantifier_vars(ast))
-        subs = dict((x,y) for x,y in subs.iteritems() if x not in bounds)
-    return ast.clone(substitute_ast(x,subs) for x in ast.args)
+    return Substituter(variables=subs)(ast)
 
 def substitute_constants_ast(ast,subs):
     """
     Substitute terms for *constants*. Here, subs is
     a dict from string names of constants to terms.
     """
-    if is_constant(ast):
-        return subs.get(ast.rep,ast)
-    else:
-        return ast.clone(substitute_constants_ast(x,subs) for x in ast.args)
+    return Substituter(constants=subs)(ast)
 
 
 def rename_ast(ast,subs):
@@ -182,10 +393,21 @@ def rename_ast(ast,subs):
     are give the same sort as old names. Exception is thrown in case of
     a sort conflict.
     """
-    args = [rename_ast(x,subs) for x in ast.args]
-    if is_app(ast):
-        return subs.get(ast.rep,ast.rep)(*args)
-    return ast.clone(args)
+    return Substituter(symbols=subs)(ast)
+
+def substitution_to_list(kind):
+    """ return a function that applies a substitution of the given kind to a list """
+    def apply_to_list(l,subs):
+        sub = Substituter(**{kind:subs})
+        return [sub(x) for x in l]
+    return apply_to_list
+
+def substitution_to_clauses(kind):
+    """ return a function that applies a substitution of the given kind to a Clauses """
+    def apply_to_clauses(cls,subs):
+        sub = Substituter(**{kind:subs})
+        return cls.apply(sub) if isinstance(cls,Clauses) else sub(cls)
+    return apply_to_clauses
 
 # aliases for backward compat
 substitute_term = substitute_lit = substitute_ast
@@ -196,13 +418,87 @@ rename_term = rename_lit = substitute_ast
 # are *not* formulas). here we extend the above functions to
 # clauses, cubes and lists of these
 
-substitute_clause = substitute_cube = apply_func_to_list(substitute_ast)
-substitute_clauses = substitute_cubes = apply_func_to_clauses(substitute_ast)
-substitute_constants_clause = substitute_constants_cube = apply_func_to_list(substitute_constants_ast)
-substitute_constants_clauses = substitute_constants_cubes = apply_func_to_clauses(substitute_constants_ast)
-rename_clause = rename_cube = apply_func_to_list(rename_ast)
-rename_clauses = rename_cubes = apply_func_to_clauses(rename_ast)
+substitute_clause = substitute_cube = substitution_to_list('variables')
+substitute_clauses = substitute_cubes = substitution_to_clauses('variables')
+substitute_constants_clause = substitute_constants_cube = substitution_to_list('constants')
+substitute_constants_clauses = substitute_constants_cubes = substitution_to_clauses('constants')
+rename_clause = rename_cube = substitution_to_list('symbols')
+rename_clauses = rename_cubes = substitution_to_clauses('symbols')
+
+
+# Sets of free variables, constants and symbols. For the term classes
+# of logic.py these are computed once per term as frozensets, stored
+# in the term's slots (see logic.term_cache_slots) and combined
+# bottom-up, so repeated queries on shared subterms are constant time.
+
+empty_set = frozenset()
+
+def union_sets(sets):
+    """ Union of a list of frozensets, sharing the result if at most one is non-empty """
+    sets = [s for s in sets if s]
+    if not sets:
+        return empty_set
+    if len(sets) == 1:
+        return sets[0]
+    return frozenset().union(*sets)
+
+def variables_set(ast):
+    """ Frozenset of the free variables of ast """
+    cached = type(ast) in term_types
+    if cached:
+        try:
+            return ast._vars
+        except AttributeError:
+            pass
+    if isinstance(ast,Variable):
+        res = frozenset([ast])
+    elif is_quantifier(ast):
+        res = variables_set(quantifier_body(ast)) - frozenset(quantifier_vars(ast))
+    else:
+        res = union_sets([variables_set(arg) for arg in ast.args])
+    if cached:
+        ast._vars = res
+    return res
+
+def constants_set(ast):
+    """ Frozenset of the constants of ast """
+    cached = type(ast) in term_types
+    if cached:
+        try:
+            return ast._consts
+        except AttributeError:
+            pass
+    if is_constant(ast):
+        res = frozenset([ast.rep])
+    else:
+        res = union_sets([constants_set(arg) for arg in ast.args])
+    if cached:
+        ast._consts = res
+    return res
+
+def symbols_set(ast):
+    """ Frozenset of the symbols of ast """
+    cached = type(ast) in term_types
+    if cached:
+        try:
+            return ast._syms
+        except AttributeError:
+            pass
+    res = union_sets([symbols_set(arg) for arg in ast.args])
+    if is_app(ast):
+        res = res | frozenset([ast.rep]) if res else frozenset([ast.rep])
+    if cached:
+        ast._syms = res
+    return res
+
+def set_to_list_set(fun):
+    """ return a function that applies a set function to a list and returns the union as a set """
+    return lambda l: set(union_sets([fun(x) for x in l]))
 
+def set_to_clauses_set(fun):
+    """ return a function that applies a set function to a Clauses and returns the union as a set """
+    return lambda cls: (set(union_sets([fun(x) for x in chain(cls.fmlas,cls.defs)]))
+                        if isinstance(cls,Clauses) else set(fun(cls)))
 
 # get free variables
 
@@ -226,9 +522,9 @@ variables_clauses = variables_cubes = apply_gen_to_clauses(variables_ast)
 
 # get set of variables occurring
 
-used_variables_ast = gen_to_set(variables_ast)
-used_variables_clause = gen_to_set(variables_clause)
-used_variables_clauses = gen_to_set(variables_clauses)
+used_variables_ast = lambda ast: set(variables_set(ast))
+used_variables_clause = set_to_list_set(variables_set)
+used_variables_clauses = set_to_clauses_set(variables_set)
 
 # generate variables in order of first occurrence
 
@@ -259,9 +555,9 @@ constants_clauses = constants_cubes = apply_gen_to_clauses(constants_ast)
 
 # get set of constants occurring
 
-used_constants_ast = gen_to_set(constants_ast)
-used_constants_clause = gen_to_set(constants_clause)
-used_constants_clauses = gen_to_set(constants_clauses)
+used_constants_ast = lambda ast: set(constants_set(ast))
+used_constants_clause = set_to_list_set(constants_set)
+used_constants_clauses = set_to_clauses_set(constants_set)
 
 # generate constants in order of first occurrence
 
@@ -292,9 +588,9 @@ symbols_clauses = symbols_cubes = apply_gen_to_clauses(symbols_ast)
 
 # get set of symbols occurring
 
-used_symbols_ast = gen_to_set(symbols_ast)
-used_symbols_asts = used_symbols_clause = gen_to_set(symbols_clause)
-used_symbols_clauses = gen_to_set(symbols_clauses)
+used_symbols_ast = lambda ast: set(symbols_set(ast))
+used_symbols_asts = used_symbols_clause = set_to_list_set(symbols_set)
+used_symbols_clauses = set_to_clauses_set(symbols_set)
 
 # generate symbols in order of first occurrence
 
@@ -520,12 +816,44 @@ def is_relational(sym):
 
 tseitin_context = None
 
+class TseitinTable(object):
+    """ Tseitin definitions shared between encodings. Each encoded
+    conjunction is mapped to its literal, the clauses defining the
+    literal and the conjunctions these clauses depend on, so that
+    identical subformulas get the same auxiliary atom in every
+    clause set encoded with the table. The auxiliary symbols have
+    prefix "__tsh" and are never reused, even after the table is
+    cleared. The table also memoizes the encoding of whole formulas
+    (see formula_cnf). """
+    limit = 100000
+    def __init__(self):
+        self.fresh = UniqueRenamer('__tsh')
+        self.clear()
+    def clear(self):
+        self.defs = dict()
+        self.cnfs = dict()
+    def check_limit(self):
+        """ empty the table if it is full. Call this only between
+        encodings. """
+        if len(self.defs) + len(self.cnfs) >= self.limit:
+            self.clear()
+    def add_def(self,fmla,lit,clauses,deps):
+        self.defs[fmla] = (lit,clauses,deps)
+    def add_cnf(self,fmla,cnf):
+        self.cnfs[fmla] = cnf
+
+tseitin_table = TseitinTable()
+
 class TseitinContext(object):
-    """ Context Manager that handles exceptions and reports errors. """
-    def __init__(self,used = None):
+    """ Context Manager that handles exceptions and reports errors. If
+    a TseitinTable is given, definitions are shared through the table. """
+    def __init__(self,used = None,table = None):
         self.clauses = []
         self.used = used if used else {}
         self.fresh = UniqueRenamer('__ts',self.used)
+        self.table = table
+        self.added = set()  # table entries whose clauses are in self.clauses
+        self.deps = []      # stack of dependency lists of the open conjunctions
     def __enter__(self):
         global tseitin_context
         self.save = tseitin_context
@@ -536,6 +864,15 @@ class TseitinContext(object):
         tseitin_context = self.save
     def add_defs(self,cls):
         return cls + self.clauses
+    def use_def(self,fmla):
+        """ add the clauses of a table entry and its dependencies """
+        if fmla not in self.added:
+            self.added.add(fmla)
+            lit,clauses,deps = self.table.defs[fmla]
+            for d in deps:
+                self.use_def(d)
+            self.clauses.extend(clauses)
+        return self.table.defs[fmla][0]
 
 def tseitin_encoding(f):
     global tseitin_context
@@ -546,6 +883,8 @@ def tseitin_encoding(f):
         raise ValueError()
     f = expand_abbrevs(f)
     if isinstance(f,And):
+        if tc.table is not None:
+            return shared_tseitin_encoding(tc,f)
         args = [tseitin_encoding(g) for g in f.args]
 ##        print "args: %s" % args
         # TODO: this has to handle variables of different sorts and
@@ -568,6 +907,25 @@ def tseitin_encoding(f):
 #    print "bad formula: {} : {}".format(f,type(f))
     raise ValueError
 
+def shared_tseitin_encoding(tc,f):
+    """ Tseitin encoding of a conjunction using the context's table """
+    table = tc.table
+    if f not in table.defs:
+        tc.deps.append([])
+        try:
+            args = [tseitin_encoding(g) for g in f.args]
+        finally:
+            deps = tc.deps.pop()
+        vs = [v for v in used_variables_in_order_clause(args)]
+        fn = Symbol(table.fresh(str(len(vs))),RelationSort([v.get_sort() for v in vs]))
+        res = Literal(1,Atom(fn,vs))
+        clauses = [[~res,arg] for arg in args]
+        clauses.append([res] + [~arg for arg in args])
+        table.add_def(f,res,clauses,deps)
+    if tc.deps:
+        tc.deps[-1].append(f)
+    return tc.use_def(f)
+
 def condition_conj(c,p):
     ps = p.args if isinstance(p,And) else [p]
     return [Or(c,q) for q in ps]
@@ -661,8 +1019,10 @@ def formula_to_clauses_aux(f):
 
 def tseitin_encode(f):
     """ Clausify a formula. This can introduce skolems which will be distinct
-    from all existing symbols in f."""
-    tc = TseitinContext()
+    from all existing symbols in f. Definitions are shared with other
+    encodings through tseitin_table."""
+    tseitin_table.check_limit()
+    tc = TseitinContext(table=tseitin_table)
     with tc:
         clauses = formula_to_clauses_aux(f)
 ##    print "tseitin: {}".format(clauses + tc.clauses)
@@ -672,12 +1032,10 @@ def tseitin_encode(f):
 def condition_clauses(clauses,fmla):
     """ return clauses equivalent to fmla -> clauses """
     fmla = negate(fmla)
-    # Note here: clauses may already contain Tseitin symbols
-    tc = TseitinContext(used_symbols_clauses(clauses))
-    with tc:
-        clauses = [cl1 for cl in clauses for cl1 in formula_to_clauses(Or(fmla,clause_to_formula(cl)))]
-##    print "tseitin: {}".format(clauses + tc.clauses)
-    return clauses + tc.clauses
+    # The formulas may already contain Tseitin symbols. The encoding
+    # of the result introduces fresh ones through tseitin_table, whose
+    # names are never reused. The definitions are not conditioned.
+    return Clauses([Or(fmla,f) for f in clauses.fmlas],clauses.defs)
 
 def lit_to_formula(lit):
     return lit.atom if lit.polarity == 1 else Not(lit.atom)
@@ -949,7 +1307,7 @@ def or_clauses(*args):
 
 def elim_definitions(clauses,dead):
     c2 = clauses.copy()
-    fmlas = clauses.fmlas
+    fmlas = list(clauses.fmlas)
     for sym in dead:
         if sym in clauses.defidx:
             fmlas.append(c2.defidx[sym].to_constraint())
@@ -1034,9 +1392,7 @@ def and_clauses(*args):
         return true_clauses()
     if any(cls.is_false() for cls in args):
         return false_clauses()
-    fmlas = [c for cls in args for c in cls.fmlas]
-    defs = [d for cls in args for d in cls.defs]
-    return Clauses(fmlas,defs)
+    return Clauses.conjoin(args)
 
 def negate_clauses(clauses):
     if isinstance(clauses,Clauses):
@@ -73,6 +73,15 @@ error_list = []
 
 stack = []
 
+# number of module definitions being parsed (see inst_mod)
+module_depth = 0
+
+# If not None, the lookups that searched the whole stack without
+# finding the name, as (kind,name) pairs. A file parsed on its own
+# parses the same way when included, provided these lookups fail
+# in the including context as well (see lookups_fail).
+lookups = None
+
 def get_lineno(p,n):
     return iu.Location(iu.filename,p.lineno(n))
 
@@ -83,6 +92,8 @@ def stack_lookup(name):
     for ivy in reversed(stack):
         if name in ivy.modules:
             return ivy.modules[name]
+    if lookups is not None:
+        lookups.append(('module',name))
     return None
 
 
@@ -93,9 +104,35 @@ def stack_action_lookup(name,params=0):
         params += len(ivy.params)
         if name in ivy.actions:
             return ivy.actions[name],params
+    else:
+        if lookups is not None:
+            lookups.append(('action',name))
     return None,0
 
+def stack_included(name):
+    if any(name in m.included for m in stack):
+        return True
+    if lookups is not None:
+        lookups.append(('include',name))
+    return False
+
+def lookups_fail(failed):
+    """ True if the given lookups fail in the current context too. """
+    if module_depth > 0:
+        return False
+    for kind,name in failed:
+        if kind == 'module' and stack_lookup(name) is not None:
+            return False
+        if kind == 'action' and stack_action_lookup(name)[0] is not None:
+            return False
+        if kind == 'include' and stack_included(name):
+            return False
+    return True
+
 def inst_mod(ivy,module,pref,subst,vsubst):
+    if module_depth > 0:
+        ivy.defer(Instance(module,pref,subst,vsubst))
+        return
     for decl in module.decls:
 #                print "before: %s" % (decl)
         if vsubst:
@@ -113,6 +150,17 @@ def inst_mod(ivy,module,pref,subst,vsubst):
 #                print "after: %s" % (idecl)
         ivy.declare(idecl)
 
+class Instance(object):
+    """ An instance of a module declared in a module body. The body's
+    declarations are not prefixed until the enclosing module is itself
+    instantiated (see Ivy.materialize), so modules that are declared
+    but never used cost nothing. Redefinitions by the prefixed
+    declarations are reported then, so they are not reported for a
+    module that is never used. """
+    def __init__(self,module,pref,subst,vsubst):
+        self.module,self.pref,self.subst,self.vsubst = module,pref,subst,vsubst
+        self.filename = iu.filename
+
 def do_insts(ivy,insts):
     others = []
     for instantiation in insts:
@@ -143,35 +191,75 @@ def do_insts(ivy,insts):
 
 class Ivy(object):
     def __init__(self):
-        self.decls = []
-        self.defined = dict()
-        self.static = set()
+        self._decls = []
+        self._defined = dict()
+        self._static = set()
         self.modules = dict()
-        self.macros = dict()
-        self.actions = dict()
+        self._macros = dict()
+        self._actions = dict()
         self.included = set()
         self.is_module = False
         self.params = []
+        self.deferred = False
     def __repr__(self):
         return '\n'.join([repr(x) for x in self.decls])
     def declare(self,decl):
         for df in decl.defines():
             self.define(df)
         for df in decl.static():
-            self.static.add(df)
-        self.decls.append(decl)
+            self._static.add(df)
+        self._decls.append(decl)
         if isinstance(decl,MacroDecl):
             for d in decl.args:
-                self.macros[d.defines()] = d
+                self._macros[d.defines()] = d
         if isinstance(decl,ActionDecl):
             for d in decl.args:
-                self.actions[d.defines()] = d
+                self._actions[d.defines()] = d
+    def defer(self,inst):
+        self._decls.append(inst)
+        self.deferred = True
+    def materialize(self):
+        """ Declare the contents of any deferred module instances, in
+        the order the instances were declared. """
+        if self.deferred:
+            self.deferred = False
+            global module_depth
+            old_depth,module_depth = module_depth,0
+            try:
+                decls,self._decls = self._decls,[]
+                for decl in decls:
+                    if isinstance(decl,Instance):
+                        with iu.SourceFile(decl.filename):
+                            inst_mod(self,decl.module,decl.pref,decl.subst,decl.vsubst)
+                    else:
+                        self._decls.append(decl)
+            finally:
+                module_depth = old_depth
+        return self
+
+    # Reading any of these expands the deferred instances.
+
+    @property
+    def decls(self):
+        return self.materialize()._decls
+    @property
+    def defined(self):
+        return self.materialize()._defined
+    @property
+    def static(self):
+        return self.materialize()._static
+    @property
+    def macros(self):
+        return self.materialize()._macros
+    @property
+    def actions(self):
+        return self.materialize()._actions
 
     def define(self,df):
         name,lineno = df
-        if name in self.defined:
-            report_error(Redefining(name,lineno,self.defined[name]))
-        self.defined[name] = lineno
+        if name in self._defined:
+            report_error(Redefining(name,lineno,self._defined[name]))
+        self._defined[name] = lineno
 
     @property
     def args(self):
@@ -197,7 +285,7 @@ def p_top_using_symbol(p):
 def p_top_include_symbol(p):
     'top : top INCLUDE SYMBOL'
     p[0] = p[1]
-    if not any(p[3] in m.included for m in stack):
+    if not stack_included(p[3]):
         p[0].included.add(p[3])
         pref = Atom(p[3],[])
         pref.lineno = get_lineno(p,2)
@@ -239,11 +327,15 @@ def p_top_conjecture_labeledfmla(p):
 
 def p_modulestart(p):
     'modulestart :'
+    global module_depth
+    module_depth += 1
     stack[-1].is_module=True
     p[0] = None
  
 def p_moduleend(p):
     'moduleend :'
+    global module_depth
+    module_depth -= 1
     stack[-1].is_module=False
     p[0] = None
    
@@ -1467,10 +1559,69 @@ def p_error(token):
     else:
         report_error(ParseError(None,None,'unexpected end of input'));
 
-# Build the parsers
+# Build the parsers. The grammar depends on the language version at
+# import time (see the tests of iu.get_numeric_version above and in
+# ivy_logic_parser). Each distinct grammar gets its own parse table
+# module, stored in the package directory, named by grammar_tag.
+
+# every version threshold tested at import time in this module and
+# in ivy_logic_parser
+grammar_versions = [[1],[1,1],[1,2],[1,4]]
+
+def grammar_tag(vernum):
+    """ name of the grammar used by language version vernum """
+    for v in grammar_versions:
+        if vernum <= v:
+            return '_'.join(str(x) for x in v)
+    return 'latest'
+
 import os
+import sys
+import imp
 tabdir = os.path.dirname(os.path.abspath(__file__))
-parser = yacc.yacc(start='top',tabmodule='ivy_parsetab',errorlog=yacc.NullLogger(),outputdir=tabdir,debug=None)
+package_prefix = __name__[:__name__.rfind('.')+1]
+grammar = grammar_tag(iu.get_numeric_version())
+parser = yacc.yacc(start='top',tabmodule=package_prefix+'ivy_parsetab_'+grammar,errorlog=yacc.NullLogger(),outputdir=tabdir,debug=None)
+
+# Parsers for other language versions are separate instances of this
+# module (and of ivy_logic_parser) built with that version's grammar.
+# They are built once, on first use.
+
+parser_modules = {}
+
+def source_file(fname):
+    return os.path.splitext(fname)[0] + '.py'
+
+def load_parser_module(tag,vernum):
+    """ Load instances of ivy_logic_parser and this module for language
+    version vernum. The ivy_logic_parser instance stands in for the
+    real one while this module's instance imports its rules. """
+    logic_name = package_prefix + 'ivy_logic_parser'
+    saved_version = iu.get_string_version()
+    saved_logic = sys.modules[logic_name]
+    iu.set_string_version('.'.join(str(x) for x in vernum))
+    try:
+        sys.modules[logic_name] = imp.load_source(logic_name+'_'+tag,source_file(saved_logic.__file__))
+        return imp.load_source(package_prefix+'ivy_parser_'+tag,source_file(__file__))
+    finally:
+        sys.modules[logic_name] = saved_logic
+        iu.set_string_version(saved_version)
+
+def parser_module(vernum):
+    """ Return the instance of this module that parses language version
+    vernum """
+    tag = grammar_tag(vernum)
+    if tag == grammar:
+        return sys.modules[__name__]
+    if tag not in parser_modules:
+        parser_modules[tag] = load_parser_module(tag,vernum)
+    return parser_modules[tag]
+
+def build_parsers():
+    """ Build the parsers, and so write the parse tables, for all the
+    grammars. This can be run ahead of time, for example when installing. """
+    for v in grammar_versions + [map(int,iu.ivy_latest_language_version.split('.'))]:
+        parser_module(v)
 #parser = yacc.yacc(start='top',tabmodule='ivy_parsetab',outputdir=tabdir,debug=None)
 #parser = yacc.yacc(start='top',tabmodule='ivy_parsetab')
 # formula_parser = yacc.yacc(start = 'fmla', tabmodule='ivy_formulatab')
@@ -1478,9 +1629,11 @@ parser = yacc.yacc(start='top',tabmodule='ivy_parsetab',errorlog=yacc.NullLogger
 def parse(s,nested=False):
     global error_list
     global stack
+    global module_depth
     if not nested:
         error_list = []
         stack = []
+        module_depth = 0
     vernum = iu.get_numeric_version()
     with LexerVersion(vernum):
         # shallow copy the parser and lexer to try for re-entrance (!!!)
@@ -0,0 +1,107 @@
+#
+# Copyright (c) Microsoft Corporation. All Rights Reserved.
+#
+"""
+Replay a corpus of SMT queries recorded with "record_queries=<dir>"
+(see ivy_solver) and report the distribution of check times.
+
+usage: ivy_replay [name=value ...] dir
+
+Each name=value is passed to z3.set_param, so the corpus can be
+replayed under a chosen z3 configuration, for example:
+
+    ivy_replay smt.mbqi=false timeout=10000 queries/
+"""
+
+import sys
+import os
+import time
+import z3
+
+def usage():
+    print "usage: \n  {} [z3_param=value ...] dir".format(sys.argv[0])
+    sys.exit(1)
+
+def parse_value(v):
+    if v in ('true','false'):
+        return v == 'true'
+    if v.isdigit():
+        return int(v)
+    return v
+
+def read_query(fname):
+    """ Return the header fields and the SMT-LIB2 text of a recorded query """
+    header = {}
+    with open(fname) as f:
+        text = f.read()
+    for line in text.split('\n'):
+        if not line.startswith('; ivy-'):
+            break
+        k,_,v = line[len('; ivy-'):].partition(': ')
+        header[k] = v
+    return header,text
+
+def replay_query(text):
+    """ Return the result and check time of a query. The result is
+    'error' if z3 can't read the text (for example, a query recorded
+    before ivy_solver disambiguated overloaded constants). """
+    s = z3.Solver()
+    try:
+        s.add(z3.parse_smt2_string(text))
+    except z3.Z3Exception:
+        return 'error',0.0
+    start = time.time()
+    res = s.check()
+    return str(res),time.time() - start
+
+def percentile(xs,p):
+    """ xs must be sorted and non-empty """
+    return xs[min(len(xs)-1,int(p * len(xs)))]
+
+def time_summary(times):
+    ts = sorted(times)
+    return 'total {:.3f}s  mean {:.3f}s  median {:.3f}s  p90 {:.3f}s  p99 {:.3f}s  max {:.3f}s'.format(
+        sum(ts),sum(ts)/len(ts),percentile(ts,0.5),percentile(ts,0.9),percentile(ts,0.99),ts[-1])
+
+def replay(dname,top=10):
+    files = sorted(os.path.join(dname,f) for f in os.listdir(dname) if f.endswith('.smt2'))
+    if not files:
+        print "no queries found in {}".format(dname)
+        return 1
+    rows = []
+    mismatches = 0
+    for fname in files:
+        header,text = read_query(fname)
+        res,elapsed = replay_query(text)
+        recorded = header.get('result')
+        if recorded in ('sat','unsat') and res in ('sat','unsat') and res != recorded:
+            print "{}: result {} differs from recorded {}".format(fname,res,recorded)
+            mismatches += 1
+        rows.append((elapsed,fname,res,header))
+    print "queries: {}".format(len(rows))
+    recorded_times = [float(h['time']) for _,_,_,h in rows if 'time' in h]
+    if recorded_times:
+        print "recorded: {}".format(time_summary(recorded_times))
+    print "replayed: {}".format(time_summary([r[0] for r in rows]))
+    counts = {}
+    for _,_,res,_ in rows:
+        counts[res] = counts.get(res,0) + 1
+    print "results: {}".format(', '.join('{} {}'.format(k,v) for k,v in sorted(counts.iteritems())))
+    print "slowest queries:"
+    for elapsed,fname,res,header in sorted(rows,reverse=True)[:top]:
+        print "  {:.3f}s {} {} {} {}".format(elapsed,res,os.path.basename(fname),
+                                           header.get('entry',''),header.get('obligation',''))
+    return 1 if mismatches else 0
+
+def main():
+    args = sys.argv[1:]
+    while args and '=' in args[0]:
+        name,value = args[0].split('=',1)
+        z3.set_param(name,parse_value(value))
+        args = args[1:]
+    if len(args) != 1 or not os.path.isdir(args[0]):
+        usage()
+    sys.exit(replay(args[0]))
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,6 @@ import ivy_interp as itp
 import ivy_actions as act
 import ivy_utils as utl
 import ivy_logic_utils as lut
-import tk_ui as ui
 import ivy_logic as lg
 import ivy_utils as iu
 import ivy_module as im
@@ -7,16 +7,23 @@ import encodings.latin_1
 
 import itertools
 from itertools import chain
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 import re
 import functools
+import os
+import hashlib
+import json
+import multiprocessing
+import Queue
+import sys
+import time
 
 import z3
 import ivy_logic
 from ivy_logic_utils import used_variables_clause, used_variables_ast, variables_ast,\
    to_clauses, constants_clauses, used_relations_clauses, rel_inst, fun_eq_inst, \
    is_ground_lit, used_constants_clauses, substitute_constants_clauses, eq_atom, \
-   functions_clauses, fun_inst, substitute_lit, used_constants_clause, used_symbols_clause,Clauses, used_symbols_clause, and_clauses, true_clauses, used_symbols_ast, sym_placeholders, used_symbols_clauses, ground_apps_clauses, dual_clauses
+   functions_clauses, fun_inst, substitute_lit, used_constants_clause, used_symbols_clause,Clauses, used_symbols_clause, and_clauses, true_clauses, used_symbols_ast, sym_placeholders, used_symbols_clauses, ground_apps_clauses, dual_clauses, term_types
 from ivy_core import minimize_core, biased_core
 import ivy_utils as iu
 import ivy_unitres as ur
@@ -107,12 +114,92 @@ def is_solver_op(name):
     return relations(name) != None or functions(name) != None
 
 
+# Cache of translations of logic terms to z3. Terms are immutable and
+# hashable, so repeated translations of the same axioms, conjectures
+# and frame conditions become lookups. Only terms whose type is in
+# term_types (see ivy_logic_utils) are cached, since other AST classes
+# (for example Definition) are hashed by identity.
+
+translation_cache_size = iu.Parameter("translation_cache",100000,
+                                      check=lambda s: s.isdigit(),process=int)
+translation_cache = iu.LRUCache(translation_cache_size.get())
+
+def translation_cache_stats():
+    """ Return a dictionary with the hits, misses and size of the translation cache """
+    return translation_cache.stats()
+
+# Enumerated equality is translated differently in each encoding of
+# enumerated sorts (see below), so the cache only holds translations
+# made under one encoding, and is emptied when the encoding changes.
+
+translation_encoding = None
+
+def check_translation_encoding():
+    global translation_encoding
+    encoding = 'native' if use_z3_enums else enum_encoding.get()
+    if encoding != translation_encoding:
+        translation_cache.clear()
+        translation_encoding = encoding
+
+# Encoding of enumerated sorts. An enumerated sort is either a native
+# z3 datatype, or its equalities are bit-blasted (see encode_equality).
+# With "enum_encoding=bits" (the default) or "enum_encoding=native",
+# every enumerated sort is encoded the same way. With
+# "enum_encoding=auto", the encoding of each sort is the one of least
+# estimated cost (see enum_encoding_costs). The choice is made once per
+# sort and kept until the next clear(), so all queries of a module use
+# the same encoding. Native enums can also be forced with
+# set_use_native_enums. On the examples with enumerated sorts that
+# check, bit-blasting is never slower than native datatypes (flash.ivy
+# takes about 16% less solver time, and the others are the same), so
+# bits remains the default.
+
+enum_encoding = iu.EnumeratedParameter("enum_encoding",["bits","native","auto"],"bits")
+
+enum_encodings = {}
+
+def native_enum(sort):
+    """ True if the enumerated sort is encoded as a z3 datatype """
+    if use_z3_enums:
+        return True
+    mode = enum_encoding.get()
+    if mode != 'auto':
+        return mode == 'native'
+    res = enum_encodings.get(sort.name)
+    if res is None:
+        bits,native = enum_encoding_costs(sort)
+        res = enum_encodings[sort.name] = native < bits
+    return res
+
+def enum_encoding_costs(sort):
+    """ Return the estimated costs of the bit-blasted and native
+    encodings of an enumerated sort, from the symbols of the signature
+    with values in the sort. Bit-blasting replaces each symbol with
+    ceil(log2(n)) Boolean symbols, where n is the number of elements.
+    In the native encoding, a constant is a single datatype value, but
+    each application of a function splits over the n constructors.
+    Ties go to bit-blasting. """
+    n = len(sort.defines())
+    width = ceillog2(n)
+    bits = native = 0
+    for sym in ivy_logic.sig.symbols.values():
+        sorts = sym.sort.sorts if isinstance(sym.sort,ivy_logic.UnionSort) else [sym.sort]
+        for s in sorts:
+            if getattr(s.rng,'name',None) != sort.name or sym.name in sort.extension:
+                continue
+            bits += width
+            native += n if s.dom else 1
+    return bits,native
+
 def clear():
     global z3_sorts, z3_predicates, z3_constants, z3_functions
     z3_sorts = dict()
     z3_predicates = {ivy_logic.equals : my_eq}
     z3_constants = dict()
     z3_functions = dict()
+    translation_cache.clear()
+    translation_cache.maxsize = translation_cache_size.get()
+    enum_encodings.clear()
 
 clear()    
 
@@ -239,6 +326,20 @@ def numeral_to_z3(num):
 def enumerated_to_numeral(term):
     raise iu.IvyError(None,'Cannot interpret enumerated type "{}" as a native sort (not yet supported)'.format(term.sort.name))
 
+def cached_translation(translate):
+    """ Decorator that memoizes a translation function in translation_cache. """
+    def cached(term):
+        if type(term) not in term_types:
+            return translate(term)
+        check_translation_encoding()
+        res = translation_cache.get(term)
+        if res is None:
+            res = translate(term)
+            translation_cache[term] = res
+        return res
+    return cached
+
+@cached_translation
 def term_to_z3(term):
     if ivy_logic.is_boolean(term):
         return formula_to_z3_int(term)
@@ -274,7 +375,12 @@ def term_to_z3(term):
                 # TODO: this is dangerous
                 sig = iso.to_z3() if iso != None else S
 #                print "term: {}, iso : {}, sig = {}".format(term,iso,sig)
-                res = z3.Const(term.rep.name,sig)
+                # an element of a native enumerated sort is one of the
+                # constructors that iso.to_z3() declared
+                if isinstance(iso,ivy_logic.EnumeratedSort) and term.rep.name in iso.extension:
+                    res = z3_constants[term.rep.name]
+                else:
+                    res = z3.Const(term.rep.name,sig)
             z3_constants[term.rep] = res
     elif isinstance(term,ivy_logic.Ite):
         return z3.If(formula_to_z3_int(term.args[0]),term_to_z3(term.args[1]),term_to_z3(term.args[2]))
@@ -305,7 +411,7 @@ def get_polymacs(op):
     return functools.partial(polymacs[op.name],op.sort)
 
 def atom_to_z3(atom):
-    if ivy_logic.is_equals(atom.rep) and ivy_logic.is_enumerated(atom.args[0]) and not use_z3_enums:
+    if ivy_logic.is_equals(atom.rep) and ivy_logic.is_enumerated(atom.args[0]) and not native_enum(atom.args[0].sort):
         return encode_equality(*atom.args)
     if atom.relname not in z3_predicates:
         rel = lookup_native(atom.relname,relations,"relation")
@@ -350,11 +456,12 @@ def clauses_to_z3(clauses):
     z3_clauses += [formula_to_z3(dfn) for dfn in clauses.defs]
     return z3.And(z3_clauses)
 
+@cached_translation
 def formula_to_z3_int(fmla):
 #    print "formula_to_z3_int: {} : {}".format(fmla,type(fmla))
     if ivy_logic.is_atom(fmla):
         return atom_to_z3(fmla)
-    if isinstance(fmla,ivy_logic.Definition) and ivy_logic.is_enumerated(fmla.args[0]) and not use_z3_enums:
+    if isinstance(fmla,ivy_logic.Definition) and ivy_logic.is_enumerated(fmla.args[0]) and not native_enum(fmla.args[0].sort):
         return encode_equality(*fmla.args)
     args = [formula_to_z3_int(arg) for arg in fmla.args]
     if isinstance(fmla,ivy_logic.And):
@@ -383,39 +490,296 @@ def formula_to_z3_int(fmla):
     assert False
 
 def formula_to_z3(fmla):
+    # the universal closure is cached under a different key than the open formula
+    key = ('closed',fmla) if type(fmla) in term_types else None
+    if key is not None:
+        check_translation_encoding()
+        res = translation_cache.get(key)
+        if res is not None:
+            return res
     z3_formula = formula_to_z3_int(fmla)
     variables = sorted(used_variables_ast(fmla))
     if len(variables) == 0:
-        return z3_formula
+        res = z3_formula
     else:
         z3_variables = [term_to_z3(v) for v in variables]
-        return z3.ForAll(z3_variables, z3_formula)
+        res = z3.ForAll(z3_variables, z3_formula)
+    if key is not None:
+        translation_cache[key] = res
+    return res
+
+
+# Incremental solver sessions. A SolverSession asserts the background
+# theory of the module once in a single z3 solver. While a session is
+# active, a query whose premises include the whole theory (e.g.,
+# clauses_imply on the clauses of a state and the background theory)
+# runs in a push/pop scope of the session solver instead of a fresh
+# solver, and only the premises not in the theory are asserted. This
+# lets z3 keep what it learned about the theory from one query to the
+# next. Queries whose premises don't include the theory, and queries
+# that return a model, use a fresh solver as usual, so sessions don't
+# change the result of any query. A query made while another query
+# holds a scope of the session solver (e.g., an unsat core computed
+# during the abstract post) also uses a fresh solver, since the session
+# solver holds the premises of the outer query. Sessions are used only
+# with "incremental=true".
+
+incremental = iu.BooleanParameter("incremental",False)
+
+current_session = None
+
+class SolverSession(object):
+    """ A z3 solver with a background theory asserted at the base
+    level. Use as a context manager to make it the current session.
+    If theory is None, the background theory of the current module is
+    used. The session is ignored if the "incremental" parameter is false.
+    """
+
+    def __init__(self,theory=None):
+        if theory is None:
+            import ivy_module
+            theory = ivy_module.module.background_theory()
+        self.theory = theory
+        self.asserted = set(theory.fmlas)
+        self.asserted_defs = set(theory.defs)
+        self._solver = None
+        self.num_queries = 0
+        self.busy = False
+
+    @property
+    def solver(self):
+        if self._solver is None:
+            self._solver = new_solver()
+            self._solver.add(clauses_to_z3(self.theory))
+        return self._solver
+
+    def covers(self,clauses):
+        """ True if clauses include the whole background theory """
+        return (self.asserted.issubset(clauses.fmlas)
+                and self.asserted_defs.issubset(clauses.defs))
+
+    def residue(self,clauses):
+        """ Return the clauses not already asserted in the session """
+        fmlas = [f for f in clauses.fmlas if f not in self.asserted]
+        if len(fmlas) == len(clauses.fmlas):
+            return clauses
+        return Clauses(fmlas,list(clauses.defs))
+
+    def __enter__(self):
+        global current_session
+        self.old_session = current_session
+        if incremental.get():
+            current_session = self
+        return self
+
+    def __exit__(self,exc_type, exc_val, exc_tb):
+        global current_session
+        current_session = self.old_session
+        return False # don't block any exceptions
+
+class query_solver(object):
+    """ Context manager giving the solver for one query, with the
+    premises (a Clauses, if any) asserted. This is a new scope of the
+    current session's solver if there is one and the premises include
+    its theory, else a fresh solver. Pass model=True if a model of the
+    solver is returned, so that it doesn't refer to a popped scope.
+    All scopes pushed during the query are popped on exit.
+    """
+
+    def __init__(self,premises=None,model=False):
+        self.premises = premises
+        self.session = current_session
+        if (model or premises is None or self.session is not None
+            and (self.session.busy or not self.session.covers(premises))):
+            self.session = None
+
+    def __enter__(self):
+        premises = self.premises
+        if self.session is None:
+            self.solver = new_solver()
+        else:
+            self.solver = self.session.solver
+            self.scopes = self.solver.num_scopes()
+            self.solver.push()
+            self.session.num_queries += 1
+            self.session.busy = True
+            premises = self.session.residue(premises)
+        if premises is not None:
+            self.solver.add(clauses_to_z3(premises))
+        return self.solver
+
+    def __exit__(self,exc_type, exc_val, exc_tb):
+        if self.session is not None:
+            self.solver.pop(self.solver.num_scopes() - self.scopes)
+            self.session.busy = False
+        return False # don't block any exceptions
+
+# Query statistics. When collection is enabled with
+# start_query_stats(), each call of an instrumented entry point
+# (decide, unsat_core, clauses_imply, get_small_model, check_cube,
+# ...) that checks the solver adds a record to query_stats giving the
+# wall time of the call, the number of solver checks, the change in
+# the z3 statistics of the solvers it checked (conflicts, quantifier
+# instantiations, memory), the size of the largest query in AST nodes,
+# and the proof obligation (see "obligation") being checked. Calls
+# nested inside an instrumented call are counted in the outer record.
+# The report (print_query_stats) adds up the records of each proof
+# obligation.
+
+query_stats = None
+active_query = [None]
+
+# z3 statistics that measure a peak rather than accumulate
+z3_peak_stats = frozenset(['memory','max memory'])
+
+def start_query_stats():
+    global query_stats
+    query_stats = []
+
+def instrumented(fun):
+    @functools.wraps(fun)
+    def instrumented_fun(*args,**kwargs):
+        if query_stats is None or active_query[0] is not None:
+            return fun(*args,**kwargs)
+        rec = {'entry':fun.__name__,'obligation':[(k,str(v)) for k,v in current_obligation()],
+               'checks':0,'size':0,'assumptions':0,'z3':{}}
+        active_query[0] = rec
+        start = time.time()
+        try:
+            return fun(*args,**kwargs)
+        finally:
+            rec['time'] = time.time() - start
+            active_query[0] = None
+            if rec['checks']:
+                query_stats.append(rec)
+    return instrumented_fun
+
+def solver_statistics(s):
+    st = s.statistics()
+    return dict((k,st.get_key_value(k)) for k in st.keys())
+
+class checked(object):
+    """ Context manager wrapping a check of solver s under atoms, which
+    adds the statistics of the check to the active query record, if any. """
+    def __init__(self,s,atoms=None):
+        self.rec,self.s,self.atoms = active_query[0],s,atoms
+    def __enter__(self):
+        if self.rec is not None:
+            self.before = solver_statistics(self.s)
+        return self
+    def __exit__(self,exc_type, exc_val, exc_tb):
+        rec = self.rec
+        if rec is None:
+            return False
+        after = solver_statistics(self.s)
+        rec['checks'] += 1
+        rec['size'] = max(rec['size'],dag_size(list(self.s.assertions()) + list(self.atoms or [])))
+        rec['assumptions'] = max(rec['assumptions'],len(self.atoms) if self.atoms else 0)
+        z3stats = rec['z3']
+        for k,v in after.iteritems():
+            if k in z3_peak_stats:
+                z3stats[k] = max(z3stats.get(k,0),v)
+            else:
+                v0 = self.before.get(k,0)
+                z3stats[k] = z3stats.get(k,0) + (v - v0 if v >= v0 else v)
+        return False # don't block any exceptions
+
+def dag_size(fmlas):
+    """ Return the number of distinct AST nodes of the z3 formulas fmlas """
+    seen = set()
+    todo = list(fmlas)
+    while todo:
+        e = todo.pop()
+        eid = get_id(e)
+        if eid in seen:
+            continue
+        seen.add(eid)
+        if z3.is_quantifier(e):
+            todo.append(e.body())
+        elif z3.is_app(e):
+            todo.extend(e.children())
+    return len(seen)
+
+def describe_query_stats(rec):
+    fields = rec['obligation']
+    return ', '.join('{} {}'.format(k,v.rstrip(': ')) for k,v in fields) if fields else 'unknown obligation'
+
+def obligation_stats():
+    """ Return the query records added up by proof obligation, slowest
+    first. Each gives the number of calls, the entry points called and
+    the totals of the records, except the size and peak memory, which
+    are maxima. """
+    obls = OrderedDict()
+    for rec in query_stats:
+        key = tuple(rec['obligation'])
+        obl = obls.get(key)
+        if obl is None:
+            obl = obls[key] = {'obligation':rec['obligation'],'calls':0,'entries':[],
+                               'time':0.0,'checks':0,'size':0,'z3':{}}
+        obl['calls'] += 1
+        if rec['entry'] not in obl['entries']:
+            obl['entries'].append(rec['entry'])
+        obl['time'] += rec['time']
+        obl['checks'] += rec['checks']
+        obl['size'] = max(obl['size'],rec['size'])
+        z3stats = obl['z3']
+        for k,v in rec['z3'].iteritems():
+            z3stats[k] = max(z3stats.get(k,0),v) if k in z3_peak_stats else z3stats.get(k,0) + v
+    return sorted(obls.values(),key=lambda r: r['time'],reverse=True)
+
+def print_query_stats(top=10):
+    """ Print a table of the top slowest proof obligations """
+    obls = obligation_stats()
+    total = sum(r['time'] for r in obls)
+    print "solver queries: {} in {} obligations, total time {:.3f}s".format(len(query_stats),len(obls),total)
+    if not obls:
+        return
+    print "{:>9} {:>6} {:>6} {:>10} {:>10} {:>8} {:>8}  {}".format(
+        'time(s)','calls','checks','conflicts','quant-inst','mem(MB)','size','obligation')
+    for obl in obls[:top]:
+        z3stats = obl['z3']
+        print "{:>9.3f} {:>6} {:>6} {:>10} {:>10} {:>8.1f} {:>8}  {} ({})".format(
+            obl['time'],obl['calls'],obl['checks'],z3stats.get('conflicts',0),z3stats.get('quant instantiations',0),
+            z3stats.get('max memory',z3stats.get('memory',0)),obl['size'],describe_query_stats(obl),
+            ', '.join(obl['entries']))
+
+def write_query_stats(fname):
+    """ Write the query records, and their totals by proof obligation,
+    to fname in JSON format """
+    recs = [dict(rec,obligation=dict(rec['obligation'])) for rec in query_stats]
+    obls = [dict(obl,obligation=dict(obl['obligation'])) for obl in obligation_stats()]
+    try:
+        with open(fname,'w') as f:
+            json.dump({'queries':recs,'obligations':obls,'total_time':sum(r['time'] for r in recs)},
+                      f,indent=1,sort_keys=True)
+    except (IOError,OSError) as e:
+        iu.warn(None,'cannot write solver statistics {}: {}'.format(fname,e))
 
 
+@instrumented
 def unsat_core(clauses1, clauses2, implies = None, unlikely=lambda x:False):
 #    print "unsat_core clauses1 = {}, clauses2 = {}".format(clauses1,clauses2)
 #    assert clauses1.defs == []
     fmlas = clauses1.fmlas
-    s2 = z3.Solver()
-    alits = [z3.Const("__c%s" % n, z3.BoolSort()) for n,c in enumerate(fmlas)]
-    cc = [z3.Or(z3.Not(a),formula_to_z3(c)) for a,c in zip(alits,fmlas)]
-    foo = [(a,f) for a,f in zip(alits,fmlas) if unlikely(f)]
-    unlikely_lits = [a for a,f in foo]
-    for d in clauses1.defs:
-        s2.add(formula_to_z3(d.to_constraint()))
-    for c in cc:
-        s2.add(c)
-    s2.add(clauses_to_z3(clauses2))
-    if implies != None:
-        s2.add(not_clauses_to_z3(implies))
-    is_sat = s2.check(alits)
-    if is_sat == z3.sat:
-#        print "unsat_core model = {}".format(get_model(s2))
-        return None
-    if unlikely_lits:
-        core = biased_core(s2,alits,unlikely_lits)
-    else:
-        core = minimize_core(s2)
+    with query_solver(clauses2) as s2:
+        alits = [z3.Const("__c%s" % n, z3.BoolSort()) for n,c in enumerate(fmlas)]
+        cc = [z3.Or(z3.Not(a),formula_to_z3(c)) for a,c in zip(alits,fmlas)]
+        foo = [(a,f) for a,f in zip(alits,fmlas) if unlikely(f)]
+        unlikely_lits = [a for a,f in foo]
+        for d in clauses1.defs:
+            s2.add(formula_to_z3(d.to_constraint()))
+        for c in cc:
+            s2.add(c)
+        if implies != None:
+            s2.add(not_clauses_to_z3(implies))
+        is_sat = cached_check(s2,alits,need='core')
+        if is_sat == z3.sat:
+#            print "unsat_core model = {}".format(get_model(s2))
+            return None
+        if unlikely_lits:
+            core = biased_core(s2,alits,unlikely_lits)
+        else:
+            core = minimize_core(s2,get_core(s2))
     core_ids = [get_id(a) for a in core]
     res = [c for a,c in zip(alits,fmlas) if get_id(a) in core_ids]
 #    print "unsat_core res = {}".format(res)
@@ -431,6 +795,7 @@ def cube_to_z3(cube):
 def get_id(x):
     return z3.Z3_get_ast_id(x.ctx_ref(), x.as_ast())
 
+@instrumented
 def check_cube(s,cube,memo = None,memo_unsat_only = False):
     s.push()
     f = cube_to_z3(cube)
@@ -442,7 +807,7 @@ def check_cube(s,cube,memo = None,memo_unsat_only = False):
         if (not res) or (not memo_unsat_only):
             return memo[fid][1]
     s.add(f)
-    cr = s.check()
+    cr = check_within_limits(s)
     s.pop()
     res = cr != z3.unsat
     if memo != None:
@@ -451,13 +816,38 @@ def check_cube(s,cube,memo = None,memo_unsat_only = False):
     return res
 
 def new_solver():
-    return z3.Solver()
+    """ Return a z3 solver with the resource limits set by the parameters """
+    s = z3.Solver()
+    apply_limits(s)
+    return s
+
+@instrumented
+def check_within_limits(s,atoms=None,need=None):
+    """ Check solver s under assumptions atoms, escalating if the result
+    is unknown (see "solver_escalation"). If it is still unknown because
+    of the resource limits, raise SolverTimeout. This is the common
+    check point of the queries: it adds the check to the query
+    statistics and records the query (see "record_queries"). Callers
+    that would take an unknown result as sat use this rather than
+    s.check(), so that a timeout isn't reported as a failed proof. """
+    start = time.time()
+    s.portfolio_model = s.portfolio_core = None
+    with checked(s,atoms):
+        res = run_check(s,atoms,need)
+        reason = None
+        if res == z3.unknown:
+            res,reason = escalate(s,atoms,need)
+    if record_queries_dir.get():
+        record_query(s,atoms,res,time.time() - start)
+    if res == z3.unknown and is_limit_reason(reason):
+        raise inconclusive(reason)
+    return res
 
 def solver_add(solver,fmla):
     solver.add(formula_to_z3(fmla))
 
 def is_sat(s):
-    return s.check() != z3.unsat
+    return check_within_limits(s) != z3.unsat
 
 def add_clauses(s,clauses):
     foo = clauses_to_z3(clauses)
@@ -465,7 +855,16 @@ def add_clauses(s,clauses):
     s.add(foo)
 
 def get_model(s):
-    return s.model()
+    """ Return the model of the last check of s, which may come from a
+    portfolio worker (see portfolio_check) """
+    m = getattr(s,'portfolio_model',None)
+    return m if m is not None else s.model()
+
+def get_core(s):
+    """ Return the unsat core of the last check of s, which may come
+    from a portfolio worker (see portfolio_check) """
+    core = getattr(s,'portfolio_core',None)
+    return core if core is not None else s.unsat_core()
 
 def terms_match(tl1,tl2):
     if len(tl1) != len(tl2):
@@ -580,6 +979,9 @@ class HerbrandModel(object):
         s = self.solver
         m = self.model
         ranges = [self.constants[x.sort] for x in vs]
+        insts = self.check_interp(fmla,vs,ranges)
+        if insts is not None:
+            return (vs,insts)
         z3_fmla = literal_to_z3(fmla)
 #        print "z3_fmla = {}".format(z3_fmla)
         z3_vs = [term_to_z3(v) for v in vs]
@@ -594,6 +996,84 @@ class HerbrandModel(object):
                 insts.append(args)
         return (vs,insts)
 
+    def check_interp(self,lit,vs,ranges):
+        """ Fast path for "check" on literals of the form r(X1,...,Xn)
+        or f(X1,...,Xn) = Y, where the Xi and Y are distinct variables
+        of uninterpreted sort. Reads the interpretation of r or f
+        from the model once instead of evaluating every tuple. Returns
+        None if the literal is not of this form, or the interpretation
+        is not an explicit table.
+        """
+        atom = lit.atom
+        if ivy_logic.is_eq(atom):
+            app,res_var = atom.args
+            if not (isinstance(res_var,ivy_logic.Variable)
+                    and ivy_logic.is_uninterpreted_sort(res_var.sort)):
+                return None
+        else:
+            app,res_var = atom,None
+        if not (isinstance(app,ivy_logic.App) and app.args and
+                all(isinstance(x,ivy_logic.Variable) for x in app.args)):
+            return None
+        if len(set(vs)) != len(vs) or len(vs) != len(app.args) + (1 if res_var is not None else 0):
+            return None
+        if not all(ivy_logic.is_uninterpreted_sort(x.sort) for x in vs):
+            return None
+        if res_var is None:
+            atom_to_z3(atom)  # make sure the symbol is declared
+            decl = z3_predicates.get(atom.relname)
+        else:
+            term_to_z3(app)
+            decl = z3_functions.get(app.rep)
+        if not isinstance(decl,z3.FuncDeclRef):
+            return None
+        try:
+            interp = self.model[decl]
+        except (IndexError,z3.Z3Exception):
+            return None
+        if not isinstance(interp,z3.FuncInterp):
+            return None
+        entries = interp.as_list()
+        default = entries[-1]
+        table = dict((tuple(get_id(a) for a in e[:-1]),e[-1]) for e in entries[:-1])
+
+        # values of the relation (or function) and of the result
+        # variable are compared by z3 ast id
+        if res_var is None:
+            def value(v):
+                return True if z3.is_true(v) else False if z3.is_false(v) else None
+        else:
+            univ = dict((get_id(c),c) for c in self.constants[res_var.sort])
+            def value(v):
+                return univ.get(get_id(v))
+        dflt = value(default)
+        if dflt is None or any(value(v) is None for v in table.itervalues()):
+            return None
+
+        positions = dict((v,i) for i,v in enumerate(vs))
+        arg_pos = [positions[x] for x in app.args]
+        arg_ranges = [ranges[i] for i in arg_pos]
+        insts = []
+        for tup in itertools.product(*arg_ranges):
+            val = table.get(tuple(get_id(c) for c in tup))
+            val = dflt if val is None else value(val)
+            if res_var is None:
+                if val != (lit.polarity == 0):
+                    row = [None] * len(vs)
+                    for i,c in zip(arg_pos,tup):
+                        row[i] = c
+                    insts.append(row)
+            else:
+                # f(X...) = Y holds for Y = val only, or for every other Y if negated
+                for y in (([val] if lit.polarity == 1 else
+                           [c for c in ranges[positions[res_var]] if get_id(c) != get_id(val)])):
+                    row = [None] * len(vs)
+                    for i,c in zip(arg_pos,tup):
+                        row[i] = c
+                    row[positions[res_var]] = y
+                    insts.append(row)
+        return [[constant_from_z3(v.sort,y) for v,y in zip(vs,row)] for row in insts]
+
     def eval(self,fmla):
         """ Evaluate a formula in the model. Variables are interpreted universally. """
         vs,tups = self.check(ivy_logic.Literal(0,fmla))
@@ -618,7 +1098,7 @@ def constant_from_z3(sort,c):
 
 def get_model_constant(m,t):
     s = t.get_sort()
-    if isinstance(s,ivy_logic.EnumeratedSort) and not use_z3_enums:
+    if isinstance(s,ivy_logic.EnumeratedSort) and not native_enum(s):
         for v in s.defines():
             w = ivy_logic.Constant(ivy_logic.Symbol(v,s))
             if z3.is_true(m.eval(encode_equality(t,w))):
@@ -633,36 +1113,80 @@ def get_model_constant(m,t):
 
 
 
+@instrumented
 def clauses_imply(clauses1, clauses2):
     """True if clauses1 imply clauses2.
     """
-    s = z3.Solver()
-    z1 = clauses_to_z3(clauses1)
-#    print "z1 = {}".format(z1)
-    s.add(z1)
-    z2 = not_clauses_to_z3(clauses2)
-#    print "z2 = {}".format(z2)
-    s.add(z2)
-    return s.check() == z3.unsat
+    with query_solver(clauses1) as s:
+        z2 = not_clauses_to_z3(clauses2)
+#        print "z2 = {}".format(z2)
+        s.add(z2)
+        return cached_check(s) == z3.unsat
 
+@instrumented
 def clauses_imply_list(clauses1, clauses2_list):
     """True if clauses1 imply clauses2.
     """
-    s = z3.Solver()
-    z1 = clauses_to_z3(clauses1)
-#    print "z1 = {}".format(z1)
-    s.add(z1)
+    with query_solver(clauses1) as s:
+        res = []
+        negs = map(dual_clauses,clauses2_list)
 
-    res = []
-    negs = map(dual_clauses,clauses2_list)
-        
-    for clauses2 in negs:
-        z2 = clauses_to_z3(clauses2)
-#        print "z2 = {}".format(z2)
-        s.push()
-        s.add(z2)
-        res.append(s.check() == z3.unsat)
-        s.pop()
+        for clauses2 in negs:
+            z2 = clauses_to_z3(clauses2)
+#            print "z2 = {}".format(z2)
+            s.push()
+            s.add(z2)
+            res.append(cached_check(s) == z3.unsat)
+            s.pop()
+        return res
+
+@instrumented
+def check_goals(premises, goals):
+    """ Returns a list of Booleans telling which of the Clauses in goals
+    are implied by premises (the same as clauses_imply_list).
+
+    The premises are asserted once, and each negated goal is guarded
+    by a fresh Boolean selector. Each check asks whether some
+    remaining goal can be falsified. If not, all remaining goals are
+    implied. If so, every remaining goal that the model falsifies is
+    marked as not implied, so one check can refute many goals.
+    """
+    res = [True] * len(goals)
+    with query_solver(premises) as s:
+        # goals are negated by skolemizing, so the negations are ground
+        # and can be evaluated in a model. Selectors guard each negation,
+        # so sharing skolem names between goals is harmless.
+        negs = [clauses_to_z3(dual_clauses(g)) for g in goals]
+        sels = [z3.Bool('__goal{}'.format(i)) for i in range(len(goals))]
+        for sel,neg in zip(sels,negs):
+            s.add(z3.Implies(sel,neg))
+        if ground_mode.get():
+            # the model is only used to evaluate ground formulas, so a
+            # model of the grounding will do
+            s = grounded_solver(s) or s
+        remaining = range(len(goals))
+        while remaining:
+            s.push()
+            s.add(z3.Or([sels[i] for i in remaining]))
+            cr = cached_check(s,need='model')
+            if cr == z3.unsat:
+                s.pop()
+                break
+            if cr != z3.sat:
+                # inconclusive: fall back to one check per goal
+                s.pop()
+                for i in remaining:
+                    with obligation(conjecture=getattr(goals[i],'lineno',None)):
+                        res[i] = cached_check(s,[sels[i]]) == z3.unsat
+                break
+            m = get_model(s)
+            refuted = set(i for i in remaining
+                          if z3.is_true(m.eval(sels[i],model_completion=True))
+                          or z3.is_true(m.eval(negs[i])))
+            s.pop()
+            for i in refuted:
+                res[i] = False
+            remaining = [i for i in remaining if i not in refuted]
     return res
 
 def not_clauses_to_z3(clauses):
@@ -678,9 +1202,8 @@ def not_clauses_to_z3(clauses):
 def clauses_sat(clauses1):
     """True if clauses1 imply clauses2.
     """
-    s = z3.Solver()
-    s.add(clauses_to_z3(clauses1))
-    return s.check() != z3.unsat
+    with query_solver(clauses1) as s:
+        return cached_check(s) != z3.unsat
 
 
 def remove_duplicates_clauses(clauses):
@@ -691,9 +1214,9 @@ def remove_duplicates_clauses(clauses):
 def clauses_case(clauses1):
     """ Drop literals in a clause set while maintaining satisfiability.
     This only works for quantifier-free clauses. """
-    s = z3.Solver()
+    s = new_solver()
     s.add(clauses_to_z3(clauses1))
-    if s.check() == z3.unsat:
+    if check_within_limits(s,need='model') == z3.unsat:
         return [[]]
     m = get_model(s)
 #    print "clauses_case: after SAT check"
@@ -736,14 +1259,12 @@ def clause_model_simp(m,c):
     return res
 
 def get_model_clauses(clauses1):
-    s = z3.Solver()
-    z3c = clauses_to_z3(clauses1)
-    s.add(z3c)
-    res = s.check()
-    if res == z3.unsat:
-        return None
-    m = get_model(s)
-    return HerbrandModel(s,m,used_symbols_clauses(clauses1))
+    with query_solver(clauses1,model=True) as s:
+        res = check_within_limits(s,need='model')
+        if res == z3.unsat:
+            return None
+        m = get_model(s)
+        return HerbrandModel(s,m,used_symbols_clauses(clauses1))
 
 def sort_size_constraint(sort,size):
     if isinstance(sort,ivy_logic.UninterpretedSort):
@@ -795,41 +1316,768 @@ def size_constraint(x, size):
 def model_if_none(clauses1,implied,model):
     h = model
     if h == None:
-        s = z3.Solver()
-        z3c = clauses_to_z3(clauses1)
-        s.add(z3c)
-        if implied != None:
-            s.add(not_clauses_to_z3(implied))
-        sort_size = 1
-        while True:
-            s.push()
-            for sort in ivy_logic.uninterpreted_sorts():
-                s.add(formula_to_z3(sort_size_constraint(sort,sort_size)))
-            if s.check() != z3.unsat:
-                m = get_model(s)
-                print "model = {}, size = {}".format(m,sort_size)
-##        print "clauses1 = {}".format(clauses1)
-##        print "z3c = {}".format(str(z3c))
-                syms = used_symbols_clauses(clauses1)
-                if implied != None:
-                    syms.update(used_symbols_clauses(implied))
-                h = HerbrandModel(s,m,syms)
+        with query_solver(clauses1,model=True) as s:
+            if implied != None:
+                s.add(not_clauses_to_z3(implied))
+            sort_size = 1
+            while True:
+                s.push()
+                for sort in ivy_logic.uninterpreted_sorts():
+                    s.add(formula_to_z3(sort_size_constraint(sort,sort_size)))
+                if check_within_limits(s,need='model') != z3.unsat:
+                    m = get_model(s)
+                    print "model = {}, size = {}".format(m,sort_size)
+##            print "clauses1 = {}".format(clauses1)
+##            print "z3c = {}".format(str(z3c))
+                    syms = used_symbols_clauses(clauses1)
+                    if implied != None:
+                        syms.update(used_symbols_clauses(implied))
+                    h = HerbrandModel(s,m,syms)
+                    s.pop()
+                    return h
+                sort_size += 1
                 s.pop()
-                return h
-            sort_size += 1
-            s.pop()
     return h
 
 
-def decide(s,atoms=None):
+# On-disk cache of query results. With "cache=<dir>", the verdict of
+# every query checked through cached_check is stored in <dir> under
+# a hash of the canonical text of the query (sorted declarations and
+# sorted assertions), so re-checking an unchanged module answers its
+# queries from disk. Satisfiable queries also store their SMT-LIB
+# text, so a counterexample can be regenerated from the cache.
+
+result_cache_dir = iu.Parameter("cache","")
+
+result_cache_stats = {'hits':0,'misses':0}
+
+z3_verdicts = {'sat':z3.sat,'unsat':z3.unsat}
+
+def query_key(s,atoms=None):
+    """ Return a hash of the canonical form of the query "check s under atoms" """
+    decls = sorted(l for l in s.to_smt2().split('\n') if l.startswith('(declare-'))
+    asserts = sorted(f.sexpr() for f in s.assertions())
+    assumptions = sorted(a.sexpr() for a in atoms) if atoms else []
+    text = '\n'.join([z3.get_version_string()] + decls + ['; assertions'] + asserts
+                     + ['; assumptions'] + assumptions)
+    return hashlib.sha1(text).hexdigest()
+
+def result_cache_file(key):
+    return os.path.join(result_cache_dir.get(),key[:2],key)
+
+def lookup_result(key):
+    try:
+        with open(result_cache_file(key)) as f:
+            return z3_verdicts.get(json.load(f).get('result'))
+    except (IOError,ValueError):
+        return None
+
+def store_result(key,s,atoms,res):
+    if res not in (z3.sat,z3.unsat):
+        return
+    entry = {'result':str(res)}
+    if res == z3.sat:
+        entry['smt2'] = s.to_smt2()
+        entry['assumptions'] = [a.sexpr() for a in atoms] if atoms else []
+    fname = result_cache_file(key)
+    dname = os.path.dirname(fname)
+    try:
+        if not os.path.isdir(dname):
+            os.makedirs(dname)
+        tmpname = '{}.{}.tmp'.format(fname,os.getpid())
+        with open(tmpname,'w') as f:
+            json.dump(entry,f)
+        os.rename(tmpname,fname) # atomic, so concurrent runs can share the cache
+    except (IOError,OSError) as e:
+        iu.warn(None,'cannot write solver cache {}: {}'.format(fname,e))
+
+def cached_check(s,atoms=None,need=None):
+    """ Check solver s under assumptions atoms, using the result cache
+    if enabled. If need is 'model', a cached sat result is not used,
+    since the caller will ask the solver for a model. Similarly, if
+    need is 'core', a cached unsat result is not used. """
+    key = None
+    if result_cache_dir.get():
+        key = query_key(s,atoms)
+        res = lookup_result(key)
+        if res is not None and not (need == 'model' and res == z3.sat
+                                    or need == 'core' and res == z3.unsat):
+            result_cache_stats['hits'] += 1
+            return res
+        result_cache_stats['misses'] += 1
+    res = check_within_limits(s,atoms,need)
+    if key is not None:
+        store_result(key,s,atoms,res)
+    return res
+
+def constants_and_elements(fmlas):
+    """ Return the uninterpreted constants of the z3 formulas fmlas, as
+    a map from declaration id to constant, and the set of names of the
+    elements of the enumerated sorts they use. """
+    consts = {}
+    elems = set()
+    memo = set()
+    todo = list(fmlas)
+    while todo:
+        e = todo.pop()
+        eid = get_id(e)
+        if eid in memo:
+            continue
+        memo.add(eid)
+        if z3.is_quantifier(e):
+            todo.append(e.body())
+            continue
+        if not z3.is_app(e):
+            continue
+        d = e.decl()
+        if d.kind() == z3.Z3_OP_UNINTERPRETED and d.arity() == 0:
+            consts[get_id(d)] = e
+        sort = e.sort()
+        if isinstance(sort,z3.DatatypeSortRef):
+            elems.update(sort.constructor(i).name() for i in range(sort.num_constructors()))
+        todo.extend(e.children())
+    return consts,elems
+
+def constant_renaming(fmlas):
+    """ z3 prints constants by name, so two constants of different
+    sorts with the same name (for example, the numeral 0 of two
+    uninterpreted sorts) or a constant named like an enumerated
+    element can't be read back. Return a substitution renaming such
+    constants to "name:sort".
+    """
+    consts,elems = constants_and_elements(fmlas)
+    by_name = defaultdict(list)
+    for c in consts.values():
+        by_name[c.decl().name()].append(c)
+    return [(c,z3.Const('{}:{}'.format(name,c.sort()),c.sort()))
+            for name,cs in by_name.iteritems() if len(cs) > 1 or name in elems for c in cs]
+
+def fmlas_to_smt2(fmlas,subst=[]):
+    """ Return SMT-LIB2 text asserting the z3 formulas fmlas, after
+    applying the substitution subst """
+    q = z3.Solver()
+    q.add([z3.substitute(f,*subst) for f in fmlas] if subst else fmlas)
+    return q.to_smt2()
+
+def query_to_smt2(s,atoms=None):
+    """ Return the query "check s under atoms" as SMT-LIB2 text. The
+    assumptions are asserted, which gives the same verdict. """
+    fmlas = list(s.assertions()) + list(atoms or [])
+    return fmlas_to_smt2(fmlas,constant_renaming(fmlas))
+
+# Query recording. With "record_queries=<dir>", every query checked
+# through check_within_limits (including those of cached_check) is
+# written to <dir> as an SMT-LIB2 file. The file starts with comment
+# lines "; ivy-<key>: <value>" giving the result, the check time in
+# seconds, the ivy_solver entry point and its caller, and the proof
+# obligation. See ivy_replay for a tool that re-runs a recorded corpus.
+
+record_queries_dir = iu.Parameter("record_queries","")
+
+recorded_queries = [0]
+
+def query_call_site():
+    """ Return the outermost ivy_solver function on the stack and its caller """
+    frame = sys._getframe(1)
+    here = frame.f_code.co_filename
+    entry = None
+    while frame is not None and frame.f_code.co_filename == here:
+        if frame.f_code.co_name != 'instrumented_fun':
+            entry = frame.f_code.co_name
+        frame = frame.f_back
+    if frame is None:
+        return entry,''
+    caller = '{}:{}:{}'.format(os.path.basename(frame.f_code.co_filename),frame.f_lineno,frame.f_code.co_name)
+    return entry,caller
+
+def record_query(s,atoms,res,elapsed):
+    dname = record_queries_dir.get()
+    recorded_queries[0] += 1
+    fname = os.path.join(dname,'{}-{:06d}.smt2'.format(os.getpid(),recorded_queries[0]))
+    entry,caller = query_call_site()
+    header = [('result',str(res)),('time','{:.6f}'.format(elapsed)),('entry',entry),
+              ('caller',caller),('obligation',describe_obligation())]
+    try:
+        if not os.path.isdir(dname):
+            os.makedirs(dname)
+        with open(fname,'w') as f:
+            for k,v in header:
+                f.write('; ivy-{}: {}\n'.format(k,v))
+            f.write(query_to_smt2(s,atoms))
+    except (IOError,OSError) as e:
+        iu.warn(None,'cannot record query {}: {}'.format(fname,e))
+
+# Portfolio mode. With "portfolio=N", a query that is not decided
+# within "portfolio_delay" milliseconds is run in N processes, each
+# using a different z3 configuration. The first definitive answer
+# wins and the other processes are terminated. If the caller needs a
+# model or an unsat core, the winning process sends it back with its
+# answer: a model as SMT-LIB2 constraints that determine it, and a core
+# as the positions of the assumptions in it. The model or core is
+# kept on the solver until its next check (see get_model and
+# get_core). If every process fails, the query is checked in this
+# process instead.
+
+portfolio_size = iu.Parameter("portfolio",1,check=lambda s: s.isdigit() and int(s) > 0,process=int)
+portfolio_delay = iu.Parameter("portfolio_delay",1000,check=lambda s: s.isdigit(),process=int)
+
+portfolio_configs = [
+    [],
+    [('smt.random_seed',1)],
+    [('smt.mbqi',False)],
+    [('auto_config',False)],
+    [('smt.random_seed',2)],
+    [('smt.random_seed',3),('smt.mbqi',False)],
+]
+
+# solver parameters of the configurations that can be set per solver,
+# with their names as solver parameters and their defaults. The names
+# are unqualified, since after an inconclusive check a solver rejects
+# "smt.random_seed".
+solver_params = {'smt.random_seed':('random_seed',0), 'smt.mbqi':('mbqi',True)}
+
+z3_no_timeout = 4294967295
+
+def portfolio_config(i):
+    return portfolio_configs[i] if i < len(portfolio_configs) else [('smt.random_seed',i)]
+
+def model_to_smt2(m):
+    """ Return SMT-LIB2 text asserting the interpretations of the
+    symbols in model m. The universe elements are named by fresh
+    constants, since z3 can't read back their names. They are distinct,
+    and a sort whose universe the model gives has no other elements. """
+    fmlas = []
+    for d in m.decls():
+        if d.kind() != z3.Z3_OP_UNINTERPRETED:
+            continue
+        if d.arity() == 0:
+            fmlas.append(d() == m[d])
+            continue
+        interp = m[d]
+        xs = [z3.Const('__x{}'.format(i),d.domain(i)) for i in range(d.arity())]
+        # the else value refers to the arguments by de Bruijn index
+        body = z3.substitute_vars(interp.else_value(),*xs)
+        for entry in reversed(interp.as_list()[:-1]):
+            body = z3.If(z3.And([x == v for x,v in zip(xs,entry[:-1])]),entry[-1],body)
+        fmlas.append(z3.ForAll(xs,d(*xs) == body))
+    # the elements are the constants that aren't symbols of the model
+    symbols = set(get_id(d) for d in m.decls())
+    univs = OrderedDict((get_id(sort),(sort,OrderedDict())) for sort in m.sorts())
+    for sort,univ in univs.values():
+        for e in m.get_universe(sort):
+            univ[get_id(e)] = e
+    todo = list(fmlas)
+    memo = set()
+    while todo:
+        e = todo.pop()
+        if get_id(e) in memo:
+            continue
+        memo.add(get_id(e))
+        if z3.is_quantifier(e):
+            todo.append(e.body())
+        elif z3.is_app(e):
+            d = e.decl()
+            if (d.arity() == 0 and d.kind() == z3.Z3_OP_UNINTERPRETED
+                and get_id(d) not in symbols and e.sort().kind() == z3.Z3_UNINTERPRETED_SORT):
+                univs.setdefault(get_id(e.sort()),(e.sort(),OrderedDict()))[1][get_id(e)] = e
+            todo.extend(e.children())
+    elems = []
+    for sid,(sort,univ) in univs.iteritems():
+        univ = univ.values()
+        elems.extend((e,z3.Const('__{}!val!{}'.format(sort.name(),i),sort)) for i,e in enumerate(univ))
+        if len(univ) > 1:
+            fmlas.append(z3.Distinct(*univ))
+        if univ and any(get_id(sort) == get_id(x) for x in m.sorts()):
+            x = z3.Const('__x',sort)
+            fmlas.append(z3.ForAll([x],z3.Or([x == e for e in univ])))
+    return fmlas_to_smt2(fmlas,elems)
+
+def model_from_smt2(text,renaming,s,atoms):
+    """ Return a model of the query "check s under atoms" with the
+    interpretations given by text (see model_to_smt2), undoing the
+    constant renaming of the query, or None if there is none. Since
+    the interpretations are fixed, this check is easy. """
+    back = [(new,old) for old,new in renaming]
+    try:
+        fmlas = [z3.substitute(f,*back) if back else f for f in z3.parse_smt2_string(text)]
+    except z3.Z3Exception:
+        return None
+    t = new_solver()
+    t.add(s.assertions())
+    t.add(list(atoms or []))
+    t.add(fmlas)
+    return t.model() if t.check() == z3.sat else None
+
+def portfolio_worker(text,num_atoms,need,config,idx,results,factor):
+    try:
+        for name,value in config:
+            z3.set_param(name,value)
+        s = z3.Solver()
+        apply_limits(s,factor)
+        fmlas = list(z3.parse_smt2_string(text))
+        # the atoms are asserted last in the query
+        num_fmlas = len(fmlas) - num_atoms
+        atoms = fmlas[num_fmlas:]
+        s.add(fmlas[:num_fmlas])
+        res = s.check(*atoms)
+        answer = None
+        if res == z3.sat and need == 'model':
+            answer = model_to_smt2(s.model())
+        elif res == z3.unsat and need == 'core':
+            core = set(get_id(a) for a in s.unsat_core())
+            answer = [i for i,a in enumerate(atoms) if get_id(a) in core]
+        results.put((idx,str(res),answer))
+    except Exception as e:
+        results.put((idx,'error: {}'.format(str(e).strip()),None))
+
+class PortfolioFailed(Exception):
+    pass
+
+def portfolio_check(s,atoms,need,n,factor=1):
+    """ Run the query in n processes with different configurations.
+    Returns the first definitive result with the model or core that
+    the caller needs (see run_portfolio), the renaming of constants in
+    the query text and the index of the winning configuration, or
+    (unknown,None,renaming,None). The resource limits are multiplied by
+    factor. Raises PortfolioFailed if every process fails. """
+    fmlas = list(s.assertions()) + list(atoms or [])
+    renaming = constant_renaming(fmlas)
+    text = fmlas_to_smt2(fmlas,renaming)
+    num_atoms = len(atoms) if atoms else 0
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=portfolio_worker,
+                                     args=(text,num_atoms,need,portfolio_config(i),i,results,factor))
+             for i in range(n)]
+    try:
+        for p in procs:
+            p.start()
+        pending = len(procs)
+        failed = 0
+        while pending:
+            try:
+                idx,res,answer = results.get(timeout=1)
+            except Queue.Empty:
+                if not any(p.is_alive() for p in procs) and results.empty():
+                    failed += pending # workers died without answering
+                    break
+                continue
+            pending -= 1
+            if res in z3_verdicts:
+                return z3_verdicts[res],answer,renaming,idx
+            if res.startswith('error'):
+                failed += 1
+                iu.warn(None,'portfolio worker {} failed checking {}: {}'.format(idx,describe_obligation(),res[len('error: '):]))
+        if failed == len(procs):
+            raise PortfolioFailed()
+        return z3.unknown,None,renaming,None
+    finally:
+        for p in procs:
+            if p.is_alive():
+                p.terminate()
+            p.join()
+
+# EPR grounding. With "ground=true", a query that doesn't need a model
+# or core from the solver is converted to negation normal form with
+# skolemization, and each universal quantifier is replaced by its
+# instances over the Herbrand universe of the query: the closure of
+# its ground terms under its uninterpreted functions. For stratified
+# EPR this universe is finite, and the ground query is equisatisfiable
+# with the original one. If a quantifier ranges over an infinite sort,
+# or the universes or the number of instances exceed "ground_limit",
+# the query is checked as usual.
+
+ground_mode = iu.BooleanParameter("ground",False)
+ground_limit = iu.Parameter("ground_limit",10000,check=lambda s: s.isdigit(),process=int)
+
+ground_stats = {'ground':0,'fallback':0}
+
+class GroundingFailed(Exception):
+    pass
+
+def sort_elements(sort,universes):
+    """ Return the list of terms over which a variable of the sort ranges """
+    if sort.kind() == z3.Z3_UNINTERPRETED_SORT:
+        return universes[get_id(sort)].values()
+    if sort.kind() == z3.Z3_BOOL_SORT:
+        return [z3.BoolVal(False),z3.BoolVal(True)]
+    if isinstance(sort,z3.DatatypeSortRef) and all(sort.constructor(i).arity() == 0
+                                                   for i in range(sort.num_constructors())):
+        return [sort.constructor(i)() for i in range(sort.num_constructors())]
+    if z3.is_bv_sort(sort) and 2**sort.size() <= ground_limit.get():
+        return [z3.BitVecVal(i,sort) for i in range(2**sort.size())]
+    raise GroundingFailed()
+
+def herbrand_universes(fmlas):
+    """ Return a map from the ids of the uninterpreted sorts of fmlas
+    to their Herbrand universes (as ordered maps from term id to term). """
+    universes = defaultdict(OrderedDict)
+    sorts_used = {}
+    funs = {}
+    ground = {} # map from term id to true if the term is ground
+    todo = list(fmlas)
+    while todo:
+        # post-order walk, collecting the uninterpreted symbols
+        e = todo[-1]
+        eid = get_id(e)
+        if eid in ground:
+            todo.pop()
+            continue
+        if z3.is_var(e):
+            ground[eid] = False
+            todo.pop()
+            continue
+        children = [e.body()] if z3.is_quantifier(e) else e.children()
+        pending = [c for c in children if get_id(c) not in ground]
+        if pending:
+            todo.extend(reversed(pending))
+            continue
+        todo.pop()
+        if z3.is_quantifier(e):
+            for i in range(e.num_vars()):
+                sort = e.var_sort(i)
+                if sort.kind() == z3.Z3_UNINTERPRETED_SORT:
+                    sorts_used[get_id(sort)] = sort
+            ground[eid] = False
+            continue
+        d = e.decl()
+        if d.kind() == z3.Z3_OP_UNINTERPRETED and d.arity() > 0:
+            funs[get_id(d)] = d
+            for i in range(d.arity()):
+                if d.domain(i).kind() == z3.Z3_UNINTERPRETED_SORT:
+                    sorts_used[get_id(d.domain(i))] = d.domain(i)
+        ground[eid] = all(ground[get_id(c)] for c in children)
+        if ground[eid] and e.sort().kind() == z3.Z3_UNINTERPRETED_SORT:
+            universes[get_id(e.sort())][eid] = e
+    # Herbrand universes are non-empty
+    for sid,sort in sorts_used.iteritems():
+        if not universes[sid]:
+            c = z3.Const('__herbrand_' + sort.name(),sort)
+            universes[sid][get_id(c)] = c
+    limit = ground_limit.get()
+    funs = [d for d in funs.values() if d.range().kind() == z3.Z3_UNINTERPRETED_SORT]
+    changed = True
+    while changed:
+        changed = False
+        for d in funs:
+            univ = universes[get_id(d.range())]
+            doms = [sort_elements(d.domain(i),universes) for i in range(d.arity())]
+            for args in itertools.product(*doms):
+                t = d(*args)
+                tid = get_id(t)
+                if tid not in univ:
+                    univ[tid] = t
+                    changed = True
+                    if len(univ) > limit:
+                        raise GroundingFailed()
+    return universes
+
+def ground_quantifiers(e,universes,count):
+    """ Replace the quantifiers of e (in negation normal form) by their
+    ground instances. The number of instances is accumulated in count. """
+    if not z3.is_quantifier(e):
+        qs = OrderedDict()
+        seen = set()
+        todo = [e]
+        while todo:
+            f = todo.pop()
+            if get_id(f) in seen:
+                continue
+            seen.add(get_id(f))
+            if z3.is_quantifier(f):
+                qs[get_id(f)] = f
+            elif z3.is_app(f) and z3.is_bool(f):
+                todo.extend(reversed(f.children()))
+        if not qs:
+            return e
+        return z3.substitute(e,*[(q,ground_quantifiers(q,universes,count)) for q in qs.values()])
+    if not e.is_forall():
+        raise GroundingFailed()
+    n = e.num_vars()
+    doms = [sort_elements(e.var_sort(i),universes) for i in range(n)]
+    insts = []
+    for args in itertools.product(*doms):
+        count[0] += 1
+        if count[0] > ground_limit.get():
+            raise GroundingFailed()
+        # de Bruijn index 0 is the last bound variable
+        inst = z3.substitute_vars(e.body(),*reversed(args))
+        insts.append(ground_quantifiers(inst,universes,count))
+    return z3.And(insts)
+
+def ground_query(s,atoms=None):
+    """ Return a list of ground formulas equisatisfiable with the
+    assertions of s, or None if the query can't be grounded. """
+    try:
+        goal = z3.Goal()
+        goal.add(s.assertions())
+        subgoals = z3.Tactic('nnf')(goal)
+        if len(subgoals) != 1:
+            raise GroundingFailed()
+        fmlas = list(subgoals[0])
+        universes = herbrand_universes(fmlas + list(atoms or []))
+        count = [0]
+        return [ground_quantifiers(f,universes,count) for f in fmlas]
+    except (GroundingFailed,z3.Z3Exception):
+        return None
+
+def grounded_solver(s,atoms=None):
+    """ Return a new solver with the grounding of the query "check s
+    under atoms", or None if the query can't be grounded. """
+    fmlas = ground_query(s,atoms)
+    if fmlas is None:
+        ground_stats['fallback'] += 1
+        return None
+    ground_stats['ground'] += 1
+    g = new_solver()
+    g.add(fmlas)
+    return g
+
+def ground_check(s,atoms=None):
+    """ Check the grounding of the query "check s under atoms". Returns
+    unknown if the query can't be grounded. """
+    g = grounded_solver(s,atoms)
+    if g is None:
+        return z3.unknown
+    return g.check() if atoms == None else g.check(atoms)
+
+def run_check(s,atoms=None,need=None):
+    """ Check solver s under assumptions atoms, using grounding or the
+    portfolio if enabled. """
+    if ground_mode.get() and need is None:
+        res = ground_check(s,atoms)
+        if res != z3.unknown:
+            return res
+    n = portfolio_size.get()
+    if n <= 1:
+        return s.check() if atoms == None else s.check(atoms)
+    timeout = portfolio_delay.get()
+    if solver_timeout.get():
+        timeout = min(timeout,solver_timeout.get())
+    s.set('timeout',timeout)
+    try:
+        res = s.check() if atoms == None else s.check(atoms)
+    finally:
+        apply_limits(s)
+    if res != z3.unknown:
+        return res
+    return run_portfolio(s,atoms,need,n)
+
+def run_portfolio(s,atoms,need,n,factor=1):
+    try:
+        res,answer,renaming,idx = portfolio_check(s,atoms,need,n,factor)
+    except PortfolioFailed:
+        # no process could check the query, so check it here, with
+        # the usual limits rather than the portfolio delay
+        apply_limits(s,factor)
+        try:
+            return s.check() if atoms == None else s.check(atoms)
+        finally:
+            apply_limits(s)
+    if res == z3.sat and need == 'model':
+        s.portfolio_model = model_from_smt2(answer,renaming,s,atoms)
+        if s.portfolio_model is not None:
+            return res
+    elif res == z3.unsat and need == 'core':
+        s.portfolio_core = [atoms[i] for i in answer]
+        return res
+    else:
+        return res
+    # the model couldn't be read back, so re-run here with the
+    # winning configuration
+    config = [solver_params[name] + (value,) for name,value in portfolio_config(idx) if name in solver_params]
+    for name,default,value in config:
+        s.set(name,value)
+    apply_limits(s,factor)
+    try:
+        return s.check() if atoms == None else s.check(atoms)
+    finally:
+        for name,default,value in config:
+            s.set(name,default)
+        apply_limits(s)
+
+# Resource limits. With "solver_timeout=<ms>" and "solver_rlimit=<n>",
+# every solver created by Ivy gets a time and resource limit. When a
+# query is inconclusive, the steps of "solver_escalation" (a comma
+# separated list) are tried in order until one gives an answer:
+#
+# double    -- retry with twice the current limits
+# tactic    -- retry with a preprocessing tactic (only for queries
+#              that don't need a model or core from the solver)
+# portfolio -- run the query in a parallel portfolio (see above)
+#
+# If the query is still inconclusive because of the limits, a
+# SolverTimeout error is raised naming the proof obligation (see
+# "obligation") being checked.
+
+solver_timeout = iu.Parameter("solver_timeout",0,check=lambda s: s.isdigit(),process=int)
+solver_rlimit = iu.Parameter("solver_rlimit",0,check=lambda s: s.isdigit(),process=int)
+escalation_steps = ['double','tactic','portfolio']
+solver_escalation = iu.Parameter("solver_escalation","",
+                                 check=lambda s: all(x in escalation_steps for x in s.split(',') if x))
+
+escalation_tactic = ['simplify','propagate-values','solve-eqs','smt']
+
+def apply_limits(s,factor=1):
+    """ Set the resource limits of solver s, multiplied by factor """
+    timeout = solver_timeout.get()
+    s.set('timeout',timeout * factor if timeout else z3_no_timeout)
+    if solver_rlimit.get() or factor != 1:
+        s.set('rlimit',solver_rlimit.get() * factor)
+
+def escalate(s,atoms,need):
+    """ Retry an inconclusive query with the steps of solver_escalation.
+    Returns the result and the reason for the last unknown result. """
+    res,reason,factor = z3.unknown,s.reason_unknown(),1
+    for step in solver_escalation.get().split(','):
+        if step == 'double':
+            factor *= 2
+            apply_limits(s,factor)
+            try:
+                res = s.check() if atoms == None else s.check(atoms)
+                reason = s.reason_unknown() if res == z3.unknown else reason
+            finally:
+                apply_limits(s)
+        elif step == 'tactic' and need is None:
+            t = z3.Then(*escalation_tactic).solver()
+            apply_limits(t,factor)
+            t.add(s.assertions())
+            for a in (atoms or []):
+                t.add(a)
+            res = t.check()
+            reason = t.reason_unknown() if res == z3.unknown else reason
+        elif step == 'portfolio':
+            res = run_portfolio(s,atoms,need,max(portfolio_size.get(),len(portfolio_configs)),factor)
+        if res != z3.unknown:
+            break
+    return res,reason
+
+def is_limit_reason(reason):
+    # When a limit is hit inside some procedures (e.g., model-based
+    # quantifier instantiation) z3 gives no reason but "unknown", so
+    # with limits set an unexplained unknown is taken as a limit.
+    if reason == 'unknown' and (solver_timeout.get() or solver_rlimit.get()):
+        return True
+    return any(w in reason for w in ['timeout','canceled','resource','rlimit'])
+
+class SolverTimeout(iu.IvyError):
+    pass
+
+# Proof obligations. Checkers describe the obligation being checked
+# with nested "obligation" contexts, for example:
+#
+# >>> with obligation(isolate='iso'):
+# >>>     with obligation(action='ext:send'):
+# >>>         ...
+#
+# so that inconclusive results can be reported precisely.
+
+obligation_stack = []
+
+class obligation(object):
+    """ Context manager adding fields to the description of the
+    current proof obligation. Fields with value None are ignored. """
+
+    def __init__(self,**fields):
+        self.fields = [(k,v) for k,v in sorted(fields.iteritems()) if v is not None]
+
+    def __enter__(self):
+        obligation_stack.append(self.fields)
+        return self
+
+    def __exit__(self,exc_type, exc_val, exc_tb):
+        obligation_stack.pop()
+        return False # don't block any exceptions
+
+def current_obligation():
+    """ Return the fields of the current proof obligation as a list of pairs """
+    return [f for fields in obligation_stack for f in fields]
+
+def describe_obligation():
+    fields = current_obligation()
+    if not fields:
+        return 'unknown obligation'
+    return ', '.join('{} {}'.format(k,str(v).rstrip(': ')) for k,v in fields)
+
+def inconclusive(reason):
+    return SolverTimeout(None,"Solver produced inconclusive result ({}) checking {}"
+                         .format(reason,describe_obligation()))
+
+@instrumented
+def decide(s,atoms=None,need=None):
 #    print "solving{"
-    res = s.check() if atoms == None else s.check(atoms)
+    res = cached_check(s,atoms,need)
     if res == z3.unknown:
-        print s.to_smt2()
-        raise iu.IvyError(None,"Solver produced inconclusive result")
+        raise inconclusive(s.reason_unknown())
 #    print "}"
     return res
 
+# Search strategy for the universe and relation sizes in get_small_model:
+#
+# linear   -- try sizes 1,2,3,... (one check per size)
+# binary   -- galloping search 1,2,4,... followed by binary search
+# optimize -- minimize the sort sizes together with z3's Optimize, using
+#             the size of the first model as an upper bound. Relations
+#             are then minimized with binary search.
+#
+# Sizes are usually small, and up to size 3 linear search needs the
+# fewest checks, so it is the default. Binary search needs fewer
+# checks when sizes are large.
+
+small_model_search = iu.EnumeratedParameter("small_model",["linear","binary","optimize"],"linear")
+
+def probe_size(s,x,n):
+    """ Return a model of s with x of size at most n, or None if there
+    is none. """
+    s.push()
+    s.add(formula_to_z3(size_constraint(x, n)))
+    res = decide(s,need='model')
+    m = get_model(s) if res == z3.sat else None
+    s.pop()
+    return m
+
+def minimize_size_binary(s,x):
+    """ Return the least n such that s is satisfiable with x of size at
+    most n, and a model of s with x of size n. Satisfiability is monotone
+    in n, so a galloping search finds an upper bound in a logarithmic
+    number of checks, and a binary search then finds the least size. """
+    lo,hi = 0,1  # invariant: lo is unsat (or zero) and hi is the next probe
+    m = probe_size(s,x,hi)
+    while m is None:
+        lo,hi = hi,2*hi
+        m = probe_size(s,x,hi)
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        mid_m = probe_size(s,x,mid)
+        if mid_m is not None:
+            hi,m = mid,mid_m
+        else:
+            lo = mid
+    return hi,m
+
+def minimize_sorts_optimize(s,sorts):
+    """ Return a dictionary giving the least sizes of the sorts,
+    minimized lexicographically in the order of the list sorts. Solver s
+    must have just returned sat. """
+    m = get_model(s)
+    opt = z3.Optimize()
+    for a in s.assertions():
+        opt.add(a)
+    for sort in sorts:
+        univ = m.get_universe(sort.to_z3())
+        bound = len(univ) if univ is not None else 1
+        for n in range(1,bound):
+            opt.add_soft(formula_to_z3(size_constraint(sort, n)),1,sort.name)
+    apply_limits(opt)
+    if opt.check() != z3.sat:
+        raise inconclusive(opt.reason_unknown())
+    m = opt.model()
+    res = {}
+    for sort in sorts:
+        univ = m.get_universe(sort.to_z3())
+        res[sort] = len(univ) if univ is not None else 1
+    return res
+
+@instrumented
 def get_small_model(clauses, sorts_to_minimize, relations_to_minimize, final_cond=None):
     """
     Return a HerbrandModel with a "small" model of clauses.
@@ -844,35 +2092,57 @@ def get_small_model(clauses, sorts_to_minimize, relations_to_minimize, final_con
 
     Second, minimize the number of positive entries in the relations
     according to the order of relations_to_minimize.
-    """
-    s = z3.Solver()
-    s.add(clauses_to_z3(clauses))
-    
-    res = decide(s)
-    if res == z3.unsat:
-        return None
 
-    if final_cond is not None:
-        s.add(clauses_to_z3(final_cond))
-        res = decide(s)
+    The search for the least sizes is controlled by the parameter
+    "small_model" (see above).
+    """
+    with query_solver(clauses,model=True) as s:
+        res = decide(s,need='model')
         if res == z3.unsat:
             return None
 
-#    print "shrinking model {"
-    for x in chain(sorts_to_minimize, relations_to_minimize):
-        for n in itertools.count(1):
-            s.push()
-            sc = size_constraint(x, n)
-            s.add(formula_to_z3(sc))
-            res = decide(s)
-            if res == z3.sat:
-                break
-            else:
-                s.pop()
-#    print "} shrinking model"
-    m = get_model(s)
-    h = HerbrandModel(s,m,used_symbols_clauses(clauses))
-    return h
+        if final_cond is not None:
+            s.add(clauses_to_z3(final_cond))
+            res = decide(s,need='model')
+            if res == z3.unsat:
+                return None
+
+        search = small_model_search.get()
+        m = None
+#        print "shrinking model {"
+        if search == 'linear':
+            for x in chain(sorts_to_minimize, relations_to_minimize):
+                for n in itertools.count(1):
+                    s.push()
+                    sc = size_constraint(x, n)
+                    s.add(formula_to_z3(sc))
+                    res = decide(s,need='model')
+                    if res == z3.sat:
+                        break
+                    else:
+                        s.pop()
+        else:
+            to_search = list(chain(sorts_to_minimize, relations_to_minimize))
+            if search == 'optimize':
+                sizes = minimize_sorts_optimize(s,list(sorts_to_minimize))
+                for sort in sorts_to_minimize:
+                    s.push()
+                    s.add(formula_to_z3(size_constraint(sort, sizes[sort])))
+                to_search = list(relations_to_minimize)
+            # the model of the last probe has the least sizes
+            for x in to_search:
+                n,m = minimize_size_binary(s,x)
+                s.push()
+                s.add(formula_to_z3(size_constraint(x, n)))
+            if m is None and search == 'optimize':
+                # no probes, and s has no model with the least sizes
+                res = decide(s,need='model')
+                assert res == z3.sat
+#        print "} shrinking model"
+        if m is None:
+            m = get_model(s)
+        h = HerbrandModel(s,m,used_symbols_clauses(clauses))
+        return h
 
 
 def model_universe_facts(h,sort,upclose):
@@ -1011,20 +2281,19 @@ def filter_redundant_facts(clauses,axioms):
     fmlas = clauses.fmlas
     pos_fmlas = [fmla for fmla in fmlas if not isinstance(fmla,ivy_logic.Not)]
     neg_fmlas = [fmla for fmla in fmlas if isinstance(fmla,ivy_logic.Not)]
-    s2 = z3.Solver()
-    alits = [z3.Const("__c%s" % n, z3.BoolSort()) for n,c in enumerate(neg_fmlas)]
-    cc = [z3.Or(z3.Not(a),z3.Not(formula_to_z3(c))) for a,c in zip(alits,neg_fmlas)]
-    s2.add(clauses_to_z3(axioms))
-    for d in clauses.defs:
-        s2.add(formula_to_z3(d.to_constraint()))
-    for fmla in pos_fmlas:
-        s2.add(formula_to_z3(fmla))
-    for c in cc:
-        s2.add(c)
-    keep = []
-    for fmla,alit in zip(neg_fmlas,alits):
-        if decide(s2,[alit]) == z3.sat:
-            keep.append(fmla)
+    with query_solver(axioms) as s2:
+        alits = [z3.Const("__c%s" % n, z3.BoolSort()) for n,c in enumerate(neg_fmlas)]
+        cc = [z3.Or(z3.Not(a),z3.Not(formula_to_z3(c))) for a,c in zip(alits,neg_fmlas)]
+        for d in clauses.defs:
+            s2.add(formula_to_z3(d.to_constraint()))
+        for fmla in pos_fmlas:
+            s2.add(formula_to_z3(fmla))
+        for c in cc:
+            s2.add(c)
+        keep = []
+        for fmla,alit in zip(neg_fmlas,alits):
+            if decide(s2,[alit]) == z3.sat:
+                keep.append(fmla)
 #    print "unsat_core res = {}".format(res)
     return Clauses(pos_fmlas+keep,list(clauses.defs))
 
@@ -1118,7 +2387,7 @@ def function_model_to_clauses(h,f):
     rng = sort.rng
     res = []
     fterm = fun_inst(f)
-    if isinstance(rng,ivy_logic.EnumeratedSort) and not use_z3_enums:
+    if isinstance(rng,ivy_logic.EnumeratedSort) and not native_enum(rng):
         for c in rng.defines():
             eq = ivy_logic._eq_lit(fterm,ivy_logic.Constant(ivy_logic.Symbol(c,rng)))
 #            print "function_model_to_clauses: {}".format(eq)
@@ -1133,11 +2402,10 @@ def function_model_to_clauses(h,f):
 def clauses_imply_formula(clauses1, fmla2):
     """True if clauses1 imply clauses2.
     """
-    s = z3.Solver()
-    s.add(clauses_to_z3(clauses1))
-    s.add(z3.Not(formula_to_z3(fmla2)))
-#    print s.to_smt2()
-    return s.check() == z3.unsat
+    with query_solver(clauses1) as s:
+        s.add(z3.Not(formula_to_z3(fmla2)))
+#        print s.to_smt2()
+        return cached_check(s) == z3.unsat
 
 def ceillog2(n):
     bits,vals = 0,1
@@ -23,8 +23,8 @@ import ivy_utils as iu
 
 
 
-modes = ["abstract","concrete","bounded","induction"]
-default_mode = iu.Parameter("mode","abstract",lambda s: s in modes)
+modes = iu.ui_modes
+default_mode = iu.default_mode
 
 class AnalysisGraphUI(object):
 
@@ -581,7 +581,7 @@ def ui_main_loop(art, tk = None, frame = None):
     ui_create(art,tk,frame)
     ui.tk.mainloop()
 
-default_ui = iu.Parameter("ui",None)
+default_ui = iu.default_ui
 
 compile_kwargs = {}
 
@@ -104,6 +104,49 @@ def list_diff(l1,l2):
     sl2 = set(l2) 
     return [s for s in l1 if s not in sl2]
 
+class LRUCache(object):
+    """ A bounded dictionary that evicts the least recently used
+    entry when full. Counts hits and misses of "get". """
+
+    def __init__(self,maxsize):
+        self.maxsize = maxsize
+        self.data = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self,key,default=None):
+        try:
+            value = self.data.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        self.data[key] = value  # move to the most recently used end
+        self.hits += 1
+        return value
+
+    def __setitem__(self,key,value):
+        if self.maxsize == 0:
+            return
+        if key in self.data:
+            del self.data[key]
+        elif self.maxsize is not None and len(self.data) >= self.maxsize:
+            self.data.popitem(last=False)
+        self.data[key] = value
+
+    def __contains__(self,key):
+        return key in self.data
+
+    def __len__(self):
+        return len(self.data)
+
+    def clear(self):
+        self.data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {'hits':self.hits,'misses':self.misses,'size':len(self.data)}
+
 def distinct_unordered_pairs(l):
     for i in range(len(l)-1):
         for j in range(i+1,len(l)):
@@ -205,10 +248,21 @@ class SourceFile(object):
 filename = None
 
 
+locations = {}
+
 def Location(filename=None,line=None):
-    return LocationTuple([filename,line])
+    """ Locations are interned, so that all the AST nodes on a given
+    line share one LocationTuple """
+    key = (filename,line)
+    res = locations.get(key)
+    if res is None:
+        res = locations[key] = LocationTuple(key)
+    return res
 
 class LocationTuple(tuple):
+    __slots__ = ()
+    def __reduce__(self):
+        return (Location,tuple(self))
     @property
     def filename(self):
         return self[0]
@@ -507,6 +561,12 @@ polymorphic_symbols = set(
 
 use_numerals = BooleanParameter("use_numerals",True)
 use_new_ui = BooleanParameter("new_ui",False)
+
+# These belong to ivy_ui, but are defined here so that they can be set
+# on the command line without loading the UI.
+ui_modes = ["abstract","concrete","bounded","induction"]
+default_mode = Parameter("mode","abstract",lambda s: s in ui_modes)
+default_ui = Parameter("ui",None)
 catch = BooleanParameter("catch",True)
 
 
@@ -7,7 +7,7 @@
 from operator import itemgetter
 
 from general import IvyError
-from utils.recstruct_object import recstruct
+from utils.recstruct_object import recstruct, set_hash_consing, hash_consing_size
 
 # Exceptions
 
@@ -107,8 +107,13 @@ def is_polymorphic(x):
 
 # Terms
 
-class Var(recstruct('Var', ['name', 'sort'], [])):
-    __slots__ = ()
+# Slots of the term classes in which ivy_logic_utils caches the sets
+# of free variables, constants and symbols of a term. Terms are
+# immutable, so these are computed at most once per term.
+term_cache_slots = ('_vars', '_consts', '_syms')
+
+class Var(recstruct('Var', ['name', 'sort'], [], hash_cons=True)):
+    __slots__ = term_cache_slots
     @classmethod
     def _preprocess_(cls, name, sort):
         if name and not name[0].isupper():
@@ -120,8 +125,8 @@ class Var(recstruct('Var', ['name', 'sort'], [])):
         return Apply(self, *terms)
 
 
-class Const(recstruct('Const', ['name', 'sort'], [])):
-    __slots__ = ()
+class Const(recstruct('Const', ['name', 'sort'], [], hash_cons=True)):
+    __slots__ = term_cache_slots
     @classmethod
     def _preprocess_(cls, name, sort):
 #        if not name or name[0].isupper():
@@ -133,8 +138,8 @@ class Const(recstruct('Const', ['name', 'sort'], [])):
         return Apply(self, *terms)
 
 
-class Apply(recstruct('Apply', [], ['func', '*terms'])):
-    __slots__ = ()
+class Apply(recstruct('Apply', [], ['func', '*terms'], hash_cons=True)):
+    __slots__ = term_cache_slots
 
     @classmethod
     def _preprocess_(cls, func, *terms):
@@ -172,8 +177,8 @@ class Apply(recstruct('Apply', [], ['func', '*terms'])):
                     self.func.sort.range)
 
 
-class Eq(recstruct('Eq', [], ['t1', 't2'])):
-    __slots__ = ()
+class Eq(recstruct('Eq', [], ['t1', 't2'], hash_cons=True)):
+    __slots__ = term_cache_slots
     sort = Boolean
     @classmethod
     def _preprocess_(cls, t1, t2):
@@ -188,8 +193,8 @@ class Eq(recstruct('Eq', [], ['t1', 't2'])):
         return '({} == {})'.format(self.t1, self.t2)
 
 
-class Ite(recstruct('Ite', [], ['cond', 't_then', 't_else'])):
-    __slots__ = ()
+class Ite(recstruct('Ite', [], ['cond', 't_then', 't_else'], hash_cons=True)):
+    __slots__ = term_cache_slots
     @classmethod
     def _preprocess_(cls, cond, t_then, t_else):
         if cond.sort not in (Boolean, TopS):
@@ -207,8 +212,8 @@ class Ite(recstruct('Ite', [], ['cond', 't_then', 't_else'])):
     sort = property(lambda self: self.t_then.sort if self.t_then.sort != TopS else self.t_else.sort)
 
 
-class Not(recstruct('Not', [], ['body'])):
-    __slots__ = ()
+class Not(recstruct('Not', [], ['body'], hash_cons=True)):
+    __slots__ = term_cache_slots
     sort = Boolean
     @classmethod
     def _preprocess_(cls, body):
@@ -222,8 +227,8 @@ class Not(recstruct('Not', [], ['body'])):
             return 'Not({})'.format(self.body)
 
 
-class And(recstruct('And', [], ['*terms'])):
-    __slots__ = ()
+class And(recstruct('And', [], ['*terms'], hash_cons=True)):
+    __slots__ = term_cache_slots
     sort = Boolean
     @classmethod
     def _preprocess_(cls, *terms):
@@ -241,8 +246,8 @@ class And(recstruct('And', [], ['*terms'])):
         )
 
 
-class Or(recstruct('Or', [], ['*terms'])):
-    __slots__ = ()
+class Or(recstruct('Or', [], ['*terms'], hash_cons=True)):
+    __slots__ = term_cache_slots
     sort = Boolean
     @classmethod
     def _preprocess_(cls, *terms):
@@ -260,8 +265,8 @@ class Or(recstruct('Or', [], ['*terms'])):
         )
 
 
-class Implies(recstruct('Implies', [], ['t1', 't2'])):
-    __slots__ = ()
+class Implies(recstruct('Implies', [], ['t1', 't2'], hash_cons=True)):
+    __slots__ = term_cache_slots
     sort = Boolean
     @classmethod
     def _preprocess_(cls, t1, t2):
@@ -276,8 +281,8 @@ class Implies(recstruct('Implies', [], ['t1', 't2'])):
         return 'Implies({}, {})'.format(self.t1, self.t2)
 
 
-class Iff(recstruct('Iff', [], ['t1', 't2'])):
-    __slots__ = ()
+class Iff(recstruct('Iff', [], ['t1', 't2'], hash_cons=True)):
+    __slots__ = term_cache_slots
     sort = Boolean
     @classmethod
     def _preprocess_(cls, t1, t2):
@@ -292,8 +297,8 @@ class Iff(recstruct('Iff', [], ['t1', 't2'])):
         return 'Iff({}, {})'.format(self.t1, self.t2)
 
 
-class ForAll(recstruct('ForAll', ['variables'], ['body'])):
-    __slots__ = ()
+class ForAll(recstruct('ForAll', ['variables'], ['body'], hash_cons=True)):
+    __slots__ = term_cache_slots
     sort = Boolean
     @classmethod
     def _preprocess_(cls, variables, body):
@@ -308,8 +313,8 @@ class ForAll(recstruct('ForAll', ['variables'], ['body'])):
             self.body)
 
 
-class Exists(recstruct('Exists', ['variables'], ['body'])):
-    __slots__ = ()
+class Exists(recstruct('Exists', ['variables'], ['body'], hash_cons=True)):
+    __slots__ = term_cache_slots
     sort = Boolean
     @classmethod
     def _preprocess_(cls, variables, body):
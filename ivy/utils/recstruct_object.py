@@ -15,7 +15,17 @@ Iterating over a recstruct iterates only over its sub-structures.
 
 Subclasses of recstruct's can set __slots__ = () to save memory.
 
-Hash-consing can be added later as an option.
+A recstruct created with hash_cons=True caches its hash, and while
+hash-consing is enabled with set_hash_consing(True), constructing it
+returns the existing object if an equal one is alive. Interned
+objects are kept in a table keyed by the type, the meta fields and
+the identities of the hash-consed sub-structures, so equal
+structures built from interned parts are found without walking them,
+and they compare equal by identity. The table holds strong
+references, so that the objects need no __weakref__ slot, and is
+swept of the objects only it refers to as it grows (see _sweep).
+Apart from the cached hash, hash-consing costs nothing per object
+while it is disabled.
 
 """
 
@@ -31,13 +41,69 @@ def _itemgetter(x):
     return lambda self: self._tup.__getitem__(x)
 
 
+_interned = {}
+_hash_consing = [False]
+_min_sweep_size = 1 << 14
+_sweep_size = [_min_sweep_size] # table size at which to sweep next
+
+def set_hash_consing(on):
+    """
+    Enable or disable hash-consing of the recstruct's created with
+    hash_cons=True. Objects created while it is disabled are not
+    interned, but still compare equal to interned ones.
+    """
+    _hash_consing[0] = on
+    if not on:
+        _interned.clear()
+        _sweep_size[0] = _min_sweep_size
+
+def hash_consing_size():
+    """
+    Return the number of live interned objects.
+    """
+    _sweep()
+    return len(_interned)
+
+def _sweep():
+    """
+    Drop the interned objects that only the table refers to. Dropping
+    an object can free its sub-structures, so repeat until none is
+    dropped.
+    """
+    while True:
+        # the references are the table and the argument of getrefcount
+        dead = [k for k in _interned.keys() if _sys.getrefcount(_interned[k]) <= 2]
+        if not dead:
+            break
+        for k in dead:
+            del _interned[k]
+    _sweep_size[0] = max(_min_sweep_size, 2 * len(_interned))
+
+def _make(cls, tup):
+    if _hash_consing[0]:
+        key = (cls,) + tuple(id(x) if getattr(type(x), '_hash_consed', False) else x
+                             for x in tup)
+        self = _interned.get(key)
+        if self is None:
+            if len(_interned) >= _sweep_size[0]:
+                _sweep()
+            self = object.__new__(cls)
+            self._tup = tup
+            _interned[key] = self
+        return self
+    self = object.__new__(cls)
+    self._tup = tup
+    return self
+
+
 _class_template = '''\
 class {typename}(object):
 
-    __slots__ = ('_tup')
+    __slots__ = {slots!r}
 
     _meta_fields = {meta_field_names!r}
     _sub_fields = {sub_field_names!r}
+    _hash_consed = {hash_cons!r}
 
     @classmethod
     def _preprocess_(self, *args):
@@ -52,16 +118,12 @@ class {typename}(object):
         """
         return args
 
-    def __init__(self, {meta_arg_list_with_defaults}{sub_arg_list}):
-        self._tup = tuple(type(self)._preprocess_({meta_arg_list}{sub_arg_list}))
-
+{construct_defs}
     def __repr__(self):
         """Return a nicely formatted representation string"""
         return type(self).__name__ + repr(self._tup)
 
-    def __eq__(self, other):
-        return type(self) is type(other) and (self._tup) == (other._tup)
-
+{eq_hash_defs}
     def __ne__(self, other):
         return not self.__eq__(other)
 
@@ -77,10 +139,6 @@ class {typename}(object):
     def __ge__(self, other):
         return (({typename},) + self._tup) >= other
 
-    def __hash__(self):
-        #return hash((type(self), ) + self._tup)
-        return self._tup.__hash__()
-
     def _subs(self):
         return self._tup[{n_meta}:]
 
@@ -111,6 +169,46 @@ class {typename}(object):
 {field_defs}
 '''
 
+_init_template = '''\
+    def __init__(self, {meta_arg_list_with_defaults}{sub_arg_list}):
+        self._tup = tuple(type(self)._preprocess_({meta_arg_list}{sub_arg_list}))
+'''
+
+_eq_hash_template = '''\
+    def __eq__(self, other):
+        return type(self) is type(other) and (self._tup) == (other._tup)
+
+    def __hash__(self):
+        #return hash((type(self), ) + self._tup)
+        return self._tup.__hash__()
+'''
+
+_hash_cons_new_template = '''\
+    def __new__(cls, {meta_arg_list_with_defaults}{sub_arg_list}):
+        return _make(cls, tuple(cls._preprocess_({meta_arg_list}{sub_arg_list})))
+
+    def __init__(self, *args):
+        pass
+
+    def __reduce__(self):
+        return (_make, (type(self), self._tup))
+'''
+
+_hash_cons_eq_hash_template = '''\
+    def __eq__(self, other):
+        if self is other:
+            return True
+        return (type(self) is type(other) and self.__hash__() == other.__hash__()
+                and (self._tup) == (other._tup))
+
+    def __hash__(self):
+        try:
+            return self._hash
+        except AttributeError:
+            self._hash = self._tup.__hash__()
+            return self._hash
+'''
+
 _meta_field_template = '''\
     {name} = _property(_itemgetter({index}))
 '''
@@ -129,9 +227,11 @@ def _preprocess_names(names):
     return [str(x) for x in names]
 
 
-def recstruct(typename, meta_field_names, sub_field_names, verbose=False):
+def recstruct(typename, meta_field_names, sub_field_names, verbose=False, hash_cons=False):
     """
-    Returns a new recstruct class with the requested fields.
+    Returns a new recstruct class with the requested fields. If
+    hash_cons is true, the class caches its hash and can be
+    hash-consed (see set_hash_consing).
     """
 
     # Validate the field names.
@@ -179,8 +279,25 @@ def recstruct(typename, meta_field_names, sub_field_names, verbose=False):
          for index, name in enumerate(sub_field_names)
          if name[0] == '*']
      )
+    args = dict(
+        meta_arg_list=meta_arg_list,
+        meta_arg_list_with_defaults=meta_arg_list_with_defaults,
+        sub_arg_list=sub_arg_list,
+    )
+    if hash_cons:
+        construct_defs = _hash_cons_new_template.format(**args)
+        eq_hash_defs = _hash_cons_eq_hash_template
+        slots = ('_tup', '_hash')
+    else:
+        construct_defs = _init_template.format(**args)
+        eq_hash_defs = _eq_hash_template
+        slots = ('_tup',)
     class_definition = _class_template.format(
         typename=typename,
+        slots=slots,
+        hash_cons=hash_cons,
+        construct_defs=construct_defs,
+        eq_hash_defs=eq_hash_defs,
         meta_field_names=meta_field_names,
         sub_field_names=sub_field_names,
         n_meta=n_meta,
@@ -203,6 +320,7 @@ def recstruct(typename, meta_field_names, sub_field_names, verbose=False):
         _itemgetter=_itemgetter,
         _property=property,
         _init=_init,
+        _make=_make,
     )
     try:
         exec class_definition in namespace
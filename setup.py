@@ -1,4 +1,18 @@
 from setuptools import setup, find_packages
+from setuptools.command.build_py import build_py
+
+class build_py_with_parsers(build_py):
+    """ Generate the parser tables for every language version before
+    copying the package, so they are installed with it rather than
+    built on first use (see ivy_parser.build_parsers). """
+    def run(self):
+        try:
+            from ivy import ivy_parser
+        except ImportError as e:
+            print 'not generating parser tables: {}'.format(e)
+        else:
+            ivy_parser.build_parsers()
+        build_py.run(self)
 
 setup(name='ms_ivy',
       version='0.1',
@@ -15,7 +29,8 @@ setup(name='ms_ivy',
           'tarjan'
       ],
       entry_points = {
-        'console_scripts': ['ivy=ivy.ivy:main','ivy_check=ivy.ivy_check:main','ivy_to_cpp=ivy.ivy_to_cpp:main','ivy_show=ivy.ivy_show:main',],
+        'console_scripts': ['ivy=ivy.ivy:main','ivy_check=ivy.ivy_check:main','ivy_to_cpp=ivy.ivy_to_cpp:main','ivy_show=ivy.ivy_show:main','ivy_replay=ivy.ivy_replay:main',],
         },
+      cmdclass={'build_py':build_py_with_parsers},
       zip_safe=False)
 
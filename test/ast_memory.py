@@ -0,0 +1,112 @@
+#
+# Copyright (c) Microsoft Corporation. All Rights Reserved.
+#
+"""
+Report the number of AST nodes created by parsing ivy files, the
+resident memory they take and the peak resident memory of the
+process, one process per file. With "baseline=<rev>", the same is
+reported for the ivy package of git revision <rev>, for comparison.
+By default, the files are doc/examples/sht/sht.ivy and
+examples/tilelink/tilelink_concrete_spec.ivy. Resident memory is read
+from /proc, so this works on Linux only.
+
+AST nodes have no instance dictionary, so no node may be larger than
+an object with six pointer slots, the most any node class declares
+(a CallAction). This is checked for the current tree only.
+
+usage: python ast_memory.py [baseline=<rev>] [file.ivy ...]
+"""
+
+import sys
+import os
+import gc
+import resource
+import shutil
+import subprocess
+import tempfile
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)),'..')
+default_files = [os.path.join(root,'doc','examples','sht','sht.ivy'),
+                 os.path.join(root,'examples','tilelink','tilelink_concrete_spec.ivy')]
+
+def rss():
+    """ resident set size of this process in KB """
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+
+def peak_rss():
+    """ peak resident set size of this process in KB """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+class WidestNode(object):
+    """ the slots of CallAction, the widest AST node """
+    __slots__ = ('args','lineno','label','formal_params','formal_returns','unique_id')
+
+max_node_size = sys.getsizeof(WidestNode())
+
+def node_size(x):
+    """ bytes taken by AST node x itself, including its instance
+    dictionary if it has one """
+    d = getattr(x,'__dict__',None)
+    return sys.getsizeof(x) + (sys.getsizeof(d) if d is not None else 0)
+
+def parse_file(fn):
+    """ Parse fn and print the node count, the resident memory used by
+    parsing and the peak resident memory before and after parsing """
+    from ivy import ivy_ast
+    from ivy import ivy_compiler
+    from ivy import ivy_utils as iu
+    os.chdir(os.path.dirname(os.path.abspath(fn)))
+    fn = os.path.basename(fn)
+    gc.collect()
+    start,start_peak = rss(),peak_rss()
+    with iu.SourceFile(fn):
+        with open(fn) as f:
+            decls = ivy_compiler.read_module(f)
+    gc.collect()
+    nodes = [x for x in gc.get_objects() if isinstance(x,ivy_ast.AST)]
+    print len(nodes),rss() - start,start_peak,peak_rss(),max(node_size(x) for x in nodes)
+
+def measure(fn,path=None):
+    """ Run parse_file in a child process, with the ivy package in
+    directory path if given. Returns the numbers it prints. """
+    env = dict(os.environ)
+    if path is not None:
+        env['PYTHONPATH'] = os.pathsep.join([path] + [p for p in [env.get('PYTHONPATH')] if p])
+    out = subprocess.check_output([sys.executable,os.path.abspath(__file__),'--one',fn],env=env)
+    return [int(x) for x in out.split('\n')[-2].split()]
+
+def checkout(rev):
+    """ Extract the ivy package of git revision rev to a temporary directory """
+    path = tempfile.mkdtemp()
+    archive = subprocess.Popen(['git','archive',rev,'ivy'],cwd=root,stdout=subprocess.PIPE)
+    subprocess.check_call(['tar','-x','-C',path],stdin=archive.stdout)
+    if archive.wait() != 0:
+        raise RuntimeError('cannot extract revision {}'.format(rev))
+    return path
+
+def report(name,nums):
+    nodes,used,start_peak,peak,largest = nums
+    return '{}: {} nodes, {} KB resident after parsing, peak RSS {} KB ({:+d} KB while parsing), largest node {} bytes'.format(
+        name,nodes,used,peak,peak - start_peak,largest)
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == '--one':
+        parse_file(sys.argv[2])
+        sys.exit(0)
+    args = sys.argv[1:]
+    baseline = dict(a.split('=',1) for a in args if '=' in a).get('baseline')
+    files = [a for a in args if '=' not in a] or default_files
+    path = checkout(baseline) if baseline else None
+    try:
+        for fn in files:
+            nums = measure(fn)
+            print report(os.path.basename(fn),nums)
+            assert nums[-1] <= max_node_size, 'AST node of {} bytes, more than {}'.format(nums[-1],max_node_size)
+            if path is not None:
+                print report('  ' + baseline,measure(fn,path))
+    finally:
+        if path is not None:
+            shutil.rmtree(path)
@@ -0,0 +1,30 @@
+#
+# Copyright (c) Microsoft Corporation. All Rights Reserved.
+#
+"""
+Check that biased_core avoids the "unlikely" literals with both core
+minimizers. Here ~p is unsatisfiable with either {a,b} or {u}, and u
+is unlikely, so the core must be {a,b}.
+"""
+
+import z3
+from ivy import ivy_core
+from ivy import ivy_utils as iu
+
+p,a,b,u = z3.Bools('p a b u')
+la,lb,lu = z3.Bools('la lb lu')
+
+def core_names(minimizer):
+    s = z3.Solver()
+    s.add(z3.Not(p))
+    s.add(z3.Implies(z3.And(la,a,lb,b),p))
+    s.add(z3.Implies(z3.And(lu,u),p))
+    s.add(a,b,u)
+    with iu.parameterize({'core_minimizer':minimizer}):
+        core = ivy_core.biased_core(s,[lu,la,lb],[lu])
+    return sorted(str(c) for c in core)
+
+for minimizer in ['deletion','quickxplain']:
+    res = core_names(minimizer)
+    assert res == ['la','lb'], (minimizer,res)
+print "OK"
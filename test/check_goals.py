@@ -0,0 +1,58 @@
+#
+# Copyright (c) Microsoft Corporation. All Rights Reserved.
+#
+"""
+Check that the batched goal check (check_goals) tells which goals are
+implied the same way as clauses_imply_list: when one model refutes
+several goals, when the batched check is inconclusive and each goal is
+checked alone, and in ground mode.
+"""
+
+import z3
+from ivy import ivy_logic as il
+from ivy import ivy_logic_utils as lu
+from ivy import ivy_solver as slv
+from ivy import ivy_utils as iu
+
+t = il.UninterpretedSort('t')
+a,b = [il.Symbol(n,t) for n in 'ab']
+r,q = [il.Symbol(n,il.RelationSort([t])) for n in 'rq']
+X = il.Variable('X',t)
+
+premises = lu.formula_to_clauses(il.And(il.ForAll([X],il.Implies(r(X),q(X))),
+                                        r(a),il.Not(q(b))))
+goals = [lu.formula_to_clauses(f) for f in
+         [q(a), q(b), r(b), il.ForAll([X],q(X)), il.Not(il.Equals(a,b)),
+          il.ForAll([X],il.Implies(r(X),q(X))), il.Exists([X],r(X))]]
+expected = [True,False,False,False,True,True,True]
+assert slv.clauses_imply_list(premises,goals) == expected
+
+checks = []
+real_cached_check = slv.cached_check
+def cached_check(s,atoms=None,need=None):
+    checks.append(need)
+    return real_cached_check(s,atoms,need)
+def inconclusive_check(s,atoms=None,need=None):
+    checks.append(need)
+    if need == 'model':
+        return z3.unknown
+    return real_cached_check(s,atoms,need)
+
+for ground in ['false','true']:
+    iu.set_parameters({'ground':ground})
+    grounded = slv.ground_stats['ground']
+
+    # the first model refutes both ground goals that fail
+    slv.cached_check,checks[:] = cached_check,[]
+    assert slv.check_goals(premises,goals) == expected,ground
+    assert len(checks) <= 3,checks
+
+    # each goal is checked alone if the batched check is inconclusive
+    slv.cached_check,checks[:] = inconclusive_check,[]
+    assert slv.check_goals(premises,goals) == expected,ground
+    assert checks == ['model'] + [None] * len(goals),checks
+    slv.cached_check = real_cached_check
+
+    assert (slv.ground_stats['ground'] > grounded) == (ground == 'true')
+iu.set_parameters({'ground':'false'})
+print "OK"
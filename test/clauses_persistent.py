@@ -0,0 +1,61 @@
+#
+# Copyright (c) Microsoft Corporation. All Rights Reserved.
+#
+"""
+Check that the persistent Clauses (and_clauses, copy, defidx) agree
+with Clauses built from plain lists, that elim_definitions doesn't
+modify its argument, and that assigning fmlas or defs replaces the
+cached lists, index and encoding.
+"""
+
+from ivy import ivy_logic as lg
+from ivy import ivy_logic_utils as lu
+
+S = lg.UninterpretedSort('S')
+r = lg.Symbol('r',lg.FunctionSort(S,lg.BooleanSort()))
+consts = [lg.Symbol('c{}'.format(i),S) for i in range(12)]
+skolems = [lg.Symbol('__s{}'.format(i),S) for i in range(12)]
+
+def make(i):
+    """ A Clauses with two formulas and a definition """
+    c,sk = consts[i],skolems[i]
+    return lu.Clauses([r(c),lg.Not(lg.Equals(c,sk))],[lg.Definition(sk,c)])
+
+def by_lists(args):
+    """ The conjunction of args, built from lists """
+    return lu.Clauses([f for a in args for f in a.fmlas],[d for a in args for d in a.defs])
+
+parts = [make(i) for i in range(12)]
+# left and right nested conjunctions, which merge chunks differently
+left = parts[0]
+for p in parts[1:]:
+    left = lu.and_clauses(left,p)
+right = parts[-1]
+for p in reversed(parts[:-1]):
+    right = lu.and_clauses(p,right)
+for res in [left,right,lu.and_clauses(*parts),left.copy()]:
+    assert res == by_lists(parts)
+    assert sorted(res.defidx.keys()) == sorted(skolems)
+    assert all(res.defidx[sk] is parts[i].defs[0] for i,sk in enumerate(skolems))
+    assert str(res.to_formula()) == str(by_lists(parts).to_formula())
+assert all(p.fmlas == make(i).fmlas and len(p.defs) == 1 for i,p in enumerate(parts))
+
+# elim_definitions returns new lists
+fmlas = list(left.fmlas)
+res = lu.elim_definitions(left,skolems[:2])
+assert left.fmlas == fmlas and len(left.defs) == 12
+assert len(res.fmlas) == 26 and len(res.defs) == 10
+assert skolems[0] not in res.defidx and skolems[2] in res.defidx
+
+# assigning replaces the cached values
+cls = lu.and_clauses(parts[0],parts[1])
+cls.fmlas, cls.defs, cls.defidx, cls.clauses
+cls.fmlas = [lg.Or()]
+assert cls.fmlas == [lg.Or()] and cls.is_false()
+dfn = lg.Definition(skolems[5],consts[0])
+cls.defs = [dfn]
+assert cls.defidx.keys() == [skolems[5]] and cls.defs == [dfn]
+assert cls == lu.Clauses([lg.Or()],[dfn])
+assert str(cls.clauses) == str(lu.Clauses([lg.Or()],[dfn]).clauses)
+assert all(p.fmlas == make(i).fmlas and len(p.defs) == 1 for i,p in enumerate(parts[:2]))
+print "OK"
@@ -0,0 +1,74 @@
+#
+# Copyright (c) Microsoft Corporation. All Rights Reserved.
+#
+"""
+Check that ivy_check gives the same result on each of a list of files
+with each encoding of enumerated sorts (enum_encoding=bits, native
+and auto), and report the times. Each run is in a fresh process. For
+each mode, the solver time (from stats_file) and the total time of
+the run with the least solver time out of "repeat" runs are reported.
+By default, the files are small examples with enumerated sorts and
+each is checked once, so this is a quick smoke check. To compare the
+encodings, pass larger files, e.g. the tilelink examples or
+examples/ivy/flash.ivy, and "repeat=3". Other parameters are passed
+to ivy_check, e.g. "solver_timeout=60000".
+
+usage: python enum_encoding_time.py [repeat=n] [name=value ...] [file.ivy ...]
+"""
+
+import sys
+import os
+import json
+import subprocess
+import tempfile
+import time
+
+modes = ['bits','native','auto']
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)),'..')
+default_files = [os.path.join(root,'doc','examples','pingpong.ivy'),
+                 os.path.join(root,'examples','tilelink','tilelink1.ivy')]
+
+def check_time(fname,params):
+    """ Run ivy_check on fname. Return the solver time, the total time
+    and the last line of output. """
+    fd,stats = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    cmd = [sys.executable,'-m','ivy.ivy_check','stats_file='+stats] + params + [os.path.basename(fname)]
+    try:
+        start = time.time()
+        proc = subprocess.Popen(cmd,stdout=subprocess.PIPE,stderr=subprocess.STDOUT,
+                                cwd=os.path.dirname(os.path.abspath(fname)))
+        out = proc.communicate()[0]
+        elapsed = time.time() - start
+        try:
+            with open(stats) as f:
+                solver = json.load(f)['total_time']
+        except ValueError:
+            solver = 0.0
+    finally:
+        os.remove(stats)
+    lines = out.strip().split('\n')
+    return solver,elapsed,lines[-1]
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    params = [a for a in args if '=' in a and not a.startswith('repeat=')]
+    repeat = int(dict(a.split('=',1) for a in args if a.startswith('repeat=')).get('repeat','1'))
+    files = [a for a in args if '=' not in a] or default_files
+    totals = dict((m,[0.0,0.0]) for m in modes)
+    differ = []
+    for fname in files:
+        cols = []
+        results = set()
+        for mode in modes:
+            solver,elapsed,res = min(check_time(fname,params + ['enum_encoding='+mode]) for i in range(repeat))
+            totals[mode][0] += solver
+            totals[mode][1] += elapsed
+            results.add(res)
+            cols.append('{} {:.2f}/{:.2f}s ({})'.format(mode,solver,elapsed,res))
+        print '{:32} {}'.format(os.path.basename(fname),'  '.join(cols))
+        if len(results) > 1:
+            differ.append(fname)
+    print '{:32} {}'.format('total (solver/all)','  '.join('{} {:.2f}/{:.2f}s'.format(m,totals[m][0],totals[m][1]) for m in modes))
+    assert not differ,'the encodings give different results on {}'.format(', '.join(differ))
@@ -0,0 +1,61 @@
+from ivy import ivy_module as im
+from ivy.ivy_compiler import ivy_from_string
+from ivy import ivy_utils as iu
+from ivy import ivy_check as ick
+from ivy import ivy_logic as lg
+from ivy import ivy_solver as slv
+
+# Each encoding of enumerated sorts should give the same verdicts. With
+# the native encoding, the elements must be the datatype constructors,
+# which are distinct. With enum_encoding=auto, a sort that is a function
+# range is bit-blasted, and so is a two-element sort of constants, but
+# a larger sort of constants is native.
+
+prog = """#lang ivy1.6
+
+type node
+type st = {s0,s1,s2,bad}
+function state(N:node) : st
+relation link(N:node,M:node)
+init state(N) = s0
+
+action step(n:node,m:node) = {
+    assume link(n,m);
+    if state(n) = s0 { state(m) := s1 } else
+    if state(n) = s1 { state(m) := s2 } else
+    if state(n) = s2 { state(m) := s0 } else
+    { state(m) := bad }
+}
+export step
+
+conjecture state(N) ~= %s
+"""
+
+for encoding in ['bits','native','auto']:
+    for elem,expected in [('bad',None),('s1','error: Consecution failed.')]:
+        with im.Module():
+            iu.set_parameters({'mode':'induction','enum_encoding':encoding})
+            ivy_from_string(prog % elem,create_isolate=False)
+            try:
+                ick.check_module()
+                res = None
+            except iu.IvyError as e:
+                res = str(e)
+            assert res == expected,(encoding,elem,res)
+
+with im.Module():
+    iu.set_parameters({'enum_encoding':'auto'})
+    ivy_from_string("""#lang ivy1.6
+type node
+type st = {s0,s1,s2}
+type mode = {m0,m1,m2,m3}
+type flag = {on,off}
+function state(N:node) : st
+individual cur : mode
+individual prev : mode
+individual fl : flag
+""",create_isolate=False)
+    encodings = dict((name,slv.native_enum(lg.find_sort(name))) for name in ['st','mode','flag'])
+    assert encodings == {'st':False,'mode':True,'flag':False},encodings
+iu.set_parameters({'enum_encoding':'bits'})
+print 'OK'
@@ -0,0 +1,65 @@
+#
+# Copyright (c) Microsoft Corporation. All Rights Reserved.
+#
+"""
+Check that EPR grounding (ground=true) gives the same verdicts as the
+solver, and that it handles formulas nested too deeply for a recursive
+walk.
+"""
+
+import z3
+from ivy import ivy_module as im
+from ivy.ivy_compiler import ivy_from_string
+from ivy import ivy_utils as iu
+from ivy import ivy_check as ick
+from ivy import ivy_solver as slv
+
+prog = """#lang ivy1.6
+
+type node
+relation token(N:node)
+relation link(N:node,M:node)
+individual root : node
+init token(N) <-> N = root
+
+action pass(n:node,m:node) = {
+    assume token(n) & link(n,m);
+    token(n) := false;
+    token(m) := true
+}
+export pass
+
+conjecture token(N) & token(M) -> N = M
+%s
+"""
+
+for extra,expected in [('',None),('conjecture token(root)','error: Consecution failed.')]:
+    for ground in ['false','true']:
+        grounded = slv.ground_stats['ground']
+        with im.Module():
+            iu.set_parameters({'mode':'induction','ground':ground})
+            ivy_from_string(prog % extra,create_isolate=False)
+            try:
+                ick.check_module()
+                res = None
+            except iu.IvyError as e:
+                res = str(e)
+        assert res == expected,(ground,extra,res)
+        assert (slv.ground_stats['ground'] > grounded) == (ground == 'true')
+iu.set_parameters({'ground':'false'})
+
+# a quantifier under a deep nest of disjunctions
+T = z3.DeclareSort('T')
+r = z3.Function('r',T,z3.BoolSort())
+a = z3.Const('a',T)
+x = z3.Const('x',T)
+fmla = z3.ForAll([x],r(x))
+for i in range(5000):
+    fmla = z3.Or(z3.Bool('p{}'.format(i)),fmla)
+s = slv.new_solver()
+s.add(fmla,z3.Not(r(a)))
+for i in range(5000):
+    s.add(z3.Not(z3.Bool('p{}'.format(i))))
+assert slv.ground_query(s) is not None
+assert slv.ground_check(s) == s.check() == z3.unsat
+print 'OK'
@@ -0,0 +1,55 @@
+#
+# Copyright (c) Microsoft Corporation. All Rights Reserved.
+#
+"""
+Check that with hash_cons=true equal terms are one object, that
+equality and hashing agree between interned terms and terms built
+with hash-consing off, and that terms no longer used are dropped from
+the table.
+"""
+
+import pickle
+import gc
+from ivy import logic as lg
+from ivy import ivy_logic
+from ivy import ivy_utils as iu
+
+S = lg.UninterpretedSort('S')
+B = lg.Boolean
+
+def build(i):
+    x,y = lg.Var('X',S),lg.Var('Y',S)
+    c = lg.Const('c{}'.format(i),S)
+    r = lg.Const('r',lg.FunctionSort(S,S,B))
+    return lg.ForAll((x,),lg.Or(lg.Apply(r,x,c),lg.Not(lg.Eq(x,y)),lg.Apply(r,c,y)))
+
+plain = build(0)
+assert build(0) is not plain and 'weakref' not in repr(type(plain).__slots__)
+
+iu.set_parameters({'hash_cons':'true'})
+t = build(0)
+assert build(0) is t
+assert t.body is build(0).body and lg.Const('c0',S) is lg.Const('c0',S)
+assert all(v is lg.Var('X',S) for v in t.variables)
+assert pickle.loads(pickle.dumps(t,2)) is t
+# equal to, and hashed like, the term built with hash-consing off
+assert t == plain and plain == t and hash(t) == hash(plain)
+assert build(1) != t and not (build(1) == plain)
+d = {plain:0}
+assert d[t] == 0 and len(set([t,plain,build(0)])) == 1
+
+# terms built from a term built with hash-consing off are interned too
+assert lg.Not(plain) is lg.Not(plain) and lg.Not(plain) == lg.Not(t)
+
+# unused terms are dropped
+base = lg.hash_consing_size()
+terms = [build(i) for i in range(2,1000)]
+assert lg.hash_consing_size() > base
+del terms
+gc.collect()
+assert lg.hash_consing_size() <= base,(lg.hash_consing_size(),base)
+assert build(0) is t
+
+iu.set_parameters({'hash_cons':'false'})
+assert lg.hash_consing_size() == 0 and build(0) is not t and build(0) == t
+print "OK"
@@ -0,0 +1,62 @@
+#
+# Copyright (c) Microsoft Corporation. All Rights Reserved.
+#
+"""
+Check that HerbrandModel.check gives the same tables when it reads
+relation and function tables from the model (check_interp) as when
+it evaluates every tuple.
+"""
+
+from ivy import ivy_logic as il
+from ivy import ivy_logic_utils as lu
+from ivy import ivy_solver as slv
+from ivy import ivy_utils as iu
+
+t,u = il.UninterpretedSort('t'),il.UninterpretedSort('u')
+a,b,c = [il.Symbol(n,t) for n in 'abc']
+e = il.Symbol('e',u)
+r = il.Symbol('r',il.RelationSort([t,t]))
+q = il.Symbol('q',il.RelationSort([t]))
+s = il.Symbol('s',il.RelationSort([u]))
+w = il.Symbol('w',il.RelationSort([u,t]))
+f = il.Symbol('f',il.FunctionSort(t,t))
+g = il.Symbol('g',il.FunctionSort(t,u,t))
+h = il.Symbol('h',il.FunctionSort(t,u))
+X,Y,Z = [il.Variable(n,t) for n in 'XYZ']
+V = il.Variable('V',u)
+
+# t has three elements and u has one
+fmla = il.And(il.Not(il.Equals(a,b)),il.Not(il.Equals(a,c)),il.Not(il.Equals(b,c)),
+              il.Equals(V,e),r(a,b),il.Not(r(b,a)),r(c,c),il.Not(q(a)),
+              il.Equals(f(a),b),il.Equals(f(b),b),il.Not(il.Equals(f(c),a)),
+              il.Equals(g(a,e),c),il.Not(s(e)),w(e,b))
+clauses = lu.formula_to_clauses(fmla)
+model = slv.get_small_model(clauses,[t,u],[])
+assert len(model.sort_universe(t)) == 3 and len(model.sort_universe(u)) == 1
+
+atoms = [r(X,Y),r(Y,X),r(X,X),q(X),s(V),w(V,X),
+         il.Equals(f(X),Y),il.Equals(f(X),X),il.Equals(g(X,V),Y),il.Equals(h(X),V)]
+fast = []
+def check_interp(lit,vs,ranges):
+    res = slv.HerbrandModel.check_interp(model,lit,vs,ranges)
+    if res is not None:
+        fast.append(lit)
+    return res
+def table(vs_insts):
+    vs,insts = vs_insts
+    return sorted(tuple(str(x) for x in row) for row in insts),vs
+
+for atom in atoms:
+    for lit in [il.Literal(1,atom),il.Literal(0,atom)]:
+        model.check_interp = check_interp
+        res = table(model.check(lit))
+        model.check_interp = lambda lit,vs,ranges: None
+        expected = table(model.check(lit))
+        assert res == expected,(str(lit),res,expected)
+
+# every literal except those with a repeated variable has a table
+# every literal has a table, except those with a repeated variable,
+# and those of h until model completion interprets it
+expected = set(str(il.Literal(p,atom)) for atom in atoms[:2] + atoms[3:7] + atoms[8:9] for p in [0,1])
+assert expected <= set(str(l) for l in fast),[str(l) for l in fast]
+print "OK"
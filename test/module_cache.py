@@ -0,0 +1,170 @@
+#
+# Copyright (c) Microsoft Corporation. All Rights Reserved.
+#
+"""
+Check the on-disk cache of parsed modules (module_cache=<dir>). A
+parse read back from the cache has the same declarations, action
+unique ids and final action counters as an uncached parse. An entry
+is not used if an included file has changed, if it was written by
+another version of the parser or if the action counters differ from
+those it was stored with.
+
+usage: python module_cache.py
+"""
+
+import os
+import re
+import shutil
+import tempfile
+import cPickle
+from ivy import ivy_compiler as ic
+from ivy import ivy_actions as ia
+from ivy import ivy_utils as iu
+
+lib = """#lang ivy1.4
+
+type t
+relation r(X:t)
+
+action inc(x:t) = {
+    r(x) := true
+}
+
+action twice(x:t) = {
+    local y:t {
+        call inc(x);
+        call inc(y)
+    }
+}
+"""
+
+main = """#lang ivy1.4
+
+include lib
+
+action go(x:t) = {
+    call twice(x);
+    if * {
+        call inc(x)
+    } else {
+        call twice(x)
+    }
+}
+export go
+"""
+
+def write(name,text):
+    with open(name,'w') as f:
+        f.write(text)
+
+def action_ids(x,res):
+    """ append the unique ids of the actions in x to res, in order """
+    if isinstance(x,(ia.ChoiceAction,ia.LocalAction,ia.CallAction)):
+        res.append((type(x).__name__,x.unique_id))
+    if isinstance(x,(list,tuple)):
+        children = x
+    elif hasattr(x,'_decls'): # an ivy_parser.Ivy
+        children = x._decls
+    elif hasattr(x,'args'):
+        children = x.args
+    else:
+        children = []
+    for y in children:
+        action_ids(y,res)
+    return res
+
+def parse(ctrs=(0,0,0)):
+    """ Parse main.ivy, starting with action counters ctrs. Return the
+    declarations with object addresses removed, their action ids, the
+    final counters, and whether an entry was written to the cache
+    (that is, whether the cache missed). """
+    stores = []
+    def store(*args):
+        stores.append(args)
+        real_store(*args)
+    real_store,ic.store_cached_module = ic.store_cached_module,store
+    ic.set_action_counters(ctrs)
+    try:
+        with iu.SourceFile('main.ivy'):
+            with open('main.ivy') as f:
+                decls = ic.read_module(f)
+    finally:
+        ic.store_cached_module = real_store
+    text = re.sub(' at 0x[0-9a-f]+','',repr(decls))
+    return text,action_ids(decls,[]),ic.action_counters(),bool(stores)
+
+def uncached(ctrs=(0,0,0)):
+    cache = ic.module_cache.get()
+    iu.set_parameters({'module_cache':''})
+    try:
+        res = parse(ctrs)
+    finally:
+        iu.set_parameters({'module_cache':cache})
+    assert not res[3]
+    return res[:3]
+
+def hit(ctrs=(0,0,0)):
+    res = parse(ctrs)
+    assert not res[3], 'cache miss'
+    assert res[:3] == uncached(ctrs)
+    return res[:3]
+
+def miss(ctrs=(0,0,0)):
+    res = parse(ctrs)
+    assert res[3], 'cache hit'
+    assert res[:3] == uncached(ctrs)
+    return res[:3]
+
+cwd = os.getcwd()
+work = tempfile.mkdtemp()
+try:
+    os.chdir(work)
+    cache_dir = os.path.join(work,'cache')
+    write('lib.ivy',lib)
+    write('main.ivy',main)
+    iu.set_parameters({'module_cache':cache_dir})
+
+    # the first parse stores an entry, the second reads it
+    first = miss()
+    assert len(first[1]) == 7 and first[2] != (0,0,0),first
+    assert hit() == first
+
+    # an entry stored with other action counters is not used, since the
+    # unique ids would differ; a load sets the counters as a parse would
+    shifted = miss((3,1,4))
+    assert shifted[1] != first[1]
+    assert hit((3,1,4)) == shifted
+    miss()
+    hit()
+
+    # a change to an included file invalidates the entry
+    write('lib.ivy',lib.replace('r(x) := true','r(x) := false'))
+    changed = miss()
+    assert changed[0] != first[0]
+    hit()
+    write('lib.ivy',lib)
+    assert miss() == first
+
+    # an entry written by another version of the parser is not used
+    real_version = ic.module_cache_version()
+    ic.module_cache_version.value = 'other'
+    try:
+        miss()
+        hit()
+    finally:
+        ic.module_cache_version.value = real_version
+    hit()
+    shutil.rmtree(cache_dir)
+    miss()
+    [entry] = os.listdir(cache_dir)
+    fname = os.path.join(cache_dir,entry)
+    with open(fname,'rb') as f:
+        version,imports,ctrs,decls = cPickle.load(f)
+    with open(fname,'wb') as f:
+        cPickle.dump(('other',imports,ctrs,decls),f,cPickle.HIGHEST_PROTOCOL)
+    miss()
+    hit()
+finally:
+    os.chdir(cwd)
+    shutil.rmtree(work)
+print "OK"
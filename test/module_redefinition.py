@@ -0,0 +1,40 @@
+#
+# Copyright (c) Microsoft Corporation. All Rights Reserved.
+#
+"""
+Check the redefinitions reported for module instances declared inside
+a module body. The instances are expanded when the enclosing module is
+instantiated, and then report the same errors as instances declared at
+the top level. Redefining the instance name itself is reported even if
+the enclosing module is never used.
+"""
+
+from ivy import ivy_utils as iu
+from ivy import ivy_module as im
+from ivy.ivy_compiler import ivy_from_string
+
+prog = """#lang ivy1.6
+module m = {
+    relation r
+}
+module n = {
+    instance a : m
+    instance a : m
+}
+"""
+
+def errors(extra):
+    """ The line numbers and messages of the errors in prog + extra """
+    with im.Module():
+        try:
+            ivy_from_string(prog + extra,create_isolate=False)
+            return []
+        except iu.ErrorList as e:
+            return [(err.lineno,err.message) for err in e.errors]
+
+redef_a = (7,'redefining a (from line 6)')
+assert errors('') == [redef_a],errors('')
+res = errors('instance b : n\n')
+assert res == [redef_a,(3,'redefining a.r (from line 3)'),
+               (7,'redefining b.a (from line 6)'),(3,'redefining b.a.r (from line 3)')],res
+print "OK"
@@ -0,0 +1,126 @@
+#
+# Copyright (c) Microsoft Corporation. All Rights Reserved.
+#
+"""
+Check that parsing included files in worker processes (parse_jobs=N)
+gives the same declarations, action unique ids and final action
+counters as a sequential parse. Here two included files include a
+third, so the worker's parse of the second one cannot be used (it
+includes the third again) and is redone sequentially.
+
+usage: python parse_jobs.py
+"""
+
+import os
+import re
+import shutil
+import tempfile
+from ivy import ivy_compiler as ic
+from ivy import ivy_actions as ia
+from ivy import ivy_utils as iu
+
+files = {
+'common' : """#lang ivy1.4
+
+type t
+relation r(X:t)
+
+action inc(x:t) = {
+    local y:t {
+        r(x) := true;
+        r(y) := false
+    }
+}
+""",
+'a' : """#lang ivy1.4
+
+include common
+
+action fa(x:t) = {
+    call inc(x);
+    call inc(x)
+}
+""",
+'b' : """#lang ivy1.4
+
+include common
+
+action fb(x:t) = {
+    if * {
+        call inc(x)
+    } else {
+        local z:t {
+            call inc(z)
+        }
+    }
+}
+""",
+'main' : """#lang ivy1.4
+
+include a
+include b
+
+action go(x:t) = {
+    call fa(x);
+    call fb(x)
+}
+export go
+""",
+}
+
+def action_ids(x,res):
+    """ append the unique ids of the actions in x to res, in order """
+    if isinstance(x,(ia.ChoiceAction,ia.LocalAction,ia.CallAction)):
+        res.append((type(x).__name__,x.unique_id))
+    if isinstance(x,(list,tuple)):
+        children = x
+    elif hasattr(x,'_decls'): # an ivy_parser.Ivy
+        children = x._decls
+    elif hasattr(x,'args'):
+        children = x.args
+    else:
+        children = []
+    for y in children:
+        action_ids(y,res)
+    return res
+
+def parse(jobs):
+    """ Parse main.ivy with parse_jobs=jobs. Return the declarations
+    with object addresses removed, their action ids, the final action
+    counters and, for each included file parsed by a worker, whether
+    the worker's parse was used. """
+    used = []
+    def get(self,name,fname):
+        res = real_get(self,name,fname)
+        used.append((name,res is not None))
+        return res
+    real_get,ic.IncludedParses.get = ic.IncludedParses.get,get
+    iu.set_parameters({'parse_jobs':str(jobs)})
+    ic.set_action_counters((3,1,4)) # so worker ids are shifted
+    try:
+        with iu.SourceFile('main.ivy'):
+            with open('main.ivy') as f:
+                decls = ic.read_module(f)
+    finally:
+        ic.IncludedParses.get = real_get
+    text = re.sub(' at 0x[0-9a-f]+','',repr(decls))
+    return text,action_ids(decls,[]),ic.action_counters(),used
+
+cwd = os.getcwd()
+work = tempfile.mkdtemp()
+try:
+    os.chdir(work)
+    for name,text in files.iteritems():
+        with open(name + '.ivy','w') as f:
+            f.write(text)
+    seq = parse(0)
+    assert seq[3] == []
+    assert len(seq[1]) == 9,seq[1]
+    par = parse(2)
+    assert par[3] == [('a',True),('b',False)],par[3]
+    assert par[:3] == seq[:3]
+    assert parse(0) == seq
+finally:
+    os.chdir(cwd)
+    shutil.rmtree(work)
+print "OK"
@@ -0,0 +1,92 @@
+#
+# Copyright (c) Microsoft Corporation. All Rights Reserved.
+#
+"""
+Report the time to import the compiler and to parse a corpus of ivy
+files in one process. By default, the corpus is test/*.ivy. Files
+that fail to parse are counted, but don't stop the run. Parameters
+can be set as on the ivy_check command line, e.g. "parse_jobs=4".
+First, this checks that each grammar version parses a few
+version-sensitive inputs as that version should.
+
+usage: python parse_time.py [name=value ...] [file.ivy ...]
+"""
+
+import sys
+import os
+import glob
+import time
+import StringIO
+
+start = time.time()
+from ivy import ivy_compiler
+from ivy import ivy_utils as iu
+startup = time.time() - start
+
+# Inputs whose parse depends on the language version, with the
+# declarations expected for each grammar, or None for a syntax error.
+# The grammars are those of grammar_versions, then the latest.
+version_inputs = [
+    ('relation local',
+     ['relation local',None,None,None,None]),
+    ('relation export',
+     ['relation export','relation export',None,None,None]),
+    ('action a',
+     [None,None,'action a = {}','action a = {}','action a = {}']),
+    ('axiom a:b = c',
+     ["axiom =('a:b', 'c')","axiom =('a:b', 'c')","axiom =('a.b', 'c')",None,None]),
+    ('axiom x + y = z',
+     [None,None,None,"axiom =('+'('x', 'y'), 'z')","axiom =('+'('x', 'y'), 'z')"]),
+    ('action a = {if * {a := b} else {a := c}}',
+     ["action a = if * {'a' := b}\nelse {'a' := c}"]*4 + [None]),
+    ('relation p(X:a.b)',
+     [None,None,None,None,'relation p(X:a.b)']),
+]
+
+def parse_string(version,text):
+    """ Parse text as language version version. Return the
+    declarations printed, or None if there is a syntax error. """
+    try:
+        decls = ivy_compiler.read_module(StringIO.StringIO('#lang ivy{}\n{}\n'.format(version,text)))
+    except iu.ErrorList:
+        return None
+    return '; '.join(d.name() + ' ' + ', '.join(str(a) for a in d.args) for d in decls.decls)
+
+def check_grammars():
+    from ivy import ivy_parser
+    versions = ivy_parser.grammar_versions + [map(int,iu.ivy_latest_language_version.split('.'))]
+    tags = [ivy_parser.grammar_tag(v) for v in versions]
+    assert len(set(tags)) == len(versions),tags
+    modules = [ivy_parser.parser_module(v) for v in versions]
+    assert len(set(modules)) == len(versions)
+    assert [m.grammar for m in modules] == tags
+    saved = iu.get_string_version()
+    try:
+        for text,expected in version_inputs:
+            got = [parse_string('.'.join(str(x) for x in v),text) for v in versions]
+            assert got == expected,(text,got)
+    finally:
+        iu.set_string_version(saved)
+
+def parse_file(fn):
+    cwd = os.getcwd()
+    os.chdir(os.path.dirname(os.path.abspath(fn)))
+    try:
+        with iu.SourceFile(os.path.basename(fn)):
+            with open(os.path.basename(fn)) as f:
+                ivy_compiler.read_module(f)
+        return True
+    except (iu.IvyError,iu.ErrorList):
+        return False
+    finally:
+        os.chdir(cwd)
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    iu.set_parameters(dict(a.split('=',1) for a in args if '=' in a))
+    check_grammars()
+    files = [a for a in args if '=' not in a] or sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)),'*.ivy')))
+    start = time.time()
+    failed = sum(1 for fn in files if not parse_file(fn))
+    elapsed = time.time() - start
+    print 'import: {:.2f}s  parse: {:.2f}s  files: {}  failed: {}'.format(startup,elapsed,len(files),failed)
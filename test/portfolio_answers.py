@@ -0,0 +1,56 @@
+#
+# Copyright (c) Microsoft Corporation. All Rights Reserved.
+#
+"""
+Check that the solver portfolio returns the model or unsat core that
+the caller needs from the winning process, and that a query is still
+checked if every process fails.
+"""
+
+import os
+import z3
+from ivy import ivy_solver as slv
+
+T = z3.DeclareSort('T')
+color,(red,green) = z3.EnumSort('color',['red','green'])
+f = z3.Function('f',T,T)
+r = z3.Function('r',T,T,z3.BoolSort())
+g = z3.Function('g',T,color)
+a,b,x,y = z3.Consts('a b x y',T)
+n = z3.Int('n')
+# two constants named 0 of different sorts, renamed in the query text
+zero_t,zero_c = z3.Const('0',T),z3.Const('0',color)
+
+query = [a != b, f(a) == b, r(a,b), z3.ForAll([x],z3.Not(r(x,x))),
+         z3.ForAll([x,y],z3.Implies(r(x,y),f(x) == y)),
+         g(a) == red, g(b) != red, n > 3, zero_t == b, zero_c == green]
+
+# model
+s = slv.new_solver()
+s.add(query)
+assert slv.run_portfolio(s,None,'model',2) == z3.sat
+assert s.portfolio_model is not None
+m = slv.get_model(s)
+assert all(z3.is_true(m.eval(q,model_completion=True)) for q in query if not z3.is_quantifier(q))
+assert z3.is_true(m.eval(z3.ForAll([x],z3.Not(r(x,x))),model_completion=True))
+
+# core
+p,q,u = z3.Bools('p q u')
+s = slv.new_solver()
+s.add(z3.Implies(z3.And(p,q),a == b), a != b)
+assert slv.run_portfolio(s,[u,p,q],'core',2) == z3.unsat
+core = sorted(str(c) for c in slv.get_core(s))
+assert core == ['p','q'],core
+
+# every process fails, or dies without answering, so the query is
+# checked here
+def failing_worker(text,num_atoms,need,config,idx,results,factor):
+    results.put((idx,'error: failing_worker',None))
+def dying_worker(text,num_atoms,need,config,idx,results,factor):
+    os._exit(1)
+for worker in [failing_worker,dying_worker]:
+    slv.portfolio_worker = worker
+    s = slv.new_solver()
+    s.add(query)
+    assert slv.run_portfolio(s,None,None,2) == z3.sat
+print "OK"
@@ -0,0 +1,66 @@
+#
+# Copyright (c) Microsoft Corporation. All Rights Reserved.
+#
+"""
+Check that z3 can read back every query recorded with
+record_queries=<dir> (see ivy_solver.query_to_smt2), since ivy_replay
+and the solver portfolio depend on it. The queries of ivy_check on
+each file are recorded in a temporary directory and parsed with
+z3.parse_smt2_string. By default, the files are doc examples that
+use numerals of uninterpreted sorts and enumerated sorts. Parameters
+are passed to ivy_check, e.g. "enum_encoding=native".
+
+usage: python query_round_trip.py [name=value ...] [file.ivy ...]
+"""
+
+import sys
+import os
+import shutil
+import subprocess
+import tempfile
+
+import z3
+
+examples = os.path.join(os.path.dirname(os.path.abspath(__file__)),'..','doc','examples')
+default_files = [os.path.join(examples,f + '.ivy') for f in
+                 ['arrayset','arrayset2','arrayset3','pingpong','leader_election_ring_repl']]
+
+def record_queries(fname,dname,params):
+    cmd = [sys.executable,'-m','ivy.ivy_check','record_queries='+dname] + params + [os.path.basename(fname)]
+    proc = subprocess.Popen(cmd,stdout=subprocess.PIPE,stderr=subprocess.STDOUT,
+                            cwd=os.path.dirname(os.path.abspath(fname)))
+    proc.communicate()
+
+def unreadable_queries(dname):
+    """ Return the number of recorded queries and the files z3 can't parse """
+    files = sorted(f for f in os.listdir(dname) if f.endswith('.smt2'))
+    bad = []
+    for f in files:
+        with open(os.path.join(dname,f)) as q:
+            text = q.read()
+        try:
+            z3.parse_smt2_string(text)
+        except z3.Z3Exception as e:
+            bad.append((f,str(e).strip()))
+    return len(files),bad
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    params = [a for a in args if '=' in a]
+    files = [a for a in args if '=' not in a] or default_files
+    total = 0
+    failed = 0
+    for fname in files:
+        dname = tempfile.mkdtemp()
+        try:
+            record_queries(fname,dname,params)
+            count,bad = unreadable_queries(dname)
+        finally:
+            shutil.rmtree(dname)
+        for f,err in bad:
+            print '{}: {}: {}'.format(os.path.basename(fname),f,err)
+        total += count
+        failed += len(bad)
+    assert total > 0,'no queries recorded'
+    assert failed == 0,'{} of {} queries could not be read back'.format(failed,total)
+    print 'OK'
@@ -0,0 +1,34 @@
+#
+# Copyright (c) Microsoft Corporation. All Rights Reserved.
+#
+"""
+Check that the query statistics add up the solver calls of each proof
+obligation, leave out calls that don't check the solver and give the
+size of the largest query.
+"""
+
+from ivy import ivy_logic as lg
+from ivy import ivy_logic_utils as lu
+from ivy import ivy_solver as slv
+
+p,q = [lg.Atom(lg.Symbol(n,lg.RelationSort([])),[]) for n in 'pq']
+theory = lu.formula_to_clauses(lg.Implies(p,q))
+small = lu.formula_to_clauses(p)
+big = lu.and_clauses(theory,small)
+
+slv.start_query_stats()
+with slv.obligation(check='a'):
+    slv.clauses_imply(small,lu.formula_to_clauses(q))
+    slv.clauses_imply(big,lu.formula_to_clauses(q))
+with slv.obligation(check='b'):
+    slv.clauses_sat(small)
+with slv.obligation(check='c'):
+    slv.check_goals(small,[])
+
+obls = dict((dict(o['obligation'])['check'],o) for o in slv.obligation_stats())
+assert sorted(obls) == ['a','b'],sorted(obls)
+assert obls['a']['calls'] == 2 and obls['a']['checks'] == 2,obls['a']
+assert obls['a']['entries'] == ['clauses_imply'],obls['a']['entries']
+assert obls['a']['size'] > obls['b']['size'] > 0,(obls['a']['size'],obls['b']['size'])
+assert len(slv.query_stats) == 3
+print "OK"
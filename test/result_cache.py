@@ -0,0 +1,73 @@
+#
+# Copyright (c) Microsoft Corporation. All Rights Reserved.
+#
+"""
+Check the on-disk cache of query verdicts (cache=<dir>). A verdict
+stored by one process is read back by another without checking the
+solver. The key changes when a declaration or an assertion of the
+query changes, and a query that needs a model or unsat core is always
+checked.
+
+usage: python result_cache.py [lookup <dir>]
+"""
+
+import sys
+import os
+import shutil
+import subprocess
+import tempfile
+import z3
+from ivy import ivy_solver as slv
+from ivy import ivy_utils as iu
+
+def query(xsort=z3.IntSort(),extra=[]):
+    s = slv.new_solver()
+    x,y = z3.Const('x',xsort),z3.Const('y',xsort)
+    s.add(x != y, *extra)
+    return s
+
+def check(s,need=None):
+    """ Return the result of cached_check and whether the solver was checked """
+    checks = []
+    def check_within_limits(s,atoms=None,need=None):
+        checks.append(need)
+        return real_check(s,atoms,need)
+    real_check,slv.check_within_limits = slv.check_within_limits,check_within_limits
+    try:
+        res = slv.cached_check(s,need=need)
+    finally:
+        slv.check_within_limits = real_check
+    return res,bool(checks)
+
+if sys.argv[1:2] == ['lookup']:
+    iu.set_parameters({'cache':sys.argv[2]})
+    assert check(query()) == (z3.sat,False)
+    print "OK"
+    sys.exit(0)
+
+cache_dir = tempfile.mkdtemp()
+try:
+    iu.set_parameters({'cache':cache_dir})
+    assert check(query()) == (z3.sat,True)
+    assert check(query()) == (z3.sat,False)
+
+    # another process reads the stored verdict
+    out = subprocess.check_output([sys.executable,os.path.abspath(__file__),'lookup',cache_dir])
+    assert out.strip().endswith('OK'),out
+
+    # the key depends on the declarations and assertions
+    key = slv.query_key(query())
+    assert key == slv.query_key(query())
+    assert slv.query_key(query(xsort=z3.DeclareSort('T'))) != key
+    assert slv.query_key(query(extra=[z3.Int('x') > 0])) != key
+    assert check(query(z3.BoolSort())) == (z3.sat,True)
+    x = z3.Int('x')
+    assert check(query(extra=[x > 0, x < 0])) == (z3.unsat,True)
+    assert check(query(extra=[x > 0, x < 0])) == (z3.unsat,False)
+
+    # a query that needs a model or core is not answered from the cache
+    assert check(query(),need='model') == (z3.sat,True)
+    assert check(query(extra=[x > 0, x < 0]),need='core') == (z3.unsat,True)
+finally:
+    shutil.rmtree(cache_dir)
+print "OK"
@@ -0,0 +1,42 @@
+#
+# Copyright (c) Microsoft Corporation. All Rights Reserved.
+#
+"""
+Check that each search strategy of get_small_model (small_model=linear,
+binary and optimize) finds models with the same least sort sizes and
+relation sizes, minimized lexicographically in the given order.
+"""
+
+from ivy import ivy_logic as il
+from ivy import ivy_logic_utils as lu
+from ivy import ivy_solver as slv
+from ivy import ivy_utils as iu
+
+t,u = il.UninterpretedSort('t'),il.UninterpretedSort('u')
+p = il.Symbol('p',il.RelationSort([]))
+r = il.Symbol('r',il.RelationSort([t]))
+ts = [il.Symbol('a{}'.format(i),t) for i in range(4)]
+us = [il.Symbol('b{}'.format(i),u) for i in range(6)]
+
+def distinct(consts):
+    return [il.Not(il.Equals(x,y)) for x,y in iu.distinct_unordered_pairs(consts)]
+
+# at least 3 elements of t and 5 of u, and either a fourth element of t
+# or a sixth element of u
+fmla = il.And(*(distinct(ts[:3]) + distinct(us[:5]) + [r(ts[0]),r(ts[1]),
+              il.Implies(p(),il.And(*distinct(ts))),
+              il.Implies(il.Not(p()),il.And(*distinct(us)))]))
+clauses = lu.formula_to_clauses(fmla)
+
+def sizes(h,sorts):
+    num_r = sum(1 for lit in slv.relation_model_to_clauses(h,r,1) if lit.polarity)
+    return [len(h.sort_universe(s)) for s in sorts],num_r
+
+for sorts,expected in [([t,u],([3,6],2)),([u,t],([5,4],2))]:
+    for search in ['linear','binary','optimize']:
+        iu.set_parameters({'small_model':search})
+        h = slv.get_small_model(clauses,sorts,[r])
+        res = sizes(h,sorts)
+        assert res == expected,(search,[s.name for s in sorts],res)
+iu.set_parameters({'small_model':'linear'})
+print "OK"
@@ -0,0 +1,45 @@
+#
+# Copyright (c) Microsoft Corporation. All Rights Reserved.
+#
+"""
+Check that a query cut off by the solver limits is never reported as
+a failed proof. Each file is checked with ivy_check under a range of
+values of solver_rlimit, and the result must be either OK or an
+inconclusive result. By default, the files are doc examples that
+check with no limits. Other parameters are passed to ivy_check,
+e.g. "solver_escalation=double".
+
+usage: python solver_limits.py [name=value ...] [file.ivy ...]
+"""
+
+import sys
+import os
+import subprocess
+
+examples = os.path.join(os.path.dirname(os.path.abspath(__file__)),'..','doc','examples')
+default_files = [os.path.join(examples,f + '.ivy') for f in
+                 ['leader_election_ring_udp','leader_election_ring_repl']]
+
+rlimits = [1000,3000,10000,30000]
+
+def check(fname,params):
+    """ Run ivy_check on fname and return the last line of output """
+    cmd = [sys.executable,'-m','ivy.ivy_check'] + params + [os.path.basename(fname)]
+    proc = subprocess.Popen(cmd,stdout=subprocess.PIPE,stderr=subprocess.STDOUT,
+                            cwd=os.path.dirname(os.path.abspath(fname)))
+    out = proc.communicate()[0]
+    return out.strip().split('\n')[-1]
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    params = [a for a in args if '=' in a]
+    files = [a for a in args if '=' not in a] or default_files
+    bad = []
+    for fname in files:
+        for rlimit in rlimits:
+            res = check(fname,params + ['solver_rlimit={}'.format(rlimit)])
+            print '{} solver_rlimit={}: {}'.format(os.path.basename(fname),rlimit,res)
+            if res != 'OK' and 'inconclusive' not in res:
+                bad.append((fname,rlimit))
+    assert not bad,'{} checks failed under solver limits'.format(len(bad))
+    print 'OK'
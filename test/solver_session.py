@@ -0,0 +1,52 @@
+#
+# Copyright (c) Microsoft Corporation. All Rights Reserved.
+#
+"""
+Check that a SolverSession doesn't change the result of a query. The
+theory of the session is p -> q. Queries that include the theory are
+checked in the session's solver, and the others in a fresh solver,
+as are queries nested in the scope of another query. The abstract
+post of ivy_alpha runs in the session.
+"""
+
+from ivy import ivy_logic as lg
+from ivy import ivy_logic_utils as lu
+from ivy import ivy_solver as slv
+from ivy import ivy_utils as iu
+from ivy import ivy_alpha as alpha
+
+p,q = [lg.Atom(lg.Symbol(n,lg.RelationSort([])),[]) for n in 'pq']
+theory = lu.formula_to_clauses(lg.Implies(p,q))
+with_theory = lu.and_clauses(theory,lu.formula_to_clauses(p))
+without_theory = lu.formula_to_clauses(p)
+not_q = lu.formula_to_clauses(lg.Not(q))
+
+def results():
+    return (slv.clauses_imply(with_theory,lu.formula_to_clauses(q)),
+            slv.clauses_imply(without_theory,lu.formula_to_clauses(q)),
+            slv.clauses_sat(lu.and_clauses(without_theory,not_q)),
+            slv.clauses_sat(lu.and_clauses(with_theory,not_q)))
+
+expected = (True,False,True,False)
+assert results() == expected
+for incremental in ['false','true']:
+    iu.set_parameters({'incremental':incremental})
+    with slv.SolverSession(theory) as session:
+        res = results()
+    assert res == expected,(incremental,res)
+    assert session.num_queries == (2 if incremental == 'true' else 0),session.num_queries
+
+    # a query nested in the scope of another doesn't see its premises
+    with slv.SolverSession(theory) as session:
+        with slv.query_solver(with_theory) as s:
+            assert slv.clauses_sat(lu.and_clauses(theory,lu.formula_to_clauses(lg.Not(p))))
+            assert slv.clauses_imply(with_theory,lu.formula_to_clauses(q))
+    assert session.num_queries == (1 if incremental == 'true' else 0),session.num_queries
+
+    # the abstract post is computed in the session's solver
+    with slv.SolverSession(theory) as session:
+        for state,unsat in [(lu.formula_to_clauses(p),False),(lu.and_clauses(lu.formula_to_clauses(p),not_q),True)]:
+            post = alpha.ProgressiveDomain([],verbose=False).post(state,theory,{},[])
+            assert post.is_false() if unsat else post.is_true(),(state,post)
+    assert session.num_queries == (2 if incremental == 'true' else 0),session.num_queries
+print "OK"
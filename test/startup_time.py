@@ -0,0 +1,49 @@
+#
+# Copyright (c) Microsoft Corporation. All Rights Reserved.
+#
+"""
+Report the time to import the module of each console script, each in
+a fresh process, and whether it loaded any of the UI modules (Tkinter,
+the graph layout, IPython). None of the scripts may load any of them
+at import time; this is asserted.
+
+usage: python startup_time.py [repeat]
+"""
+
+import sys
+import subprocess
+
+scripts = ['ivy','ivy_check','ivy_to_cpp','ivy_show','ivy_replay']
+
+# the ivy modules are listed under both names, since a script run as a
+# file (python ivy/ivy_check.py) imports them as top-level modules
+ui_modules = ['Tkinter','ivy.tk_ui','ivy.ivy_ui','ivy.proof','ivy.ivy_graph',
+              'ivy.dot_layout','ivy.cy_render','tk_ui','ivy_ui','ivy_graph',
+              'dot_layout','cy_render','pygraphviz','IPython']
+
+probe = """
+import sys, time
+start = time.time()
+import ivy.{}
+elapsed = time.time() - start
+print elapsed
+print ' '.join(m for m in {!r} if sys.modules.get(m))
+"""
+
+def import_time(script):
+    """ Return the import time of a script's module and the UI modules
+    it loaded """
+    out = subprocess.check_output([sys.executable,'-c',probe.format(script,ui_modules)])
+    lines = out.split('\n')
+    return float(lines[-3]),lines[-2].split()
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for script in scripts:
+        results = [import_time(script) for i in range(repeat)]
+        times = sorted(t for t,_ in results)
+        loaded = results[0][1]
+        print '{:12} best {:.3f}s  median {:.3f}s  ui modules: {}'.format(
+            script,times[0],times[len(times)/2],' '.join(loaded) or 'none')
+        for _,loaded in results:
+            assert not loaded,'importing ivy.{} loads {}'.format(script,' '.join(loaded))
@@ -0,0 +1,41 @@
+#
+# Copyright (c) Microsoft Corporation. All Rights Reserved.
+#
+"""
+Check that substitution for variables replaces only their free
+occurrences, and that substituting in clauses doesn't make them share
+mutable literals.
+"""
+
+from ivy import ivy_logic as lg
+from ivy import ivy_logic_utils as lu
+
+S = lg.UninterpretedSort('S')
+p = lg.Symbol('p',lg.FunctionSort(S,S,lg.BooleanSort()))
+q = lg.Symbol('q',lg.FunctionSort(S,lg.BooleanSort()))
+X,Y = lg.Variable('X',S),lg.Variable('Y',S)
+c,d = lg.Symbol('c',S),lg.Symbol('d',S)
+
+# X is bound, so only Y is replaced
+fmla = lg.ForAll([X],p(X,Y))
+assert lu.substitute_ast(fmla,{'X':c,'Y':d}) == lg.ForAll([X],p(X,d))
+
+# the same variable node, free and bound
+fmla = lg.And(q(X),lg.Exists([X],q(X)),q(X))
+res = lu.substitute_ast(fmla,{'X':c})
+assert res == lg.And(q(c),lg.Exists([X],q(X)),q(c)),res
+
+# shadowing in a nested quantifier only
+fmla = lg.ForAll([Y],lg.And(p(X,Y),lg.ForAll([X],p(X,Y))))
+res = lu.substitute_ast(fmla,{'X':c})
+assert res == lg.ForAll([Y],lg.And(p(c,Y),lg.ForAll([X],p(X,Y)))),res
+
+# a literal occurring twice gives two literals
+lit = lg.Literal(1,q(X))
+cl = lu.substitute_clause([lit,lit],{'X':c})
+assert cl[0] == cl[1] and cl[0] is not cl[1]
+sub = lu.Substituter(variables={'X':c})
+assert sub(lit) is not sub(lit)
+cl[0].polarity = 0
+assert cl[1].polarity == 1
+print "OK"
@@ -0,0 +1,67 @@
+#
+# Copyright (c) Microsoft Corporation. All Rights Reserved.
+#
+"""
+Report the time to compute the sets of symbols, free variables and
+constants of the transition relations of the actions of an ivy file,
+using the sets cached on terms (used_*_clauses) and using the
+uncached generators (symbols_clauses, etc.). Each relation is queried
+"rounds" times, as the checker does when it builds many queries over
+the same relations. The default file is
+examples/sht/test_queue.ivy. Parameters can be set as on the ivy_check
+command line, e.g. "isolate=iso_q".
+
+usage: python term_sets_time.py [rounds=n] [name=value ...] [file.ivy]
+"""
+
+import sys
+import os
+import time
+
+from ivy import ivy
+from ivy import ivy_module as im
+from ivy import ivy_isolate
+from ivy import ivy_compiler
+from ivy import ivy_logic_utils as lu
+from ivy import ivy_utils as iu
+
+sets = ['symbols','variables','constants']
+
+def transition_relations(fname):
+    """ Return the transition relations of the actions of fname, in
+    the isolate given by the isolate parameter, or the first one. """
+    cwd = os.getcwd()
+    os.chdir(os.path.dirname(os.path.abspath(fname)))
+    try:
+        fname = os.path.basename(fname)
+        ivy.source_file(fname,ivy.open_read(fname),create_isolate=False)
+        isolate = ivy_compiler.isolate.get() or (sorted(im.module.isolates) or [None])[0]
+        ivy_isolate.create_isolate(isolate)
+        return [action.update(im.module,None)[1] for name,action in sorted(im.module.actions.items())]
+    finally:
+        os.chdir(cwd)
+
+def time_rounds(fun,trs,rounds):
+    start = time.time()
+    for i in range(rounds):
+        for tr in trs:
+            fun(tr)
+    return time.time() - start
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    params = dict(a.split('=',1) for a in args if '=' in a)
+    rounds = int(params.pop('rounds','2000'))
+    iu.set_parameters(params)
+    files = [a for a in args if '=' not in a]
+    fname = files[0] if files else os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                '..','examples','sht','test_queue.ivy')
+    with im.Module():
+        trs = transition_relations(fname)
+        print 'actions: {}  rounds: {}'.format(len(trs),rounds)
+        for name in sets:
+            cached = getattr(lu,'used_{}_clauses'.format(name))
+            uncached = iu.gen_to_set(getattr(lu,'{}_clauses'.format(name)))
+            assert all(cached(tr) == uncached(tr) for tr in trs)
+            print '{:10} uncached {:.3f}s  cached {:.3f}s'.format(
+                name,time_rounds(uncached,trs,rounds),time_rounds(cached,trs,rounds))
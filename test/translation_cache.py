@@ -0,0 +1,30 @@
+#
+# Copyright (c) Microsoft Corporation. All Rights Reserved.
+#
+"""
+Check that translations to z3 cached under one encoding of enumerated
+sorts are not returned under another.
+"""
+
+import z3
+from ivy import ivy_module as im
+from ivy import ivy_logic as lg
+from ivy import ivy_solver as slv
+from ivy import ivy_utils as iu
+from ivy.ivy_compiler import ivy_from_string
+
+with im.Module():
+    ivy_from_string("#lang ivy1.6\ntype st = {s0,s1}\nindividual x:st\n",create_isolate=False)
+    st = lg.find_sort('st')
+    fmla = lg.Equals(lg.Symbol('x',st),lg.Symbol('s0',st))
+    for encoding in ['bits','native','bits']:
+        iu.set_parameters({'enum_encoding':encoding})
+        for res in [slv.formula_to_z3(fmla),slv.term_to_z3(fmla)]:
+            native = z3.is_eq(res) and isinstance(res.arg(0).sort(),z3.DatatypeSortRef)
+            assert native == (encoding == 'native'),(encoding,res)
+    iu.set_parameters({'enum_encoding':'bits'})
+    slv.set_use_native_enums(True)
+    assert z3.is_eq(slv.formula_to_z3(fmla))
+    slv.set_use_native_enums(False)
+    assert not z3.is_eq(slv.formula_to_z3(fmla))
+print "OK"
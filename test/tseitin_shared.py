@@ -0,0 +1,74 @@
+#
+# Copyright (c) Microsoft Corporation. All Rights Reserved.
+#
+"""
+Check the Tseitin encodings that share definitions through
+tseitin_table. Each encoding must be equivalent to its formula, with
+every auxiliary "__tsh" symbol defined exactly once, when formulas
+share subformulas, when conditioning clauses that already contain
+auxiliary symbols, and when the table is emptied by check_limit.
+"""
+
+import itertools
+from ivy import ivy_logic as il
+from ivy import ivy_logic_utils as lu
+from ivy import ivy_solver as slv
+
+atoms = [il.Atom(il.Symbol(n,il.RelationSort([])),[]) for n in 'pqrstu']
+p,q,r,s,t,u = atoms
+
+def check_cnf(cnf,fmla):
+    """ cnf is a clause list equivalent to fmla, up to its auxiliary
+    symbols, and has no duplicate clauses """
+    keys = [tuple(str(lit) for lit in cl) for cl in cnf]
+    assert len(set(keys)) == len(keys),'duplicate clauses: {}'.format(keys)
+    cls = lu.Clauses(cnf)
+    for vals in itertools.product([True,False],repeat=len(atoms)):
+        assign = lu.Clauses([a if v else il.Not(a) for a,v in zip(atoms,vals)])
+        expected = slv.clauses_imply(assign,lu.formula_to_clauses(fmla))
+        assert slv.clauses_sat(lu.and_clauses(assign,cls)) == expected,(str(fmla),vals)
+
+def aux_symbols(cnf):
+    return set(lit.atom.rep.name for cl in cnf for lit in cl
+               if lit.atom.rep.name.startswith('__ts'))
+
+pq = il.And(p,q)
+inner = il.Or(pq,t)
+f1 = il.Or(pq,r)
+f2 = il.Or(il.And(inner,u),s)   # uses pq through inner
+f3 = il.Or(il.And(inner,u),r)   # reuses the table entry of And(inner,u)
+
+lu.tseitin_table.clear()
+cnfs = [lu.formula_to_clauses(f).clauses for f in [f1,f2,f3]]
+for cnf,f in zip(cnfs,[f1,f2,f3]):
+    check_cnf(cnf,f)
+# shared subformulas get the same symbol, and conjoined encodings
+# stay equivalent
+assert aux_symbols(cnfs[0]) < aux_symbols(cnfs[1])
+assert aux_symbols(cnfs[1]) == aux_symbols(cnfs[2])
+both = lu.and_clauses(lu.formula_to_clauses(f1),lu.formula_to_clauses(f2))
+check_cnf(both.clauses,il.And(f1,f2))
+
+# conditioning clauses that already contain auxiliary symbols
+rs = il.Or(il.And(r,s),t)
+given = lu.Clauses(cnfs[1] + [rs])
+cond_cnf = lu.condition_clauses(given,p).clauses
+check_cnf(cond_cnf,il.Implies(p,il.And(f2,rs)))
+assert aux_symbols(cnfs[1]) < aux_symbols(cond_cnf)
+
+# the table is emptied when full, and later encodings still carry
+# their own definitions, under new names
+limit = lu.tseitin_table.limit
+lu.tseitin_table.limit = 1
+try:
+    before = lu.formula_to_clauses(f2)
+    before_cnf = before.clauses
+    assert len(lu.tseitin_table.defs) > 0
+    after_cnf = lu.formula_to_clauses(il.Or(il.And(inner,u),t)).clauses
+    assert not aux_symbols(before_cnf) & aux_symbols(after_cnf)
+    check_cnf(after_cnf,il.Or(il.And(inner,u),t))
+    check_cnf(before_cnf + after_cnf,il.And(f2,il.Or(il.And(inner,u),t)))
+    assert before.clauses == before_cnf
+finally:
+    lu.tseitin_table.limit = limit
+print "OK"
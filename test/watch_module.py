@@ -0,0 +1,183 @@
+#
+# Copyright (c) Microsoft Corporation. All Rights Reserved.
+#
+"""
+Check the watch mode of ivy_check (watch=true). Files are edited
+between passes and, for each pass, this records which isolates were
+created and checked. A pass runs only when a file the check read
+changes, including files included indirectly and the place where a
+missing module would be found. An edit that leaves the parse
+unchanged reuses the results without compiling. Otherwise only the
+changed isolates are checked. The solver statistics cover one pass.
+
+usage: python watch_module.py
+"""
+
+import sys
+import os
+import shutil
+import tempfile
+import time
+import StringIO
+from ivy import ivy_check
+from ivy import ivy_compiler
+from ivy import ivy_isolate
+from ivy import ivy_solver
+from ivy import ivy_utils as iu
+
+files = {
+'types' : """#lang ivy1.6
+
+type t
+""",
+'a_impl' : """#lang ivy1.6
+
+object a = {
+    relation p(X:t)
+    after init {
+        p(X) := false
+    }
+    action set(x:t) = {
+        p(x) := true
+    }
+    conjecture p(X) | ~p(X)
+}
+export a.set
+isolate iso_a = a
+""",
+'lib' : """#lang ivy1.6
+
+include types
+include a_impl
+""",
+'main' : """#lang ivy1.6
+
+include lib
+
+object b = {
+    relation q(X:t)
+    after init {
+        q(X) := false
+    }
+    action clear(x:t) = {
+        q(x) := false
+    }
+    conjecture ~q(X)
+}
+export b.clear
+isolate iso_b = b
+""",
+}
+
+def write(name,text):
+    with open(name + '.ivy','w') as f:
+        f.write(text)
+
+def edit(name,old,new):
+    with open(name + '.ivy') as f:
+        text = f.read()
+    assert old in text
+    write(name,text.replace(old,new))
+
+# the edits to make, one each time watch_module waits for a change
+edits = [
+    lambda: write('a_impl',files['a_impl']), # same contents
+    lambda: edit('a_impl','p(X) | ~p(X)','p(X) | ~p(X) # comment'),
+    lambda: edit('a_impl','p(X) | ~p(X)','~p(X)'),
+    lambda: edit('main','include lib\n','include lib\ninclude extra\n'),
+    lambda: write('extra','#lang ivy1.6\n'),
+]
+
+passes = [] # for each wait, what the passes since the last one did
+current = None
+
+def start_pass():
+    global current
+    current = {'passes':0,'compiled':0,'created':[],'checked':[]}
+start_pass()
+
+def sleep(secs):
+    current['output'] = sys.stdout.getvalue()
+    current['stats'] = len(ivy_solver.query_stats)
+    sys.stdout.truncate(0)
+    passes.append(current)
+    start_pass()
+    if len(passes) > len(edits):
+        raise KeyboardInterrupt
+    edits[len(passes)-1]()
+
+def report_stats():
+    current['passes'] += 1
+    real_report_stats()
+
+def ivy_compile(*args,**kwargs):
+    current['compiled'] += 1
+    real_compile(*args,**kwargs)
+
+def create_isolate(isolate,*args,**kwargs):
+    current['created'].append(isolate)
+    real_create_isolate(isolate,*args,**kwargs)
+
+def check_isolate():
+    current['checked'].append(current['created'][-1])
+    real_check_isolate()
+
+cwd = os.getcwd()
+work = tempfile.mkdtemp()
+real_stdout = sys.stdout
+real_sleep,time.sleep = time.sleep,sleep
+real_report_stats,ivy_check.report_stats = ivy_check.report_stats,report_stats
+real_compile,ivy_compiler.ivy_compile = ivy_compiler.ivy_compile,ivy_compile
+real_create_isolate,ivy_isolate.create_isolate = ivy_isolate.create_isolate,create_isolate
+real_check_isolate,ivy_check.check_isolate = ivy_check.check_isolate,check_isolate
+try:
+    os.chdir(work)
+    for name,text in files.iteritems():
+        write(name,text)
+    iu.set_parameters({'mode':'induction','stats_file':os.path.join(work,'stats.json')})
+    sys.stdout = StringIO.StringIO()
+    try:
+        ivy_check.watch_module('main.ivy')
+    except KeyboardInterrupt:
+        pass
+finally:
+    sys.stdout = real_stdout
+    time.sleep = real_sleep
+    ivy_check.report_stats = real_report_stats
+    ivy_compiler.ivy_compile = real_compile
+    ivy_isolate.create_isolate = real_create_isolate
+    ivy_check.check_isolate = real_check_isolate
+    os.chdir(cwd)
+    shutil.rmtree(work)
+
+def summary(p):
+    return p['passes'],p['compiled'],p['created'],p['checked']
+
+both = ['iso_a','iso_b']
+assert len(passes) == len(edits) + 1
+first,same,comment,changed,missing,created = passes
+
+# the first pass checks everything
+assert summary(first) == (1,1,both,both),summary(first)
+assert first['output'].endswith('OK\nwatching for changes...\n'),first['output']
+assert first['stats'] > 0
+
+# rewriting a file with the same contents is not a change
+assert summary(same) == (0,0,[],[]),summary(same)
+
+# a comment leaves the parse unchanged, so nothing is compiled or checked
+assert summary(comment) == (1,0,[],[]),summary(comment)
+assert 'unchanged, reusing results\nOK\n' in comment['output'],comment['output']
+assert comment['stats'] == 0
+
+# a change to an indirectly included file rechecks only its isolate
+assert summary(changed) == (1,1,both,['iso_a']),summary(changed)
+assert 'FAIL: iso_a\n' in changed['output'],changed['output']
+assert 0 < changed['stats'] < first['stats']
+
+# an error, then the missing module is created
+assert summary(missing) == (1,0,[],[]),summary(missing)
+assert 'module extra not found' in missing['output'],missing['output']
+assert summary(created) == (1,1,both,['iso_b']),summary(created)
+assert 'FAIL: iso_a\n' in created['output'],created['output']
+print "OK"